@@ -1,11 +1,34 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.functions import Lower
 
 class EmailBackend(ModelBackend):
+    """
+    Log in with an email address (any case) or a username, in one query.
+
+    The email lookup matches the partial LOWER(email) unique index on
+    CustomUser. When nobody matches, the password is still hashed once so
+    the response time does not reveal whether the account exists.
+    """
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = get_user_model().objects.get(email=username)
-            if user.check_password(password):
-                return user
-        except get_user_model().DoesNotExist:
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if not username or password is None:
+            return None
+        candidates = (
+            UserModel._default_manager
+            .annotate(email_lower=Lower('email'))
+            .filter(Q(email_lower=username.lower()) & ~Q(email='') | Q(username=username))
+        )
+        # An email match wins over someone whose username happens to look like that email
+        users = sorted(candidates[:2], key=lambda user: user.username == username)
+        if not users:
+            UserModel().set_password(password)
             return None
+        user = users[0]
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -1,10 +1,42 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.views import redirect_to_login
 from django.http import HttpResponseForbidden
-from django.shortcuts import redirect
 
-def admin_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.is_admin:
-            return view_func(request, *args, **kwargs)
+from .permissions import has_permission
+
+
+def _denied(request, user):
+    if user.is_authenticated:
+        return HttpResponseForbidden("You do not have permission to access this page.")
+    return redirect_to_login(request.get_full_path())
+
+
+def requires(permission, denied=_denied):
+    """
+    Let the view run only for users whose role grants ``permission``.
+
+    By default anonymous visitors are sent to the login page and everyone
+    else gets 403; ``denied(request, user)`` builds another response.
+    Works on both sync and async views.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                user = await request.auser()
+                # The session may have to be loaded from the database
+                allowed = await sync_to_async(has_permission)(request, permission, user)
+                if not allowed:
+                    return denied(request, user)
+                return await view_func(request, *args, **kwargs)
         else:
-            return HttpResponseForbidden("You do not have permission to access this page.")
-    return wrapper
\ No newline at end of file
+            @wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                if not has_permission(request, permission):
+                    return denied(request, request.user)
+                return view_func(request, *args, **kwargs)
+        wrapper.permission = permission
+        return wrapper
+    return decorator
@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import CustomUser
+from .permissions import ADMIN, set_role
 
 class UserRegisterForm(UserCreationForm):
     class Meta:
@@ -15,8 +16,7 @@ class AdminRegisterForm(UserCreationForm):
     def save(self, commit=True):
         
         user = super().save(commit=False)
-        user.is_superuser = True  # Set superuser rights
-        user.is_staff = True  # Set the admin rights
+        set_role(user, ADMIN)  # Superuser, staff and admin flags
         if commit:
             user.save()
         return user
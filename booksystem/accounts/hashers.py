@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 whose cost comes from settings.PASSWORD_HASH_ITERATIONS.
+
+    It keeps the ``pbkdf2_sha256`` algorithm name, so existing hashes still
+    verify; any hash made with a different iteration count is rehashed at
+    the user's next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
@@ -0,0 +1,54 @@
+# accounts/management/commands/bench_login.py
+import random
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from books.benchmarks import measure, rolled_back
+
+PASSWORD = 'bench-pass-123'
+
+
+class Command(BaseCommand):
+    help = "Benchmark authenticate() for hits, wrong passwords and unknown accounts (changes are rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--iterations', type=int, nargs='*',
+                            help="PBKDF2 iteration counts to compare (default: the current setting).")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+
+        User = get_user_model()
+        rng = random.Random(options['seed'])
+        for iterations in options['iterations'] or [settings.PASSWORD_HASH_ITERATIONS]:
+            with override_settings(PASSWORD_HASH_ITERATIONS=iterations), rolled_back():
+                # One real hash shared by every row: hashing 10k passwords would dominate the run
+                password = make_password(PASSWORD)
+                User.objects.bulk_create(
+                    (User(username=f'bench-user-{n}', email=f'Bench.User.{n}@example.com', password=password)
+                     for n in range(options['users'])),
+                    batch_size=5000,
+                )
+                pick = lambda: rng.randrange(options['users'])  # noqa: E731
+                cases = {
+                    'email': lambda: authenticate(username=f'bench.user.{pick()}@example.com', password=PASSWORD),
+                    'username': lambda: authenticate(username=f'bench-user-{pick()}', password=PASSWORD),
+                    'wrong password': lambda: authenticate(username=f'bench.user.{pick()}@example.com', password='x'),
+                    'unknown account': lambda: authenticate(username=f'nobody.{pick()}@example.com', password='x'),
+                }
+                self.stdout.write(f"PBKDF2 iterations: {iterations}")
+                for label, login in cases.items():
+                    with CaptureQueriesContext(connection) as queries:
+                        login()
+                    stats = measure(login, options['repeat'])
+                    rate = 1000 / stats['mean'] if stats['mean'] else 0
+                    self.stdout.write(f"  {label:<16} {len(queries)} queries  mean {stats['mean']:.1f} ms  "
+                                      f"p50 {stats['p50']:.1f} ms  p95 {stats['p95']:.1f} ms  ~{rate:,.0f}/s per core")
+                self.stdout.write(f"  plan: {queries[0]['sql']}")
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:23
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Stop before the constraint if accounts share an email that differs only by case.
+
+    Which of them keeps the address is for an admin to decide, so none is changed here.
+    """
+    User = apps.get_model('accounts', 'CustomUser')
+    duplicates = list(User.objects.exclude(email='').values(address=Lower('email')).annotate(count=Count('pk'))
+                      .filter(count__gt=1).order_by('address').values_list('address', flat=True))
+    if duplicates:
+        raise RuntimeError(
+            "Cannot make emails unique ignoring case: more than one account uses "
+            f"{', '.join(duplicates)}. Change or clear the email of all but one of them, then migrate again.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='user_email_ci_unique', violation_error_message='A user with that email already exists.'),
+        ),
+    ]
@@ -1,5 +1,15 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 
 class CustomUser(AbstractUser):
     is_admin = models.BooleanField(default=False)  # Add an "is_admin" flag
+
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Emails are logins: unique ignoring case, but many accounts may leave it blank.
+            # The index is on LOWER(email), which is what EmailBackend looks up.
+            models.UniqueConstraint(Lower('email'), condition=~Q(email=''), name='user_email_ci_unique',
+                                    violation_error_message="A user with that email already exists."),
+        ]
@@ -0,0 +1,83 @@
+"""
+Roles and the permissions they grant.
+
+Every user has exactly one role, derived from the account flags: admins
+(``is_superuser`` or ``is_admin``), members (any other active account) and
+anonymous visitors. Views declare the permission they need with
+``accounts.decorators.requires``.
+
+The resolved permissions are cached in the session together with a stamp
+of the flags they were resolved from. request.user is loaded on every
+request anyway, so comparing the stamp costs no query, and a role change
+(e.g. in the books ``all_users`` view) takes effect on the user's very
+next request.
+"""
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+SESSION_KEY = '_permissions'
+
+ANONYMOUS, MEMBER, ADMIN = 'anonymous', 'member', 'admin'
+
+_PUBLIC = {'catalog.view', 'accounts.signin'}
+_MEMBER = _PUBLIC | {'loans.borrow', 'profile.edit'}
+_ADMIN = _MEMBER | {'catalog.manage', 'loans.manage', 'users.manage', 'reports.view'}
+
+ROLE_PERMISSIONS = {
+    ANONYMOUS: frozenset(_PUBLIC),
+    MEMBER: frozenset(_MEMBER),
+    ADMIN: frozenset(_ADMIN),
+}
+
+
+def role_for(user):
+    if not user.is_authenticated or not user.is_active:
+        return ANONYMOUS
+    if user.is_superuser or getattr(user, 'is_admin', False):
+        return ADMIN
+    return MEMBER
+
+
+def set_role(user, role):
+    """
+    Set the flags of ``user`` for ``role``; the caller saves.
+    """
+    is_admin = role == ADMIN
+    user.is_superuser = user.is_staff = user.is_admin = is_admin
+
+
+def _stamp(user):
+    return [user.pk, user.is_active, user.is_superuser, getattr(user, 'is_admin', False)]
+
+
+def _resolve(request, user):
+    if not user.is_authenticated:
+        return ROLE_PERMISSIONS[ANONYMOUS]
+    cached = request.session.get(SESSION_KEY)
+    stamp = _stamp(user)
+    if cached and cached['stamp'] == stamp:
+        return frozenset(cached['permissions'])
+    role = role_for(user)
+    request.session[SESSION_KEY] = {'stamp': stamp, 'role': role, 'permissions': sorted(ROLE_PERMISSIONS[role])}
+    return ROLE_PERMISSIONS[role]
+
+
+def get_permissions(request, user=None):
+    """
+    Return the permissions of the request's user, resolved once per session.
+    """
+    if not hasattr(request, '_permissions'):
+        request._permissions = _resolve(request, user or request.user)
+    return request._permissions
+
+
+def has_permission(request, permission, user=None):
+    return permission in get_permissions(request, user)
+
+
+@receiver(user_logged_in)
+def cache_on_login(sender, request, user, **kwargs):
+    # Resolve while the login writes the session anyway, so no later request has to
+    if request is not None and hasattr(request, 'session'):
+        request.__dict__.pop('_permissions', None)
+        _resolve(request, user)
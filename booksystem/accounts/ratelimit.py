@@ -0,0 +1,163 @@
+"""
+Token-bucket rate limiting for the login and registration views.
+
+Every bucket holds up to ``capacity`` tokens and refills continuously at
+``capacity`` per ``period``; each attempt takes one token and is refused
+with 429 when the bucket is empty. Buckets are keyed per client IP and,
+where the view has one, per account, and checked before the view runs, so
+a throttled request never reaches the password hasher.
+
+Rates live in settings.RATELIMITS as ``'<capacity>/<period>'`` strings,
+e.g. ``'5/m'``. settings.RATELIMIT_STORE picks where buckets are kept:
+``'local'`` is a dict in this process; ``'cache'`` shares them through the
+cache in settings.RATELIMIT_CACHE (e.g. Redis) across workers. The cache
+store reads and writes a bucket in two steps, so concurrent attempts may
+slip one or two extra tokens through; it limits brute force, it is not an
+exact counter.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Turn ``'5/m'`` into ``(capacity, tokens refilled per second)``.
+    """
+    count, _, period = rate.partition('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[:1] or 's']
+
+
+def _refill(tokens, updated, capacity, refill, now):
+    return min(capacity, tokens + (now - updated) * refill)
+
+
+class LocalStore:
+    """
+    Buckets in a dict of this process, evicting the least recently used past ``max_keys``.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, refill, now):
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = _refill(tokens, updated, capacity, refill, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return allowed, tokens
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheStore:
+    """
+    Buckets in a shared cache; each one expires once it would have refilled anyway.
+
+    Bucket keys carry a generation, so ``clear()`` drops every bucket by
+    starting a new one and leaves the rest of the cache alone.
+    """
+    GENERATION_KEY = 'ratelimit:generation'
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def generation(self):
+        generation = self.cache.get(self.GENERATION_KEY)
+        if generation is None:
+            generation = time.time_ns()
+            # add() so that two processes starting a generation at once agree on one
+            if not self.cache.add(self.GENERATION_KEY, generation, None):
+                generation = self.cache.get(self.GENERATION_KEY, generation)
+        return generation
+
+    def take(self, key, capacity, refill, now):
+        key = f'ratelimit:{self.generation()}:{key}'
+        tokens, updated = self.cache.get(key) or (capacity, now)
+        tokens = _refill(tokens, updated, capacity, refill, now)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.cache.set(key, (tokens, now), math.ceil(capacity / refill) + 1)
+        return allowed, tokens
+
+    def clear(self):
+        self.cache.set(self.GENERATION_KEY, time.time_ns(), None)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    name = settings.RATELIMIT_STORE
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = CacheStore(settings.RATELIMIT_CACHE) if name == 'cache' else LocalStore()
+        return _stores[name]
+
+
+def client_ip(request):
+    """
+    Return the address the first trusted proxy saw the request come from.
+
+    Every proxy appends the address it received the request from to
+    X-Forwarded-For style headers, so anything left of the entries added by
+    the RATELIMIT_TRUSTED_PROXIES proxies in front of us is up to the client.
+    """
+    addresses = [address.strip() for address in request.META.get(settings.RATELIMIT_IP_HEADER, '').split(',')]
+    addresses = [address for address in addresses if address]
+    if not addresses:
+        return request.META.get('REMOTE_ADDR', '')
+    return addresses[-min(settings.RATELIMIT_TRUSTED_PROXIES, len(addresses))]
+
+
+def check(scope, kind, value, now=None):
+    """
+    Take a token from the ``kind`` bucket of ``value`` in ``scope``.
+
+    Returns 0 if allowed, else the seconds until a token is available.
+    """
+    rate = settings.RATELIMITS.get(scope, {}).get(kind)
+    if not rate or not value:
+        return 0
+    capacity, refill = parse_rate(rate)
+    allowed, tokens = get_store().take(f'{scope}:{kind}:{value}', capacity, refill, now or time.time())
+    return 0 if allowed else math.ceil((1 - tokens) / refill)
+
+
+def ratelimit(scope, account_field=None):
+    """
+    Throttle POSTs to the view per client IP and, given ``account_field``, per account.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method == 'POST':
+                account = request.POST.get(account_field, '').strip().lower() if account_field else ''
+                wait = check(scope, 'ip', client_ip(request)) or check(scope, 'account', account)
+                if wait:
+                    response = HttpResponse("Too many attempts. Please try again later.", status=429)
+                    response['Retry-After'] = str(wait)
+                    return response
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,3 +1,215 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from api import urls as api_urls
+from books import urls as books_urls
+
+from . import permissions, ratelimit, urls as accounts_urls
+from .decorators import requires
+from .forms import UserRegisterForm
+from .hashers import TunablePBKDF2PasswordHasher
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class EmailBackendTests(TestCase):
+    def setUp(self):
+        ratelimit.get_store().clear()
+        self.user = get_user_model().objects.create_user('reader', 'Reader@Example.com', 'secret-pass')
+
+    def test_logs_in_by_email_in_any_case_or_username(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(authenticate(username='reader@example.COM', password='secret-pass'), self.user)
+        self.assertEqual(authenticate(username='reader', password='secret-pass'), self.user)
+        self.assertIsNone(authenticate(username='reader@example.com', password='wrong'))
+
+    def test_unknown_account_still_hashes(self):
+        with mock.patch.object(TunablePBKDF2PasswordHasher, 'encode', autospec=True,
+                               side_effect=TunablePBKDF2PasswordHasher.encode) as encode:
+            with self.assertNumQueries(1):
+                self.assertIsNone(authenticate(username='nobody@example.com', password='secret-pass'))
+        self.assertEqual(encode.call_count, 1)
+
+    def test_inactive_users_cannot_log_in(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(authenticate(username='reader@example.com', password='secret-pass'))
+
+    def test_login_view(self):
+        response = self.client.post(reverse('login'), {'email': 'READER@example.com', 'password': 'secret-pass'})
+        self.assertRedirects(response, reverse('book_list_user'))
+
+    def test_email_is_unique_ignoring_case_but_may_be_blank(self):
+        form = UserRegisterForm({'username': 'other', 'email': 'reader@EXAMPLE.com',
+                                 'password1': 'Long-pass-123', 'password2': 'Long-pass-123'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('A user with that email already exists.', str(form.errors))
+        get_user_model().objects.create_user('first', '', 'secret-pass')
+        get_user_model().objects.create_user('second', '', 'secret-pass')
+
+    def test_hashes_follow_the_configured_cost(self):
+        self.assertIn('$1000$', self.user.password)
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertTrue(authenticate(username='reader', password='secret-pass'))
+            self.user.refresh_from_db()
+            self.assertIn('$2000$', self.user.password)
+            self.assertTrue(make_password('x').startswith('pbkdf2_sha256$2000$'))
+
+
+class EmailConstraintMigrationTests(TransactionTestCase):
+    def migrate(self, targets):
+        MigrationExecutor(connection).migrate(targets)
+        loader = MigrationExecutor(connection).loader
+        return loader.project_state(list(loader.applied_migrations)).apps
+
+    def test_emails_differing_only_by_case_stop_the_migration(self):
+        self.addCleanup(lambda: self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes()))
+        User = self.migrate([('accounts', '0001_initial')]).get_model('accounts', 'CustomUser')
+        User.objects.create(username='reader', email='Reader@example.com', password='!')
+        clash = User.objects.create(username='reader2', email='reader@EXAMPLE.com', password='!')
+        User.objects.create(username='blank', email='', password='!')
+        User.objects.create(username='blank2', email='', password='!')
+        with self.assertRaisesMessage(RuntimeError, 'more than one account uses reader@example.com.'):
+            self.migrate([('accounts', '0002_user_email_ci_unique')])
+
+        clash.email = 'other@example.com'
+        clash.save()
+        self.migrate([('accounts', '0002_user_email_ci_unique')])
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000, ADMIN_REGISTRATION_CODE='s3cret-code',
+                   RATELIMITS={'login': {'ip': '5/m', 'account': '2/m'}, 'admin_register': {'ip': '2/h'}})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        ratelimit.get_store().clear()
+        get_user_model().objects.create_user('reader', 'reader@example.com', 'secret-pass')
+
+    def login(self, email, ip='10.0.0.1'):
+        return self.client.post(reverse('login'), {'email': email, 'password': 'wrong'}, REMOTE_ADDR=ip)
+
+    def test_throttles_per_account_before_hashing(self):
+        self.assertEqual(self.login('reader@example.com').status_code, 302)
+        self.assertEqual(self.login('READER@example.com', ip='10.0.0.2').status_code, 302)
+        with mock.patch('accounts.views.authenticate') as authenticate:
+            response = self.login('reader@example.com', ip='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) > 0)
+        authenticate.assert_not_called()
+        self.assertEqual(self.login('someone@example.com', ip='10.0.0.3').status_code, 302)
+
+    def test_throttles_per_ip(self):
+        statuses = [self.login(f'user{n}@example.com').status_code for n in range(6)]
+        self.assertEqual(statuses, [302] * 5 + [429])
+        self.assertEqual(self.login('user9@example.com', ip='10.0.0.9').status_code, 302)
+
+    @override_settings(RATELIMIT_IP_HEADER='HTTP_X_FORWARDED_FOR')
+    def test_forwarded_addresses_written_by_the_client_are_ignored(self):
+        statuses = [self.client.post(reverse('login'), {'email': f'user{n}@example.com', 'password': 'wrong'},
+                                     HTTP_X_FORWARDED_FOR=f'203.0.113.{n}, 198.51.100.7').status_code
+                    for n in range(6)]
+        self.assertEqual(statuses, [302] * 5 + [429])
+        with self.settings(RATELIMIT_TRUSTED_PROXIES=2):
+            request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.9, 10.0.0.2')
+            self.assertEqual(ratelimit.client_ip(request), '203.0.113.9')
+        self.assertEqual(ratelimit.client_ip(RequestFactory().get('/', REMOTE_ADDR='10.0.0.5')), '10.0.0.5')
+
+    def test_buckets_refill(self):
+        for store in (ratelimit.LocalStore(), ratelimit.CacheStore('default')):
+            with self.subTest(store=type(store).__name__):
+                store.clear()
+                capacity, refill = ratelimit.parse_rate('2/m')
+                taken = [store.take('key', capacity, refill, 1000)[0] for _ in range(3)]
+                self.assertEqual(taken, [True, True, False])
+                self.assertFalse(store.take('key', capacity, refill, 1010)[0])
+                self.assertTrue(store.take('key', capacity, refill, 1031)[0])
+
+    @override_settings(RATELIMIT_STORE='cache')
+    def test_shared_cache_store(self):
+        store = ratelimit.get_store()
+        self.assertIsInstance(store, ratelimit.CacheStore)
+        store.clear()
+        statuses = [self.login('reader@example.com', ip=f'10.0.1.{n}').status_code for n in range(3)]
+        self.assertEqual(statuses, [302, 302, 429])
+
+    @override_settings(RATELIMIT_STORE='cache')
+    def test_clearing_the_cache_store_keeps_other_entries(self):
+        cache.set('unrelated', 'kept')
+        self.login('reader@example.com')
+        self.login('reader@example.com')
+        ratelimit.get_store().clear()
+        self.assertEqual(self.login('reader@example.com').status_code, 302)
+        self.assertEqual(cache.get('unrelated'), 'kept')
+
+    def test_admin_code_comes_from_settings(self):
+        data = {'username': 'boss', 'email': 'boss@example.com', 'password1': 'Long-pass-123',
+                'password2': 'Long-pass-123', 'admin_code': '123456'}
+        self.client.post(reverse('admin_register'), data)
+        self.assertFalse(get_user_model().objects.filter(username='boss').exists())
+        self.client.post(reverse('admin_register'), {**data, 'admin_code': 's3cret-code'})
+        self.assertTrue(get_user_model().objects.get(username='boss').is_superuser)
+        self.assertEqual(self.client.post(reverse('admin_register'), data).status_code, 429)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class PermissionTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.member = User.objects.create_user('reader', 'reader@example.com', 'secret-pass')
+        self.admin = User.objects.create_user('librarian', 'librarian@example.com', 'secret-pass', is_superuser=True)
+
+    def test_every_view_requires_a_permission(self):
+        missing = [pattern.name for module in (books_urls, accounts_urls, api_urls) for pattern in module.urlpatterns
+                   if pattern.callback.__module__ in ('books.views', 'accounts.views', 'api.views')
+                   and not getattr(pattern.callback, 'permission', None)]
+        self.assertEqual(missing, [])
+
+    def test_roles(self):
+        url = reverse('all_books')
+        self.assertRedirects(self.client.get(url), f"{reverse('login')}?next={url}")
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(reverse('borrowed_books_user')).status_code, 200)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_checks_cost_no_queries_once_logged_in(self):
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.session[permissions.SESSION_KEY]['role'], permissions.MEMBER)
+        request = self.client.get(reverse('book_list_user')).wsgi_request
+        del request._permissions
+        with self.assertNumQueries(0):
+            self.assertTrue(permissions.has_permission(request, 'loans.borrow'))
+            self.assertFalse(permissions.has_permission(request, 'users.manage'))
+
+    def test_role_changes_apply_immediately(self):
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(reverse('all_books')).status_code, 403)
+        admin_client = self.client_class()
+        admin_client.force_login(self.admin)
+        admin_client.post(reverse('all_users'), {'user_id': self.member.pk, 'user_type': 'admin'})
+        self.assertEqual(self.client.get(reverse('all_books')).status_code, 200)
+        admin_client.post(reverse('all_users'), {'user_id': self.member.pk, 'user_type': 'user'})
+        self.assertEqual(self.client.get(reverse('all_books')).status_code, 403)
+
+    async def test_async_views(self):
+        @requires('loans.borrow')
+        async def view(request):
+            return HttpResponse('ok')
+
+        for user, status in ((AnonymousUser(), 302), (self.member, 200), (self.admin, 200)):
+            request = AsyncRequestFactory().get('/')
+            request.session = {}
+
+            async def auser(user=user):
+                return user
+
+            request.auser = auser
+            self.assertEqual((await view(request)).status_code, status)
@@ -4,12 +4,21 @@ from .forms import UserRegisterForm, AdminRegisterForm
 from django.contrib.auth.decorators import login_required
 from .models import CustomUser  # Import your custom user model
 from django.contrib import messages
+from booksystem.querybudget import query_budget
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from .decorators import requires
+from .permissions import ADMIN, role_for, set_role
+from .ratelimit import ratelimit
 
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from .forms import UserRegisterForm, AdminRegisterForm
 
+@query_budget(4)  # Username and email uniqueness checks, then the INSERT
+@requires('accounts.signin')
+@ratelimit('register')
 def register(request):
     if request.method == "POST":
         form = UserRegisterForm(request.POST)
@@ -38,6 +47,9 @@ def register(request):
     return render(request, 'accounts/register.html', {'form': form})
 
 
+@query_budget(4)  # Username and email uniqueness checks, then the INSERT
+@requires('accounts.signin')
+@ratelimit('admin_register')
 def admin_register(request):
     """
     Handles the registration of an admin user with enhanced error handling.
@@ -52,7 +64,8 @@ def admin_register(request):
                 messages.error(request, "Admin access code is required.")
                 return redirect('admin_register')
 
-            if admin_code != "123456":
+            expected_code = settings.ADMIN_REGISTRATION_CODE
+            if not expected_code or not constant_time_compare(admin_code, expected_code):
                 messages.error(request, "Invalid admin access code.")
                 return redirect('admin_register')
 
@@ -61,8 +74,7 @@ def admin_register(request):
                 try:
                     # Save admin user with proper permissions
                     admin = form.save(commit=False)
-                    admin.is_superuser = True
-                    admin.is_staff = True
+                    set_role(admin, ADMIN)
                     admin.save()
                     messages.success(request, "Admin registered successfully!")
                     return redirect('login')
@@ -86,6 +98,9 @@ def admin_register(request):
         return redirect('admin_register')
 
 
+@query_budget(5)  # User lookup, then the session and last_login writes of a successful login
+@requires('accounts.signin')
+@ratelimit('login', account_field='email')
 def login_view(request):
     if request.method == "POST":
         email = request.POST.get("email")
@@ -97,7 +112,7 @@ def login_view(request):
         if user is not None:
             login(request, user)
             # Check if the user is an admin
-            if user.is_superuser:
+            if role_for(user) == ADMIN:
                 return redirect('book_list')  # Redirect admin to book_list
             else:
                 return redirect('book_list_user')  # Redirect regular user to home
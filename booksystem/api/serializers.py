@@ -0,0 +1,36 @@
+# api/serializers.py
+"""
+Compact JSON shapes for the API.
+
+Rows are read with ``.values()`` so no model instances are built; each
+serializer only renames or formats what the query returned.
+"""
+from django.core.files.storage import default_storage
+
+BOOK_FIELDS = ('id', 'title', 'author', 'total_copies', 'available_count', 'registered_date', 'updated_at')
+BOOK_DETAIL_FIELDS = BOOK_FIELDS + ('description', 'image')
+LOAN_FIELDS = ('id', 'book_id', 'book__title', 'borrow_date', 'due_date', 'return_date', 'updated_at')
+USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'date_joined')
+
+
+def book(row):
+    data = {name: row[name] for name in BOOK_FIELDS}
+    if 'description' in row:
+        data['description'] = row['description']
+        data['image'] = default_storage.url(row['image']) if row['image'] else None
+    return data
+
+
+def loan(row):
+    data = {name: row[name] for name in LOAN_FIELDS if name != 'book__title'}
+    data['book_title'] = row['book__title']
+    return data
+
+
+def user(row):
+    return {name: row[name] for name in USER_FIELDS}
+
+
+def change(token, kind, object_id, row):
+    data = None if row is None else book(row) if kind == 'book' else loan(row)
+    return {'token': token, 'type': kind, 'id': object_id, 'deleted': row is None, 'data': data}
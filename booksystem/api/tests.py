@@ -0,0 +1,136 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from books import services
+from books.models import Book
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000, CATALOG_PAGE_SIZE=2)
+class ApiTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'secret-pass')
+        self.admin = User.objects.create_user('librarian', 'librarian@example.com', 'secret-pass', is_superuser=True)
+        self.books = [Book.objects.create(title=title, author='Jane Austen', description='Novel.')
+                      for title in ('Emma', 'Persuasion', 'Sense and Sensibility')]
+
+    def test_book_list_pages_and_searches(self):
+        first = self.client.get(reverse('api_book_list')).json()
+        self.assertEqual([book['title'] for book in first['results']], ['Sense and Sensibility', 'Persuasion'])
+        rest = self.client.get(reverse('api_book_list'), {'cursor': first['next']}).json()
+        self.assertEqual([book['title'] for book in rest['results']], ['Emma'])
+        self.assertIsNone(rest['next'])
+        found = self.client.get(reverse('api_book_list'), {'q': 'persua'}).json()
+        self.assertEqual([book['id'] for book in found['results']], [self.books[1].pk])
+
+    def test_book_detail(self):
+        response = self.client.get(reverse('api_book_detail', args=[self.books[0].pk]))
+        self.assertEqual(response.json()['description'], 'Novel.')
+        self.assertEqual(self.client.get(reverse('api_book_detail', args=[0])).status_code, 404)
+
+    def test_conditional_get(self):
+        url = reverse('api_book_detail', args=[self.books[0].pk])
+        response = self.client.get(url)
+        self.assertTrue(response['Last-Modified'])
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        list_etag = self.client.get(reverse('api_book_list'))['ETag']
+        services.borrow_book(self.books[0].pk, self.reader)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(reverse('api_book_list'), HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+        list_etag = self.client.get(reverse('api_book_list'))['ETag']
+        self.books[2].delete()
+        self.assertEqual(self.client.get(reverse('api_book_list'), HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_borrow_and_return(self):
+        borrow_url = reverse('api_borrow', args=[self.books[0].pk])
+        self.assertEqual(self.client.post(borrow_url).status_code, 401)
+        self.client.force_login(self.reader)
+        loan = self.client.post(borrow_url).json()
+        self.assertEqual(loan['book_title'], 'Emma')
+        self.assertEqual(self.client.post(borrow_url).status_code, 409)
+
+        loans = self.client.get(reverse('api_my_loans'))
+        self.assertEqual([row['id'] for row in loans.json()['results']], [loan['id']])
+        returned = self.client.post(reverse('api_return_loan', args=[loan['id']])).json()
+        self.assertIsNotNone(returned['return_date'])
+        self.assertEqual(self.client.get(reverse('api_my_loans'), HTTP_IF_NONE_MATCH=loans['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(reverse('api_my_loans')).json()['results'], [])
+        self.assertEqual(len(self.client.get(reverse('api_my_loans'), {'status': 'all'}).json()['results']), 1)
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.post(reverse('api_return_loan', args=[loan['id']])).status_code, 404)
+
+    def test_loans_etag_covers_the_book_title(self):
+        self.client.force_login(self.reader)
+        services.borrow_book(self.books[0].pk, self.reader)
+        etag = self.client.get(reverse('api_my_loans'))['ETag']
+        self.books[0].title = 'Emma (Annotated)'
+        self.books[0].save()
+        renamed = self.client.get(reverse('api_my_loans'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(renamed.status_code, 200)
+        self.assertEqual(renamed.json()['results'][0]['book_title'], 'Emma (Annotated)')
+
+    def test_session_sign_in_with_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        borrow_url = reverse('api_borrow', args=[self.books[0].pk])
+        credentials = {'email': 'reader@example.com', 'password': 'secret-pass'}
+        self.assertEqual(client.post(reverse('api_session'), credentials).status_code, 403)
+
+        token = client.get(reverse('api_csrf')).json()['csrf_token']
+        wrong = client.post(reverse('api_session'), {**credentials, 'password': 'wrong'}, HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(wrong.status_code, 400)
+        me = client.post(reverse('api_session'), credentials, HTTP_X_CSRFTOKEN=token).json()
+        self.assertEqual(me['username'], 'reader')
+        self.assertIn('loans.borrow', me['permissions'])
+
+        # Signing in rotates the token
+        self.assertEqual(client.post(borrow_url, HTTP_X_CSRFTOKEN=token).status_code, 403)
+        token = client.get(reverse('api_csrf')).json()['csrf_token']
+        self.assertEqual(client.post(borrow_url).status_code, 403)
+        self.assertEqual(client.post(borrow_url, HTTP_X_CSRFTOKEN=token).json()['book_title'], 'Emma')
+
+        self.assertEqual(client.delete(reverse('api_session'), HTTP_X_CSRFTOKEN=token).status_code, 204)
+        self.assertEqual(client.get(reverse('api_my_loans')).status_code, 401)
+
+    def test_change_feed(self):
+        url = reverse('api_changes')
+        start = self.client.get(url).json()['next']
+        services.borrow_book(self.books[0].pk, self.reader)
+        self.books[1].title = 'Persuasion (Annotated)'
+        self.books[1].save()
+        deleted = self.books[2].pk
+        self.books[2].delete()
+
+        feed = self.client.get(url, {'since': start}).json()
+        self.assertEqual([(change['type'], change['id'], change['deleted']) for change in feed['changes']],
+                         [('book', self.books[0].pk, False), ('book', self.books[1].pk, False),
+                          ('book', deleted, True)])
+        self.assertEqual(feed['changes'][0]['data']['available_count'], 0)
+        self.assertFalse(feed['more'])
+        self.assertEqual(self.client.get(url, {'since': feed['next']}).json()['changes'], [])
+
+        first = self.client.get(url, {'since': start, 'limit': 1}).json()
+        self.assertTrue(first['more'])
+        rest = self.client.get(url, {'since': first['next']}).json()
+        self.assertEqual(len(first['changes']) + len(rest['changes']), 3)
+
+        # Only staff replicas see the loans themselves
+        self.client.force_login(self.admin)
+        kinds = [change['type'] for change in self.client.get(url, {'since': start}).json()['changes']]
+        self.assertEqual(kinds.count('loan'), 1)
+        self.assertEqual(self.client.get(url, {'since': 'latest'}).status_code, 400)
+
+    def test_users(self):
+        self.client.force_login(self.reader)
+        me = self.client.get(reverse('api_me')).json()
+        self.assertEqual(me['username'], 'reader')
+        self.assertIn('loans.borrow', me['permissions'])
+        self.assertEqual(self.client.get(reverse('api_user_list')).status_code, 403)
+        self.client.force_login(self.admin)
+        users = self.client.get(reverse('api_user_list')).json()['results']
+        self.assertEqual([user['username'] for user in users], ['librarian', 'reader'])
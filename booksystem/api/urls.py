@@ -0,0 +1,15 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('v1/csrf/', views.csrf, name='api_csrf'),
+    path('v1/session/', views.session, name='api_session'),
+    path('v1/books/', views.book_list, name='api_book_list'),
+    path('v1/books/<int:pk>/', views.book_detail, name='api_book_detail'),
+    path('v1/books/<int:pk>/borrow/', views.borrow, name='api_borrow'),
+    path('v1/loans/', views.my_loans, name='api_my_loans'),
+    path('v1/loans/<int:record_id>/return/', views.return_loan, name='api_return_loan'),
+    path('v1/users/', views.user_list, name='api_user_list'),
+    path('v1/users/me/', views.me, name='api_me'),
+    path('v1/changes/', views.changes, name='api_changes'),
+]
@@ -0,0 +1,245 @@
+# api/views.py
+"""
+Version 1 of the JSON API.
+
+Read endpoints send an ETag and Last-Modified header built from the
+``updated_at`` timestamps of the rows they cover, and answer 304 Not
+Modified to a matching conditional GET. One aggregate query gives both
+headers, so a client polling for changes costs that query and nothing else.
+The ETag also counts the rows, which catches deletions that leave the
+newest timestamp unchanged.
+
+The API authenticates with the site's session cookie, so unsafe methods
+need a CSRF token like any form post. A client starts with ``GET csrf``,
+which sets the csrftoken cookie and returns the token, signs in with a
+POST of ``email`` and ``password`` to ``session`` and sends the token in
+an X-CSRFToken header with every POST; ``DELETE session`` signs out.
+
+Replicas that keep a full copy of the catalog follow ``changes`` instead
+(see books.changelog): it returns only what changed after their token.
+"""
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model, login, logout
+from django.db.models import Count, Max
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition, require_GET, require_http_methods, require_POST
+
+from accounts.decorators import requires
+from accounts.permissions import get_permissions, has_permission
+from accounts.ratelimit import ratelimit
+from books import changelog, services
+from books.models import Book, BorrowRecord, ChangeLog
+from books.pagination import DEFAULT_ORDERING, KeysetPaginator
+from books.search import SEARCH_ORDERING, search_books
+from booksystem.querybudget import query_budget
+
+from . import serializers
+
+LOAN_ORDERING = ('-borrow_date', '-id')
+USER_ORDERING = ('username', 'id')
+
+
+def error(status, message):
+    return JsonResponse({'error': message}, status=status)
+
+
+def denied(request, user):
+    if user.is_authenticated:
+        return error(403, "You do not have permission to do this.")
+    return error(401, "Authentication required.")
+
+
+def paginated(request, queryset, ordering, serialize):
+    paginator = KeysetPaginator(queryset, ordering, per_page=settings.CATALOG_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse({'results': [serialize(row) for row in page], 'next': page.next_cursor})
+
+
+def _stamp(queryset, timestamps):
+    def stamp(request, *args, **kwargs):
+        # Shared by the ETag and Last-Modified functions of one request
+        cache = request.__dict__.setdefault('_api_stamp', {})
+        if 'value' not in cache:
+            value = queryset(request, *args, **kwargs).aggregate(
+                count=Count('pk'), **{f'latest_{index}': Max(field) for index, field in enumerate(timestamps)})
+            latest = [value[f'latest_{index}'] for index in range(len(timestamps))]
+            cache['value'] = {'count': value['count'], 'latest': max(filter(None, latest), default=None)}
+        return cache['value']
+    return stamp
+
+
+def conditional(queryset, timestamps=('updated_at',)):
+    """
+    Serve 304 when the rows of ``queryset(request, ...)`` have not changed.
+
+    ``timestamps`` name every ``updated_at`` the response is built from,
+    including those of related rows it shows fields of.
+    """
+    stamp = _stamp(queryset, timestamps)
+
+    def etag(request, *args, **kwargs):
+        value = stamp(request, *args, **kwargs)
+        latest = value['latest'].timestamp() if value['latest'] else 0
+        return f"{value['count']}-{latest:.6f}"
+
+    def last_modified(request, *args, **kwargs):
+        return stamp(request, *args, **kwargs)['latest']
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def _books(request, pk=None):
+    books = Book.objects.all()
+    return books.filter(pk=pk) if pk is not None else books
+
+
+def _my_loans(request):
+    return BorrowRecord.objects.filter(borrower=request.user)
+
+
+@query_budget(4)
+@require_GET
+@requires('catalog.view', denied=denied)
+@cache_control(no_cache=True)
+@conditional(_books)
+def book_list(request):
+    query = request.GET.get('q')
+    books = Book.objects.values(*serializers.BOOK_FIELDS)
+    if query:
+        return paginated(request, search_books(books, query), SEARCH_ORDERING, serializers.book)
+    return paginated(request, books, DEFAULT_ORDERING, serializers.book)
+
+
+@query_budget(4)
+@require_GET
+@requires('catalog.view', denied=denied)
+@cache_control(no_cache=True)
+@conditional(_books)
+def book_detail(request, pk):
+    row = get_object_or_404(Book.objects.values(*serializers.BOOK_DETAIL_FIELDS), pk=pk)
+    return JsonResponse(serializers.book(row))
+
+
+@query_budget(6)
+@require_POST
+@requires('loans.borrow', denied=denied)
+def borrow(request, pk):
+    get_object_or_404(Book.objects.values('pk'), pk=pk)
+    record = services.borrow_book(pk, request.user)
+    if record is None:
+        return error(409, "No copy of this book is available.")
+    row = BorrowRecord.objects.values(*serializers.LOAN_FIELDS).get(pk=record.pk)
+    return JsonResponse(serializers.loan(row), status=201)
+
+
+@query_budget(4)
+@require_GET
+@requires('loans.borrow', denied=denied)
+@cache_control(private=True, no_cache=True)
+@conditional(_my_loans, timestamps=('updated_at', 'book__updated_at'))  # Loans show the book's title
+def my_loans(request):
+    loans = _my_loans(request).values(*serializers.LOAN_FIELDS)
+    if request.GET.get('status') != 'all':
+        loans = loans.filter(return_date__isnull=True)
+    return paginated(request, loans, LOAN_ORDERING, serializers.loan)
+
+
+@query_budget(10)  # Closing an overdue loan also refreshes the borrower's overdue summary
+@require_POST
+@requires('loans.borrow', denied=denied)
+def return_loan(request, record_id):
+    record = get_object_or_404(_my_loans(request), pk=record_id)
+    if not services.return_loan(record):
+        return error(409, "This loan is already closed.")
+    row = BorrowRecord.objects.values(*serializers.LOAN_FIELDS).get(pk=record.pk)
+    return JsonResponse(serializers.loan(row))
+
+
+def _me(request, user):
+    return {**{name: getattr(user, name) for name in serializers.USER_FIELDS},
+            'permissions': sorted(get_permissions(request, user))}
+
+
+@query_budget(2)
+@require_GET
+@requires('accounts.signin', denied=denied)
+@never_cache
+@ensure_csrf_cookie
+def csrf(request):
+    """
+    The CSRF token for the X-CSRFToken header of the client's POSTs.
+    """
+    return JsonResponse({'csrf_token': get_token(request)})
+
+
+@query_budget(5)  # User lookup, then the session and last_login writes of a successful login
+@require_http_methods(['POST', 'DELETE'])
+@requires('accounts.signin', denied=denied)
+@ratelimit('login', account_field='email')
+def session(request):
+    """
+    Sign in with ``email`` and ``password`` (POST) or sign out (DELETE).
+    """
+    if request.method == 'DELETE':
+        logout(request)
+        return HttpResponse(status=204)
+    user = authenticate(request, username=request.POST.get('email'), password=request.POST.get('password'))
+    if user is None:
+        return error(400, "Invalid email or password.")
+    login(request, user)
+    return JsonResponse(_me(request, user))
+
+
+@query_budget(2)
+@require_GET
+@requires('profile.edit', denied=denied)
+@cache_control(private=True, no_cache=True)
+def me(request):
+    return JsonResponse(_me(request, request.user))
+
+
+@query_budget(3)
+@require_GET
+@requires('users.manage', denied=denied)
+@cache_control(private=True, no_cache=True)
+def user_list(request):
+    users = get_user_model().objects.values(*serializers.USER_FIELDS)
+    return paginated(request, users, USER_ORDERING, serializers.user)
+
+
+@query_budget(6)  # Watermark, entries and one query per kind of changed object
+@require_GET
+@requires('catalog.view', denied=denied)
+@cache_control(private=True, no_cache=True)
+def changes(request):
+    """
+    Changes after ``?since=<token>``; without it, the token to start from.
+    """
+    if 'since' not in request.GET:
+        return JsonResponse({'changes': [], 'next': changelog.latest_token(), 'more': False})
+    try:
+        since = int(request.GET['since'])
+        limit = max(1, min(int(request.GET.get('limit', settings.CHANGELOG_BATCH_SIZE)),
+                           settings.CHANGELOG_BATCH_SIZE))
+    except ValueError:
+        return error(400, "since and limit must be integers.")
+    # Loans name their borrowers, so only staff replicas follow them
+    kinds = (ChangeLog.BOOK, ChangeLog.LOAN) if has_permission(request, 'loans.manage') else (ChangeLog.BOOK,)
+    feed = changelog.changes_since(since, limit, kinds)
+    if feed is None:
+        return error(410, "Changes this old have been compacted; download the catalog again.")
+    entries, next_token, more = feed
+
+    rows = {}
+    for kind, queryset, fields in ((ChangeLog.BOOK, Book.objects, serializers.BOOK_FIELDS),
+                                   (ChangeLog.LOAN, BorrowRecord.objects, serializers.LOAN_FIELDS)):
+        ids = [object_id for _, entry_kind, object_id in entries if entry_kind == kind]
+        if ids:
+            rows[kind] = {row['id']: row for row in queryset.filter(pk__in=ids).values(*fields)}
+    results = [serializers.change(token, kind, object_id, rows[kind].get(object_id))
+               for token, kind, object_id in entries]
+    return JsonResponse({'changes': results, 'next': next_token, 'more': more})
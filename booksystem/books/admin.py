@@ -1,7 +1,46 @@
 # books/admin.py
 
 from django.contrib import admin
-from .models import Book, BorrowRecord
+from .models import AuthorCirculation, Book, BookCirculation, BorrowRecord, DailyCirculation, Hold, OverdueSummary
 
 admin.site.register(Book)
-admin.site.register(BorrowRecord)
+
+
+@admin.register(BorrowRecord)
+class BorrowRecordAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'borrow_date', 'due_date', 'return_date')
+    # __str__ reads book.title, so fetch the book with the record
+    list_select_related = ('book',)
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    list_display = ('book', 'user', 'placed_at')
+    list_select_related = ('book', 'user')
+    ordering = ('book', 'id')
+
+
+@admin.register(OverdueSummary)
+class OverdueSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'overdue_count', 'oldest_due_date', 'refreshed_at')
+    list_select_related = ('user',)
+    ordering = ('-overdue_count',)
+
+
+@admin.register(BookCirculation)
+class BookCirculationAdmin(admin.ModelAdmin):
+    list_display = ('book', 'borrow_count', 'return_count', 'loan_time')
+    list_select_related = ('book',)
+    ordering = ('-borrow_count',)
+
+
+@admin.register(AuthorCirculation)
+class AuthorCirculationAdmin(admin.ModelAdmin):
+    list_display = ('author', 'borrow_count', 'return_count', 'loan_time')
+    ordering = ('-borrow_count',)
+
+
+@admin.register(DailyCirculation)
+class DailyCirculationAdmin(admin.ModelAdmin):
+    list_display = ('day', 'borrow_count', 'return_count', 'loan_time')
+    ordering = ('-day',)
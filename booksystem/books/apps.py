@@ -1,6 +1,19 @@
 # books/apps.py
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def install_search_index(sender, using, **kwargs):
+    from django.db import connections
+    from .search import install_search_index
+    install_search_index(connections[using])
+
 
 class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
+
+    def ready(self):
+        # Table rebuilds during migrate drop the SQLite search triggers, so re-check afterwards
+        post_migrate.connect(install_search_index, sender=self)
+        from . import events  # noqa: F401  (connects the availability receivers)
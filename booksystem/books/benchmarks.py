@@ -0,0 +1,120 @@
+# books/benchmarks.py
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks generate their own data inside a transaction that is rolled back
+at the end, so they can be pointed at a development database without
+leaving anything behind.
+"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+# Password of the users made by seed_library, which loadtest signs in as
+SEED_PASSWORD = 'library-pass-123'
+
+WORDS = (
+    'shadow river garden winter silent crown empire stone glass harbor '
+    'letters ember forest mirror night ocean paper quiet salt summer '
+    'thunder velvet willow yellow zero atlas border candle desert echo '
+    'falcon golden hollow island journey kingdom lantern meadow north orchard'
+).split()
+
+SURNAMES = (
+    'Austen Tolstoy Morrison Achebe Murakami Lahiri Hosseini Marquez Woolf '
+    'Orwell Rowling Collins Riordan Carroll Coelho Fitzgerald James Dickens'
+).split()
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """
+    Run the block in a transaction and always roll it back.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def vocabulary(size=5000, seed=0):
+    """
+    Return ``size`` pronounceable pseudo-words plus Zipf cumulative weights.
+
+    The seed words come first so they are the most frequent, which keeps
+    benchmark queries for them representative of "common term" searches.
+    """
+    rng = random.Random(seed)
+    syllables = [c + v for c in 'bcdfghklmnprstvz' for v in 'aeiou']
+    words = list(WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words, zipf_cum_weights(size)
+
+
+def zipf_cum_weights(size):
+    """
+    Cumulative Zipf weights for ``random.choices``: rank 1 is picked most often.
+    """
+    total, cum_weights = 0.0, []
+    for rank in range(1, size + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+    return cum_weights
+
+
+def fake_books(count, start=0, seed=0):
+    """
+    Yield unsaved ``Book`` instances with deterministic pseudo-random text.
+    """
+    from .models import Book
+
+    words, cum_weights = vocabulary(seed=seed)
+    rng = random.Random(seed + start)
+    for number in range(start, start + count):
+        title = ' '.join(word.capitalize() for word in rng.choices(words, cum_weights=cum_weights, k=rng.randint(2, 4)))
+        yield Book(
+            title=f'{title} {number}',
+            author=f'{rng.choice(words).capitalize()} {rng.choice(SURNAMES)}',
+            description=' '.join(rng.choices(words, cum_weights=cum_weights, k=30)),
+        )
+
+
+def measure(func, repeat=20):
+    """
+    Call ``func`` ``repeat`` times and return timing stats in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'mean': statistics.fmean(samples),
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+    }
+
+
+def percentile(sorted_samples, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_samples:
+        return 0.0
+    index = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
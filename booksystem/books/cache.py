@@ -0,0 +1,130 @@
+# books/cache.py
+"""
+Caching for the catalog pages.
+
+Everything cached here lives under the current *catalog version*. Saving or
+deleting a Book or BorrowRecord, or any borrow/return in books.services,
+replaces the version, which makes every older entry unreachable at once; no
+key ever needs to be deleted individually. The ``catalog`` cache alias picks
+the backend (local memory, files or Redis, see settings.CACHES).
+"""
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = 'catalog'
+VERSION_KEY = 'catalog:version'
+METRIC_KEY = 'catalog:metrics:{name}:{outcome}'
+
+_missing = object()
+
+
+def catalog_cache():
+    return caches[CACHE_ALIAS]
+
+
+def catalog_version():
+    """
+    Return the current catalog version, starting a new one if it was evicted.
+    """
+    cache = catalog_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        # add() so that two processes starting a version at once agree on one
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidate everything cached for the catalog, now and again at commit.
+
+    Bumping before commit hides stale entries from this request; bumping
+    again after commit drops anything another request cached from the
+    pre-commit state in between. A fresh timestamp rather than incr() keeps
+    it a single atomic set() on every backend.
+    """
+    _set_new_version()
+    transaction.on_commit(_set_new_version)
+
+
+def _set_new_version():
+    catalog_cache().set(VERSION_KEY, time.time_ns(), None)
+
+
+def make_key(name, *parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'catalog:{name}:{catalog_version()}:{digest}'
+
+
+def cached(name, parts, build):
+    """
+    Return the cached result of ``build()`` for ``parts`` under the current version.
+    """
+    cache = catalog_cache()
+    key = make_key(name, *parts)
+    value = cache.get(key, _missing)
+    if value is _missing:
+        record(name, 'miss')
+        value = build()
+        cache.set(key, value, settings.CATALOG_CACHE_TIMEOUT)
+    else:
+        record(name, 'hit')
+    return value
+
+
+async def acached(name, parts, build):
+    """
+    Async ``cached()`` for an async ``build()``.
+    """
+    cache = catalog_cache()
+    key = await sync_to_async(make_key)(name, *parts)
+    value = await cache.aget(key, _missing)
+    if value is _missing:
+        await sync_to_async(record)(name, 'miss')
+        value = await build()
+        await cache.aset(key, value, settings.CATALOG_CACHE_TIMEOUT)
+    else:
+        await sync_to_async(record)(name, 'hit')
+    return value
+
+
+def record(name, outcome):
+    cache = catalog_cache()
+    key = METRIC_KEY.format(name=name, outcome=outcome)
+    # incr() fails on a missing key, add() initialises it without racing another process
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def stats(names):
+    """
+    Return ``{name: {'hit': n, 'miss': n}}`` for the given cache names.
+    """
+    cache = catalog_cache()
+    keys = {METRIC_KEY.format(name=name, outcome=outcome): (name, outcome)
+            for name in names for outcome in ('hit', 'miss')}
+    values = cache.get_many(list(keys))
+    result = {name: {'hit': 0, 'miss': 0} for name in names}
+    for key, (name, outcome) in keys.items():
+        result[name][outcome] = values.get(key, 0)
+    return result
+
+
+def template_context():
+    """
+    Context for ``{% cache %}`` fragments in the catalog templates.
+    """
+    return {
+        'catalog_version': catalog_version(),
+        'catalog_cache_timeout': settings.CATALOG_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,76 @@
+# books/changelog.py
+"""
+Change feed for local copies of the catalog, such as the self-service kiosks.
+
+Every save or delete of a Book or BorrowRecord appends a ChangeLog row in
+the same transaction: the receivers in books.models log the ones made
+through model instances, and books.services logs its queryset updates
+itself. The row id is the sync token. A replica downloads the catalog once,
+then asks for the changes after the last token it applied and gets the
+current state of each changed object, or learns that it is gone. Keeping
+up costs O(changes), not O(catalog).
+
+SQLite runs one write transaction at a time, so tokens become visible in
+order. On PostgreSQL a long transaction can commit a lower token after a
+replica has read past it; the object shows up again with its next change.
+
+``compact`` (``manage.py compact_changelog``) keeps the log small. It drops
+entries superseded by a newer one for the same object, which no replica
+needs because only current state is served, and every entry older than
+CHANGELOG_RETENTION_DAYS. Tokens from before the latter are refused, and
+those replicas download the catalog again.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .models import ChangeLog, ChangeLogWatermark
+
+
+def horizon():
+    """
+    Return the oldest token ``changes_since`` still accepts.
+    """
+    return ChangeLogWatermark.objects.filter(pk=1).values_list('pruned_through', flat=True).first() or 0
+
+
+def latest_token():
+    return ChangeLog.objects.aggregate(token=Max('id'))['token'] or horizon()
+
+
+def changes_since(token, limit, kinds=(ChangeLog.BOOK,)):
+    """
+    Return ``(changes, next_token, more)`` for up to ``limit`` entries after ``token``.
+
+    ``changes`` holds one ``(token, kind, object_id)`` per object, its latest.
+    Returns None when entries after ``token`` have been compacted away.
+    """
+    if token < horizon():
+        return None
+    entries = list(ChangeLog.objects.filter(id__gt=token, kind__in=kinds)
+                   .order_by('id').values_list('id', 'kind', 'object_id')[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+    latest = {(kind, object_id): entry_id for entry_id, kind, object_id in entries}
+    changes = sorted((entry_id, kind, object_id) for (kind, object_id), entry_id in latest.items())
+    return changes, entries[-1][0] if entries else token, more
+
+
+def compact(now=None):
+    """
+    Drop superseded and expired entries; return how many of each went.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=settings.CHANGELOG_RETENTION_DAYS)
+    newer = ChangeLog.objects.filter(kind=OuterRef('kind'), object_id=OuterRef('object_id'), id__gt=OuterRef('id'))
+    with transaction.atomic():
+        superseded, _ = ChangeLog.objects.filter(Exists(newer)).delete()
+        # Cut a prefix of the log, so one watermark describes what is gone
+        through = ChangeLog.objects.filter(changed_at__lt=cutoff).aggregate(token=Max('id'))['token']
+        expired = 0
+        if through:
+            expired, _ = ChangeLog.objects.filter(id__lte=through).delete()
+            ChangeLogWatermark.objects.update_or_create(pk=1, defaults={'pruned_through': through})
+    return superseded, expired
@@ -0,0 +1,110 @@
+# books/events.py
+"""
+Live availability updates for the catalog pages.
+
+Whenever a loan changes a book's available copies, the new count is pushed
+to every browser listening on the ``availability_events`` Server-Sent
+Events stream, so the list pages update in place instead of being polled.
+
+The broker lives in this process: each subscriber is an asyncio queue on
+the event loop of the ASGI server, fed from whichever thread committed the
+change. That covers a single uvicorn worker; several workers would need a
+shared channel (e.g. Redis pub/sub) in front of ``publish``. Nothing is
+queried unless someone is listening.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Book, BorrowRecord
+
+EVENT = 'availability'
+QUEUE_SIZE = 100
+
+
+class Broker:
+    """
+    Fan events out to the queues of the current subscribers.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+    def __bool__(self):
+        return bool(self.subscribers)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self.lock:
+            self.subscribers.add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self.lock:
+                self.subscribers.discard(subscriber)
+
+    def publish(self, data):
+        """
+        Queue ``data`` for every subscriber; safe to call from any thread.
+        """
+        event = (next(self.ids), data)
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:  # The subscriber's loop has shut down
+                pass
+
+
+def _offer(queue, event):
+    # A client that falls this far behind only misses counts a later event corrects
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+broker = Broker()
+
+
+def publish_availability(book_ids):
+    """
+    Send the current copy counts of ``book_ids`` to the subscribers.
+    """
+    rows = Book.objects.filter(pk__in=book_ids).values('id', 'available_count', 'total_copies')
+    for row in rows:
+        broker.publish(row)
+
+
+def availability_changed(book_ids):
+    """
+    Publish the counts of ``book_ids`` once the current transaction commits.
+    """
+    if broker:
+        book_ids = set(book_ids)
+        transaction.on_commit(lambda: publish_availability(book_ids))
+
+
+def format_event(event_id, data):
+    return f'id: {event_id}\nevent: {EVENT}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+@receiver(post_save, sender=BorrowRecord)
+@receiver(post_delete, sender=BorrowRecord)
+def loan_changed(sender, instance, **kwargs):
+    availability_changed([instance.book_id])
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, **kwargs):
+    # An edit may change total_copies
+    availability_changed([instance.pk])
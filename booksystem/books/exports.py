@@ -0,0 +1,123 @@
+# books/exports.py
+"""
+Streaming CSV / NDJSON exports of the catalog and loan history.
+
+Rows are read with ``.iterator(chunk_size=...)`` (a server-side cursor on
+PostgreSQL) and encoded one at a time, so memory use does not grow with the
+size of the export. Under ASGI, Django would collect a plain iterator into
+a list before sending any of it, so ``astream`` hands the lines over
+CHUNK_SIZE at a time from the thread the queries run on.
+"""
+import csv
+import datetime
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Book, BorrowRecord
+
+CHUNK_SIZE = 2000
+
+EXPORTS = {
+    'books': {
+        'queryset': lambda: Book.objects.all(),
+        'date_field': 'registered_date',
+        'fields': ('id', 'title', 'author', 'description', 'total_copies', 'available_count', 'registered_date'),
+    },
+    'loans': {
+        'queryset': lambda: BorrowRecord.objects.all(),
+        'date_field': 'borrow_date',
+        'fields': ('id', 'book_id', 'book__title', 'borrower_id', 'borrower_name',
+                   'borrow_date', 'due_date', 'return_date'),
+    },
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line back to csv.writer's caller.
+    """
+
+    def write(self, value):
+        return value
+
+
+def parse_bound(value, end=False):
+    """
+    Parse a ``since``/``until`` filter: an ISO date or datetime.
+
+    A bare date used as the upper bound includes that whole day.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value!r}")
+        if end:
+            day += datetime.timedelta(days=1)
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    elif end:
+        moment += datetime.timedelta(microseconds=1)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_rows(kind, since=None, until=None):
+    """
+    Return ``(fields, rows)`` for an export, ``rows`` being a lazy iterator of tuples.
+    """
+    spec = EXPORTS[kind]
+    queryset = spec['queryset']()
+    date_field = spec['date_field']
+    if since:
+        queryset = queryset.filter(**{f'{date_field}__gte': since})
+    if until:
+        queryset = queryset.filter(**{f'{date_field}__lt': until})
+    rows = queryset.order_by('id').values_list(*spec['fields']).iterator(chunk_size=CHUNK_SIZE)
+    return spec['fields'], rows
+
+
+def csv_lines(fields, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(fields, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def stream(kind, output_format, since=None, until=None):
+    """
+    Yield the encoded lines of an export.
+    """
+    fields, rows = export_rows(kind, since, until)
+    encode = csv_lines if output_format == 'csv' else ndjson_lines
+    return encode(fields, rows)
+
+
+async def astream(kind, output_format, since=None, until=None):
+    """
+    ``stream()`` as an async iterator, yielding CHUNK_SIZE lines at a time.
+    """
+    lines = stream(kind, output_format, since, until)
+    # The database cursor belongs to one thread; thread_sensitive keeps every chunk on it
+    next_chunk = sync_to_async(lambda: ''.join(islice(lines, CHUNK_SIZE)))
+    while chunk := await next_chunk():
+        yield chunk
@@ -1,6 +1,10 @@
 # books/forms.py
 from django import forms
-from .models import Book
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from . import exports, images, services
+from .models import Book, ChangeLog
 from django.contrib.auth import get_user_model
 
 CustomUser = get_user_model()
@@ -9,7 +13,101 @@ CustomUser = get_user_model()
 class BookForm(forms.ModelForm):
     class Meta:
         model = Book
-        fields = ['title', 'author', 'description','image']
+        fields = ['title', 'author', 'description', 'total_copies', 'image']
+
+    def clean_total_copies(self):
+        total = self.cleaned_data['total_copies']
+        if total < 1:
+            raise forms.ValidationError("A book needs at least one copy.")
+        if self.instance.pk:
+            on_loan = self.instance.total_copies - self.instance.available_count
+            if total < on_loan:
+                raise forms.ValidationError(f"{on_loan} copies are currently on loan.")
+        return total
+
+    def save(self, commit=True):
+        """
+        Save the book, or return None with a form error if copies to remove were lent meanwhile.
+        """
+        book = super().save(commit=False)
+        if 'image' in self.changed_data:
+            book.image_variants = None  # Those of the old image until the new ones are written
+        if not commit:
+            return book
+        if book._state.adding:
+            book.available_count = book.total_copies
+            book.save()
+        else:
+            # Never write back the counter read with the form: borrows may have moved it since
+            added = book.total_copies - self.initial['total_copies']
+            counters = Book.objects.filter(pk=book.pk)
+            if added < 0:
+                # clean_total_copies() saw the shelf as it was when the form was read
+                counters = counters.filter(available_count__gte=-added)
+            # One transaction, so the change log entry written on save covers the counters too
+            with transaction.atomic(), ChangeLog.objects.batch():
+                if not counters.update(
+                    total_copies=F('total_copies') + added,
+                    available_count=F('available_count') + added,
+                    updated_at=timezone.now(),
+                ):
+                    self.add_error('total_copies', "Copies were just borrowed; there are not enough on the "
+                                                   "shelf to remove that many.")
+                    return None
+                fields = [name for name in self._meta.fields if name != 'total_copies']
+                book.save(update_fields=[*fields, 'image_variants'])
+                if added > 0:
+                    services.serve_holds([book.pk])
+            book.refresh_from_db(fields=['total_copies', 'available_count'])
+        self.save_m2m()
+        if book.image and 'image' in self.changed_data:
+            images.schedule_variants(book.image.name)
+        return book
+
+
+class LoanFilterForm(forms.Form):
+    """
+    Filters of the admin loan ledger, read from the query string.
+    """
+    STATUS_CHOICES = [('', 'All'), ('open', 'Borrowed'), ('overdue', 'Overdue'), ('returned', 'Returned')]
+
+    status = forms.ChoiceField(choices=STATUS_CHOICES, required=False)
+    since = forms.CharField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    until = forms.CharField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    borrower = forms.CharField(required=False, max_length=200)
+
+    def _clean_bound(self, name, end=False):
+        try:
+            return exports.parse_bound(self.cleaned_data[name], end=end)
+        except ValueError:
+            raise forms.ValidationError("Enter a date such as 2024-01-31.")
+
+    def clean_since(self):
+        return self._clean_bound('since')
+
+    def clean_until(self):
+        return self._clean_bound('until', end=True)
+
+    def filter(self, loans):
+        """
+        Narrow ``loans`` by every filter that validated; invalid ones are ignored.
+        """
+        self.is_valid()
+        data = getattr(self, 'cleaned_data', {})
+        status = data.get('status')
+        if status == 'open':
+            loans = loans.filter(return_date__isnull=True)
+        elif status == 'overdue':
+            loans = loans.filter(return_date__isnull=True, due_date__lt=timezone.now())
+        elif status == 'returned':
+            loans = loans.filter(return_date__isnull=False)
+        if data.get('since'):
+            loans = loans.filter(borrow_date__gte=data['since'])
+        if data.get('until'):
+            loans = loans.filter(borrow_date__lt=data['until'])
+        if data.get('borrower'):
+            loans = loans.filter(borrower_name__istartswith=data['borrower'])
+        return loans
 
 
 class CustomUserEditForm(forms.ModelForm):
@@ -0,0 +1,116 @@
+# books/images.py
+"""
+Resized cover variants for Book.image.
+
+Uploads are kept as they are; next to each original we store one JPEG and
+one WebP per width in settings.IMAGE_VARIANT_WIDTHS, e.g.
+``images/alice.jpg`` -> ``images/alice_w200.webp``. Originals narrower than
+a width are never scaled up: their variant is named after the width they
+really have, and widths that would repeat it are left out. Resizing runs
+in a small thread pool after the upload's transaction commits, so the
+request that saved the form never waits on Pillow.
+
+The widths written are recorded in Book.image_variants, so rendering a
+cover needs neither the storage nor the image itself.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version
+from .models import Book
+
+logger = logging.getLogger(__name__)
+
+# Every width is written in each of these formats
+FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}
+QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(name, width, extension):
+    root, _ = os.path.splitext(name)
+    return f'{root}_w{width}.{extension}'
+
+
+def variant_widths(width):
+    """
+    The variant widths for an original ``width`` pixels wide, narrowest first.
+    """
+    return sorted({min(target, width) for target in settings.IMAGE_VARIANT_WIDTHS})
+
+
+def generate_variants(name, storage=default_storage):
+    """
+    Write every resized variant of the image stored at ``name`` and return their widths.
+    """
+    with storage.open(name, 'rb') as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    widths = variant_widths(image.width)
+    for width in widths:
+        resized = image.copy()
+        if resized.width > width:
+            resized.thumbnail((width, resized.height), Image.LANCZOS)
+        for extension, image_format in FORMATS.items():
+            frame = resized.convert('RGB') if image_format == 'JPEG' else resized
+            buffer = io.BytesIO()
+            frame.save(buffer, image_format, quality=QUALITY, optimize=True)
+            target = variant_name(name, width, extension)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+    return widths
+
+
+def record_variants(name, widths):
+    """
+    Store ``widths`` on the books whose cover is ``name``.
+    """
+    if Book.objects.filter(image=name).update(image_variants=widths):
+        bump_catalog_version()
+
+
+def _executor_instance():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_PIPELINE_WORKERS,
+                                           thread_name_prefix='book-images')
+        return _executor
+
+
+def _generate_safely(name):
+    try:
+        record_variants(name, generate_variants(name))
+    except Exception:
+        logger.exception("Could not generate variants for %s", name)
+    finally:
+        connection.close()
+
+
+def schedule_variants(name):
+    """
+    Generate the variants of ``name`` in the background once the current transaction commits.
+    """
+    transaction.on_commit(lambda: _executor_instance().submit(_generate_safely, name))
+
+
+def srcset(name, widths, extension, storage=default_storage):
+    """
+    Build an ``srcset`` attribute value for the variants of ``name`` in ``widths``.
+    """
+    return ', '.join(f'{storage.url(variant_name(name, width, extension))} {width}w' for width in widths)
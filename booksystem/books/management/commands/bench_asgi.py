@@ -0,0 +1,140 @@
+# books/management/commands/bench_asgi.py
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from books.benchmarks import fake_books, percentile
+from books.models import Book
+
+HOST = 'localhost'
+DUMMY_CACHE = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
+
+class Command(BaseCommand):
+    help = ("Compare the catalog pages served by the sync WSGI handler on a thread pool with the "
+            "async ASGI handler on one event loop, at the same client concurrency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight at once.")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="WSGI worker threads, e.g. gunicorn workers x threads.")
+        parser.add_argument('--books', type=int, default=200, help="Books created for the run and deleted after.")
+        parser.add_argument('--db-latency', type=float, default=0.0,
+                            help="Milliseconds added to every query, to mimic a database across the network.")
+        parser.add_argument('--cold', action='store_true', help="Bypass the catalog cache.")
+        parser.add_argument('--path', action='append',
+                            help="Path to request (repeatable; default: the book list and available books).")
+
+    def handle(self, *args, **options):
+        paths = options['path'] or [reverse('book_list'), reverse('available_books')]
+        if options['db_latency']:
+            self._add_latency(options['db_latency'] / 1000)
+
+        created = Book.objects.bulk_create(fake_books(options['books'], seed=7), batch_size=1000)
+        cold = override_settings(CACHES={**settings.CACHES, 'catalog': DUMMY_CACHE}) if options['cold'] else nullcontext()
+        try:
+            with cold:
+                self.stdout.write(f"{options['requests']} requests, {options['concurrency']} in flight, "
+                                  f"paths: {', '.join(paths)}")
+                self._report('WSGI', *self._run_wsgi(paths, options))
+                self._report('ASGI', *asyncio.run(self._run_asgi(paths, options)))
+        finally:
+            Book.objects.filter(pk__in=[book.pk for book in created]).delete()
+
+    def _add_latency(self, seconds):
+        def delay(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+
+        # Every thread opens its own connection, so hook them all as they are created
+        connection_created.connect(install, weak=False)
+        install(None, connection)
+
+    def _run_wsgi(self, paths, options):
+        handler = WSGIHandler()
+        workers = threading.BoundedSemaphore(options['threads'])
+
+        def call(number):
+            path = paths[number % len(paths)]
+            split = urlsplit(path)
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': split.path, 'QUERY_STRING': split.query,
+                'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST, 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+            }
+            started = time.perf_counter()
+            statuses = []
+            # A client's wait for a free worker thread counts towards its latency
+            with workers:
+                body = handler(environ, lambda status, headers: statuses.append(status))
+                for _ in body:
+                    pass
+                body.close()
+            return (time.perf_counter() - started) * 1000, statuses[0].startswith('200')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(call, range(options['requests'])))
+        return results, time.perf_counter() - started
+
+    async def _run_asgi(self, paths, options):
+        handler = ASGIHandler()
+        limit = asyncio.Semaphore(options['concurrency'])
+
+        async def call(number):
+            path = paths[number % len(paths)]
+            split = urlsplit(path)
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': split.path, 'raw_path': split.path.encode(),
+                'query_string': split.query.encode(), 'root_path': '', 'headers': [(b'host', HOST.encode())],
+                'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+            }
+            done = asyncio.Event()
+            statuses, requested = [], []
+
+            async def receive():
+                if not requested:
+                    requested.append(True)
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif not message.get('more_body'):
+                    done.set()
+
+            async with limit:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return (time.perf_counter() - started) * 1000, statuses == [200]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call(number) for number in range(options['requests'])))
+        return results, time.perf_counter() - started
+
+    def _report(self, label, results, elapsed):
+        samples = sorted(latency for latency, _ in results)
+        failed = sum(1 for _, ok in results if not ok)
+        self.stdout.write(
+            f"  {label}  {len(results) / elapsed:,.0f} req/s  p50 {percentile(samples, 50):.1f} ms  "
+            f"p95 {percentile(samples, 95):.1f} ms  p99 {percentile(samples, 99):.1f} ms  {failed} failed")
@@ -0,0 +1,107 @@
+# books/management/commands/bench_contention.py
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from books import services
+from books.benchmarks import fake_books, percentile
+from books.models import Book, BorrowRecord, ChangeLog
+
+# Loans whose change log entries are deleted per query, below SQLite's variable limit
+CLEANUP_BATCH = 500
+
+
+class Command(BaseCommand):
+    help = ("Hammer borrow/return from many threads against the configured database and report "
+            "throughput, latency and lock errors (data is created for the run and deleted after).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run.")
+        parser.add_argument('--books', type=int, default=5,
+                            help="Books shared by all threads; fewer books means hotter rows.")
+        parser.add_argument('--copies', type=int, default=3)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        self.stdout.write(f"Backend: {self._describe()}")
+        since = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        users = User.objects.bulk_create(
+            User(username=f'bench-contention-{n}', password='!') for n in range(options['threads']))
+        books = list(fake_books(options['books'], seed=3))
+        for book in books:
+            book.total_copies = book.available_count = options['copies']
+        Book.objects.bulk_create(books)
+        # Let connections opened by the threads see the rows
+        connection.close()
+
+        stop = time.monotonic() + options['duration']
+        barrier = threading.Barrier(options['threads'])
+        results = []
+
+        def worker(number):
+            user, samples, locked = users[number], [], 0
+            book_id = books[number % len(books)].pk
+            barrier.wait()
+            try:
+                while time.monotonic() < stop:
+                    started = time.perf_counter()
+                    try:
+                        record = services.borrow_book(book_id, user)
+                        if record:
+                            services.return_loan(record)
+                    except OperationalError:
+                        locked += 1
+                        continue
+                    samples.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+                results.append((samples, locked))
+
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(options['threads'])]
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            elapsed = time.perf_counter() - started
+            self._clean_up(books, users, since)
+
+        samples = sorted(sample for thread_samples, _ in results for sample in thread_samples)
+        locked = sum(count for _, count in results)
+        self.stdout.write(
+            f"  {len(samples) / elapsed:,.0f} borrow+return/s  p50 {percentile(samples, 50):.1f} ms  "
+            f"p95 {percentile(samples, 95):.1f} ms  p99 {percentile(samples, 99):.1f} ms  "
+            f"{locked} 'database is locked' errors")
+
+    def _clean_up(self, books, users, since):
+        """
+        Delete the rows of the run and the change log entries after token ``since`` that name them.
+        """
+        book_ids = [book.pk for book in books]
+        loan_ids = list(BorrowRecord.objects.filter(book__in=book_ids).values_list('pk', flat=True))
+        BorrowRecord.objects.filter(book__in=book_ids).delete()
+        Book.objects.filter(pk__in=book_ids).delete()
+        get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+        entries = ChangeLog.objects.filter(id__gt=since)
+        entries.filter(kind=ChangeLog.BOOK, object_id__in=book_ids).delete()
+        for start in range(0, len(loan_ids), CLEANUP_BATCH):
+            entries.filter(kind=ChangeLog.LOAN, object_id__in=loan_ids[start:start + CLEANUP_BATCH]).delete()
+
+    def _describe(self):
+        settings_dict = connection.settings_dict
+        if connection.vendor != 'sqlite':
+            pooled = 'pool' in settings_dict['OPTIONS']
+            return (f"{connection.vendor}, "
+                    f"{'pooled' if pooled else 'CONN_MAX_AGE=%s' % settings_dict['CONN_MAX_AGE']}")
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        options = settings_dict['OPTIONS']
+        return (f"sqlite, journal_mode={journal_mode}, "
+                f"transaction_mode={options.get('transaction_mode', 'DEFERRED')}, timeout={options.get('timeout', 5)}s")
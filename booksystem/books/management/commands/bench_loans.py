@@ -0,0 +1,78 @@
+# books/management/commands/bench_loans.py
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from books.benchmarks import fake_books, measure, rolled_back
+from books.models import Book, BorrowRecord
+
+
+def fetch_all(cursor, sql, params):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = "Benchmark open-loan lookups against a large loan history (changes are rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=2000000, help="Historical BorrowRecords to generate.")
+        parser.add_argument('--books', type=int, default=50000)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--open-ratio', type=float, default=0.01, help="Share of loans still open.")
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        User = get_user_model()
+        batch_size = options['batch_size']
+
+        with rolled_back():
+            users = User.objects.bulk_create(
+                (User(username=f'bench-reader-{n}', password='!') for n in range(options['users'])),
+                batch_size=batch_size,
+            )
+            books = Book.objects.bulk_create(fake_books(options['books'], seed=options['seed']), batch_size=batch_size)
+            self.stdout.write(f"Generating {options['records']} loans...")
+            now = timezone.now()
+            created = 0
+            while created < options['records']:
+                batch = []
+                for _ in range(min(batch_size, options['records'] - created)):
+                    user, book = rng.choice(users), rng.choice(books)
+                    borrowed = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 5))
+                    is_open = rng.random() < options['open_ratio']
+                    batch.append(BorrowRecord(
+                        book=book, borrower=user, borrower_name=user.username,
+                        borrow_date=borrowed, due_date=borrowed + timedelta(days=5),
+                        return_date=None if is_open else borrowed + timedelta(days=rng.randint(1, 10)),
+                    ))
+                BorrowRecord.objects.bulk_create(batch)
+                created += len(batch)
+
+            lookups = {
+                'open loan by book': lambda: BorrowRecord.objects.filter(
+                    book=rng.choice(books), return_date__isnull=True).order_by('pk')[:1],
+                'open loans by user': lambda: BorrowRecord.objects.select_related('book').filter(
+                    borrower=rng.choice(users), return_date__isnull=True).order_by('-borrow_date'),
+            }
+            for label, lookup in lookups.items():
+                stats = measure(lambda: list(lookup()), options['repeat'])
+                # The same statements through the cursor: the index lookup without building models
+                statements = iter([lookup().query.sql_with_params() for _ in range(options['repeat'])])
+                with connection.cursor() as cursor:
+                    sql = measure(lambda: fetch_all(cursor, *next(statements)), options['repeat'])
+                self.stdout.write(f"  {label:<20} mean {stats['mean']:.3f} ms  "
+                                  f"p50 {stats['p50']:.3f} ms  p95 {stats['p95']:.3f} ms  "
+                                  f"(SQL alone: mean {sql['mean']:.3f} ms  p95 {sql['p95']:.3f} ms)")
+
+            plan = BorrowRecord.objects.filter(book=books[0], return_date__isnull=True).explain()
+            self.stdout.write(f"  plan (by book): {plan}")
+            plan = BorrowRecord.objects.filter(borrower=users[0], return_date__isnull=True).order_by('-borrow_date').explain()
+            self.stdout.write(f"  plan (by user): {plan}")
@@ -0,0 +1,48 @@
+# books/management/commands/bench_search.py
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from books.benchmarks import fake_books, measure, rolled_back
+from books.models import Book
+from books.search import search_books
+
+
+class Command(BaseCommand):
+    help = "Benchmark catalog search latency against synthetic catalogs (changes are rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help="Comma separated catalog sizes to measure.")
+        parser.add_argument('--queries', default='meadow,harbor lantern,orch,morrison',
+                            help="Comma separated search strings.")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--legacy', action='store_true',
+                            help="Also time the old icontains scan for comparison.")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        queries = [query.strip() for query in options['queries'].split(',') if query.strip()]
+
+        with rolled_back():
+            created = 0
+            for size in sizes:
+                while created < size:
+                    batch = min(options['batch_size'], size - created)
+                    Book.objects.bulk_create(fake_books(batch, start=created), batch_size=batch)
+                    created += batch
+                self.stdout.write(f"{size} books")
+
+                for query in queries:
+                    stats = measure(lambda: list(search_books(Book.objects.all(), query)[:20]),
+                                    options['repeat'])
+                    self.stdout.write(self._row('indexed', query, stats))
+                    if options['legacy']:
+                        stats = measure(lambda: list(Book.objects.filter(
+                            Q(title__icontains=query) | Q(author__icontains=query)
+                        ).order_by('-registered_date')[:20]), options['repeat'])
+                        self.stdout.write(self._row('icontains', query, stats))
+
+    def _row(self, label, query, stats):
+        return (f"  {label:<10} {query!r:<20} mean {stats['mean']:8.2f} ms  "
+                f"p50 {stats['p50']:8.2f} ms  p95 {stats['p95']:8.2f} ms")
@@ -0,0 +1,17 @@
+# books/management/commands/catalog_cache_stats.py
+from django.core.management.base import BaseCommand
+
+from books import cache
+
+CACHED_QUERIES = ('shelf', 'all_books')
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counts for the catalog cache."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Catalog version: {cache.catalog_version()}")
+        for name, counts in cache.stats(CACHED_QUERIES).items():
+            total = counts['hit'] + counts['miss']
+            ratio = counts['hit'] / total if total else 0
+            self.stdout.write(f"  {name:<12} hits {counts['hit']:>8}  misses {counts['miss']:>8}  hit ratio {ratio:.1%}")
@@ -0,0 +1,13 @@
+# books/management/commands/compact_changelog.py
+from django.core.management.base import BaseCommand
+
+from books import changelog
+
+
+class Command(BaseCommand):
+    help = "Drop superseded and expired change log entries (see books.changelog)."
+
+    def handle(self, *args, **options):
+        superseded, expired = changelog.compact()
+        self.stdout.write(f"Removed {superseded} superseded and {expired} expired entries; "
+                          f"replicas behind token {changelog.horizon()} must download the catalog again.")
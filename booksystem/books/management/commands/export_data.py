@@ -0,0 +1,31 @@
+# books/management/commands/export_data.py
+from django.core.management.base import BaseCommand, CommandError
+
+from books import exports
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog or loan history as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--format', choices=sorted(exports.CONTENT_TYPES), default='csv')
+        parser.add_argument('--since', help="Only rows dated on or after this ISO date/datetime.")
+        parser.add_argument('--until', help="Only rows dated up to this ISO date/datetime (a date includes the whole day).")
+        parser.add_argument('--output', '-o', help="File to write; standard output by default.")
+
+    def handle(self, *args, **options):
+        try:
+            since = exports.parse_bound(options['since'])
+            until = exports.parse_bound(options['until'], end=True)
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        lines = exports.stream(options['kind'], options['format'], since, until)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            self.stdout.ending = ''
+            for line in lines:
+                self.stdout.write(line)
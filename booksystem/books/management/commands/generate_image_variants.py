@@ -0,0 +1,43 @@
+# books/management/commands/generate_image_variants.py
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from books import images
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Generate resized cover variants for existing Book images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that already exist.")
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_PIPELINE_WORKERS)
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(image='').exclude(image__isnull=True)
+        names = set(books.values_list('image', flat=True))
+        pending = names if options['force'] else set(
+            books.filter(image_variants__isnull=True).values_list('image', flat=True))
+        generated, skipped, failed = 0, len(names - pending), 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for result in executor.map(self._generate, sorted(pending)):
+                if result is None:
+                    failed += 1
+                else:
+                    generated += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated variants for {generated} images ({skipped} already done, {failed} failed)."))
+
+    def _generate(self, name):
+        try:
+            widths = images.generate_variants(name)
+            images.record_variants(name, widths)
+            return widths
+        except Exception as exc:
+            self.stderr.write(f"{name}: {exc}")
+            return None
+        finally:
+            connection.close()
@@ -0,0 +1,142 @@
+# books/management/commands/import_books.py
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from books.cache import bump_catalog_version
+from books.forms import BookForm
+from books.models import Book, ChangeLog
+
+
+class Command(BaseCommand):
+    help = "Stream books from a CSV or JSON Lines file into the catalog in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for standard input.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Input format; guessed from the file extension by default.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--checkpoint',
+                            help="Progress file used to resume an interrupted import (default: <path>.checkpoint).")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint.")
+        parser.add_argument('--max-errors', type=int, default=100,
+                            help="Abort after this many invalid rows.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        checkpoint = options['checkpoint'] or (None if path == '-' else f'{path}.checkpoint')
+        done = 0 if options['restart'] else self._read_checkpoint(checkpoint)
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            rows = self._rows(stream, input_format)
+            if done:
+                self.stdout.write(f"Resuming after row {done}.")
+                rows = islice(rows, done, None)
+            self._import(rows, done, checkpoint, options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def _rows(self, stream, input_format):
+        """
+        Yield each row as a dict, or a ValueError saying why a line is not one.
+        """
+        if input_format == 'csv':
+            yield from csv.DictReader(stream)
+            return
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield ValueError(f"line {line_number}: not valid JSON ({error.msg})")
+                continue
+            if not isinstance(row, dict):
+                yield ValueError(f"line {line_number}: expected an object, not {type(row).__name__}")
+                continue
+            yield row
+
+    def _import(self, rows, done, checkpoint, options):
+        started = time.perf_counter()
+        imported = errors = 0
+        batch = []
+        row_number = done
+
+        for row_number, row in enumerate(rows, start=done + 1):
+            book, details = self._build(row)
+            if book is None:
+                errors += 1
+                self.stderr.write(f"Row {row_number}: {details}")
+                if errors > options['max_errors']:
+                    raise CommandError(f"Too many invalid rows; stopped at row {row_number}.")
+                continue
+            batch.append(book)
+            if len(batch) >= options['batch_size']:
+                imported += self._flush(batch, row_number, checkpoint)
+                self._progress(imported, errors, started)
+
+        imported += self._flush(batch, row_number, checkpoint)
+        self._progress(imported, errors, started)
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} books ({errors} invalid rows skipped)."))
+
+    def _build(self, row):
+        """
+        Return ``(book, None)`` for a valid row, else ``(None, what is wrong with it)``.
+        """
+        if isinstance(row, ValueError):
+            return None, str(row)
+        # Default only a missing count; an explicit 0 is for the form to reject
+        if row.get('total_copies') in (None, ''):
+            row = {**row, 'total_copies': 1}
+        form = BookForm(data=row)
+        if not form.is_valid():
+            return None, '; '.join(f"{field}: {' '.join(messages)}" for field, messages in form.errors.items())
+        book = form.save(commit=False)
+        book.available_count = book.total_copies
+        return book, None
+
+    def _flush(self, batch, row_number, checkpoint):
+        """
+        Insert the batch in one transaction, then record how far we got.
+        """
+        count = len(batch)
+        if count:
+            with transaction.atomic():
+                Book.objects.bulk_create(batch, batch_size=count)
+                # bulk_create skips the post_save receivers that normally do this
+                bump_catalog_version()
+                ChangeLog.objects.record(books=[book.pk for book in batch])
+            batch.clear()
+        self._write_checkpoint(checkpoint, row_number)
+        return count
+
+    def _progress(self, imported, errors, started):
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(f"{imported} imported, {errors} invalid, {rate:,.0f} rows/s")
+
+    def _read_checkpoint(self, checkpoint):
+        if not checkpoint or not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as handle:
+            return int(handle.read().strip() or 0)
+
+    def _write_checkpoint(self, checkpoint, row_number):
+        if not checkpoint:
+            return
+        # Replace atomically so a crash mid-write never leaves a corrupt checkpoint
+        temporary = f'{checkpoint}.tmp'
+        with open(temporary, 'w') as handle:
+            handle.write(str(row_number))
+        os.replace(temporary, checkpoint)
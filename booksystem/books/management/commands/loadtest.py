@@ -0,0 +1,158 @@
+# books/management/commands/loadtest.py
+import http.client
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, build_opener
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from books.benchmarks import SEED_PASSWORD, WORDS, percentile
+
+# Raised for refused, dropped, reset or stalled connections (URLError is an OSError)
+CONNECTION_ERRORS = (OSError, http.client.HTTPException)
+
+
+def borrow_links():
+    prefix = reverse('borrow_book', args=[0]).removesuffix('0/')
+    return re.compile(r'href="{}(\d+)/"'.format(re.escape(prefix)))
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # Time each request on its own; a redirect counts as the success it is
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class VirtualUser:
+    """
+    One reader with their own cookies, walking login -> search -> borrow -> return.
+    """
+
+    def __init__(self, base_url, email, password, rng, record):
+        self.base_url = base_url.rstrip('/')
+        self.email, self.password = email, password
+        self.rng = rng
+        self.record = record
+        self.cookies = CookieJar()
+        self.borrow_links = borrow_links()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.failure = None
+
+    def request(self, name, path, data=None):
+        if data is not None:
+            data = urlencode({**data, 'csrfmiddlewaretoken': self.csrf_token()}).encode()
+        started = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, data, timeout=30) as response:
+                status, headers, body = response.status, response.headers, response.read().decode()
+        except HTTPError as error:
+            status, headers, body = error.code, error.headers, ''
+        except CONNECTION_ERRORS as error:
+            # Refused, reset or timed out: a failed request, counted under the error's name
+            reason = getattr(error, 'reason', error)
+            self.failure = reason if isinstance(reason, BaseException) else error
+            status, headers, body = type(self.failure).__name__, {}, ''
+        self.record(f"{name} {'POST' if data else 'GET'}", (time.perf_counter() - started) * 1000, status)
+        return status, headers.get('Location'), body
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def login(self):
+        status, _, _ = self.request('login', reverse('login'))
+        if not isinstance(status, int):
+            raise CommandError(f"Cannot reach {self.base_url}: {self.failure}")
+        # A failed login redirects too, back to the login page
+        status, location, _ = self.request('login', reverse('login'),
+                                           {'email': self.email, 'password': self.password})
+        return status == 302 and location != reverse('login')
+
+    def iteration(self):
+        query = self.rng.choice(WORDS)
+        _, _, page = self.request('book_list_user', f"{reverse('book_list_user')}?{urlencode({'q': query})}")
+        book_ids = self.borrow_links.findall(page)
+        if not book_ids:
+            return
+        book_id = self.rng.choice(book_ids)
+        self.request('borrow_book', reverse('borrow_book', args=[book_id]))
+        status, _, _ = self.request('borrow_book', reverse('borrow_book', args=[book_id]), {})
+        if status == 302:
+            self.request('return_book', reverse('return_book', args=[book_id]), {})
+
+
+class Command(BaseCommand):
+    help = ("Drive the login -> search -> borrow -> return flow against a running server with concurrent "
+            "virtual users (as created by seed_library) and report latency per URL name.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=10, help="Virtual users, one thread each.")
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run after logging in.")
+        parser.add_argument('--think-time', type=float, default=0.0, help="Seconds each user pauses between steps.")
+        parser.add_argument('--prefix', default='reader', help="Sign in as <prefix>.0@example.com, <prefix>.1@example.com, ...")
+        parser.add_argument('--password', default=SEED_PASSWORD)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        samples = defaultdict(list)
+        statuses = defaultdict(lambda: defaultdict(int))
+        lock = threading.Lock()
+        errors, signed_in = [], []
+
+        def record(name, elapsed_ms, status):
+            with lock:
+                samples[name].append(elapsed_ms)
+                statuses[name][status] += 1
+
+        users = [VirtualUser(options['base_url'], f"{options['prefix']}.{n}@example.com", options['password'],
+                             random.Random(options['seed'] + n), record)
+                 for n in range(options['concurrency'])]
+        barrier = threading.Barrier(len(users) + 1)
+        stop = []
+
+        def run(user):
+            try:
+                if user.login():
+                    signed_in.append(user)
+            except CommandError as error:
+                errors.append(error)
+            finally:
+                # Whatever happened, release the main thread waiting to start the clock
+                barrier.wait()
+            if user not in signed_in:
+                return
+            while not stop:
+                user.iteration()
+                time.sleep(options['think_time'])
+
+        threads = [threading.Thread(target=run, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        time.sleep(options['duration'])
+        stop.append(True)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise CommandError(errors[0])
+        if not signed_in:
+            raise CommandError("No virtual user could sign in; run seed_library first or check --prefix/--password.")
+
+        self.stdout.write(f"{len(signed_in)} of {len(users)} users signed in, ran {elapsed:.1f}s "
+                          f"against {options['base_url']}")
+        for name in sorted(samples):
+            latencies = sorted(samples[name])
+            codes = ', '.join(f'{status}: {count}' for status, count in sorted(statuses[name].items(), key=str))
+            self.stdout.write(
+                f"  {name:<22} {len(latencies):>6} req  {len(latencies) / elapsed:>7.1f}/s  "
+                f"p50 {percentile(latencies, 50):>7.1f} ms  p95 {percentile(latencies, 95):>7.1f} ms  "
+                f"p99 {percentile(latencies, 99):>7.1f} ms  [{codes}]")
@@ -0,0 +1,83 @@
+# books/management/commands/profile_report.py
+import json
+import statistics
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from books.benchmarks import percentile
+
+# Fields every record written by ProfilingMiddleware has
+FIELDS = {'method', 'view', 'path', 'wall_ms', 'sql_count', 'sql_ms', 'duplicates', 'slow'}
+
+SORT_KEYS = {
+    'total': lambda stats: stats['total_ms'],
+    'p95': lambda stats: stats['p95_ms'],
+    'sql': lambda stats: stats['mean_sql_count'],
+    'requests': lambda stats: stats['requests'],
+}
+
+
+class Command(BaseCommand):
+    help = "Summarize the request profiling log by endpoint (see booksystem.profiling)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help="Profiling log to read, rotated files included (default: PROFILING_LOG).")
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='total',
+                            help="Rank endpoints by total time, p95 latency, mean SQL count or request count.")
+
+    def handle(self, *args, **options):
+        path = Path(options['log'] or settings.PROFILING_LOG)
+        files = sorted(path.parent.glob(f'{path.name}*'), reverse=True) if path.parent.exists() else []
+        if not files:
+            raise CommandError(f"No profiling log at {path}.")
+
+        by_view = defaultdict(list)
+        skipped = 0
+        for file in files:
+            with open(file, encoding='utf-8', errors='replace') as handle:
+                for line in handle:
+                    if not line.strip():
+                        continue
+                    # A line cut short by a crash, or interleaved with another process's, is skipped
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    if not isinstance(record, dict) or not FIELDS <= record.keys():
+                        skipped += 1
+                        continue
+                    by_view[f"{record['method']} {record['view'] or record['path']}"].append(record)
+
+        summaries = [self._summarize(endpoint, records) for endpoint, records in by_view.items()]
+        summaries.sort(key=SORT_KEYS[options['sort']], reverse=True)
+        self.stdout.write(f"{sum(len(records) for records in by_view.values())} requests in {len(files)} file(s)"
+                          + (f", {skipped} unreadable line(s) skipped" if skipped else ''))
+        for stats in summaries[:options['top']]:
+            self.stdout.write(
+                f"  {stats['endpoint']:<40} {stats['requests']:>6} req  p50 {stats['p50_ms']:>8.1f} ms  "
+                f"p95 {stats['p95_ms']:>8.1f} ms  sql {stats['mean_sql_count']:>5.1f} q / {stats['mean_sql_ms']:>7.1f} ms  "
+                f"{stats['slow']} slow")
+            for sql, count in stats['duplicates']:
+                self.stdout.write(f"      {count}x duplicated: {sql[:120]}")
+
+    def _summarize(self, endpoint, records):
+        walls = sorted(record['wall_ms'] for record in records)
+        duplicates = Counter()
+        for record in records:
+            for duplicate in record['duplicates']:
+                duplicates[duplicate['sql']] += duplicate['count']
+        return {
+            'endpoint': endpoint,
+            'requests': len(records),
+            'total_ms': sum(walls),
+            'p50_ms': percentile(walls, 50),
+            'p95_ms': percentile(walls, 95),
+            'mean_sql_count': statistics.fmean(record['sql_count'] for record in records),
+            'mean_sql_ms': statistics.fmean(record['sql_ms'] for record in records),
+            'slow': sum(1 for record in records if record['slow']),
+            'duplicates': duplicates.most_common(3),
+        }
@@ -0,0 +1,36 @@
+# books/management/commands/refresh_circulation.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from books import circulation
+
+
+class Command(BaseCommand):
+    help = "Fold new borrows and returns into the circulation rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recompute the rollups from the whole loan history.")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep refreshing every this many seconds instead of running once.")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if options['rebuild']:
+            borrows, returns = circulation.rebuild()
+            self.stdout.write(f"Rebuilt from {borrows} borrows and {returns} returns.")
+            if not interval:
+                return
+            time.sleep(interval)
+        while True:
+            started = time.perf_counter()
+            borrows, returns = circulation.refresh()
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f"Added {borrows} borrows and {returns} returns ({elapsed:.1f} ms)")
+            if not interval:
+                return
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,118 @@
+# books/management/commands/seed_library.py
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from books import circulation, overdue
+from books.benchmarks import SEED_PASSWORD, fake_books, zipf_cum_weights
+from books.cache import bump_catalog_version
+from books.models import LOAN_PERIOD, Book, BorrowRecord
+
+COPIES = (1, 2, 3, 5)
+COPY_WEIGHTS = (50, 25, 15, 10)
+
+
+class Command(BaseCommand):
+    help = ("Fill the database with a large, deterministic library: users, books and a loan history "
+            "in which a few books and readers account for most loans.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--books', type=int, default=50000)
+        parser.add_argument('--loans', type=int, default=500000, help="Historical BorrowRecords.")
+        parser.add_argument('--open-ratio', type=float, default=0.02,
+                            help="Share of recent loans left open, as far as copies allow.")
+        parser.add_argument('--history-days', type=int, default=3 * 365)
+        parser.add_argument('--prefix', default='reader', help="Usernames are <prefix>-<n>.")
+        parser.add_argument('--password', default=SEED_PASSWORD, help="Password of every generated user.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if User.objects.filter(username=f"{options['prefix']}-0").exists():
+            raise CommandError(f"Users named {options['prefix']}-<n> already exist; pick another --prefix.")
+        rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.started = time.perf_counter()
+
+        with transaction.atomic():
+            users = self._users(User, rng, options)
+            books = self._books(rng, options)
+            self._loans(users, books, rng, options)
+            # bulk_create skips the post_save receivers that normally do this
+            bump_catalog_version()
+        overdue.refresh(now=self.now)
+        circulation.rebuild(now=self.now)
+        self._progress("Refreshed overdue summaries and circulation rollups.")
+
+    def _users(self, User, rng, options):
+        # One real hash shared by every row: hashing thousands of passwords would dominate the run
+        password = make_password(options['password'])
+        prefix, history = options['prefix'], timedelta(days=options['history_days'])
+        users = User.objects.bulk_create(
+            (User(username=f'{prefix}-{n}', email=f'{prefix}.{n}@example.com', password=password,
+                  date_joined=self.now - history * rng.random())
+             for n in range(options['users'])),
+            batch_size=options['batch_size'],
+        )
+        self._progress(f"{len(users)} users")
+        return users
+
+    def _books(self, rng, options):
+        history = timedelta(days=options['history_days'])
+        books = list(fake_books(options['books'], seed=options['seed']))
+        for book in books:
+            book.total_copies = book.available_count = rng.choices(COPIES, COPY_WEIGHTS)[0]
+            book.registered_date = self.now - history * rng.random()
+        Book.objects.bulk_create(books, batch_size=options['batch_size'])
+        self._progress(f"{len(books)} books")
+        return books
+
+    def _loans(self, users, books, rng, options):
+        # Popularity follows Zipf's law, in an order unrelated to ids or dates
+        books, users = rng.sample(books, len(books)), rng.sample(users, len(users))
+        book_weights, user_weights = zipf_cum_weights(len(books)), zipf_cum_weights(len(users))
+        open_loans = Counter()
+        recent = self.now - 2 * LOAN_PERIOD
+        created = 0
+        while created < options['loans']:
+            size = min(options['batch_size'], options['loans'] - created)
+            batch = []
+            for book, user in zip(rng.choices(books, cum_weights=book_weights, k=size),
+                                  rng.choices(users, cum_weights=user_weights, k=size)):
+                borrowed = book.registered_date + (self.now - book.registered_date) * rng.random()
+                returned = borrowed + timedelta(days=rng.uniform(0.5, 14))
+                can_stay_open = open_loans[book.pk] < book.total_copies
+                if can_stay_open and (returned > self.now or (borrowed > recent and rng.random() < options['open_ratio'])):
+                    returned = None
+                    open_loans[book.pk] += 1
+                else:
+                    returned = min(returned, self.now)
+                batch.append(BorrowRecord(book=book, borrower=user, borrower_name=user.username,
+                                          borrow_date=borrowed, due_date=borrowed + LOAN_PERIOD,
+                                          return_date=returned))
+            BorrowRecord.objects.bulk_create(batch)
+            created += len(batch)
+            self._progress(f"{created} loans")
+
+        # One UPDATE per distinct number of copies out, as in books.services
+        by_count = defaultdict(list)
+        for book_id, count in open_loans.items():
+            by_count[count].append(book_id)
+        for count, book_ids in by_count.items():
+            for start in range(0, len(book_ids), options['batch_size']):
+                Book.objects.filter(pk__in=book_ids[start:start + options['batch_size']]).update(
+                    available_count=F('total_copies') - count, updated_at=self.now)
+        self._progress(f"{sum(open_loans.values())} loans still open")
+
+    def _progress(self, message):
+        self.stdout.write(f"[{time.perf_counter() - self.started:7.1f}s] {message}")
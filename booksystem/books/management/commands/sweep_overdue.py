@@ -0,0 +1,29 @@
+# books/management/commands/sweep_overdue.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from books import overdue
+
+
+class Command(BaseCommand):
+    help = "Find overdue loans and refresh the per-user overdue counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep sweeping every this many seconds instead of running once.")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            started = time.perf_counter()
+            summaries = overdue.refresh()
+            loans = sum(summary.overdue_count for summary in summaries)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f"{loans} overdue loans across {len(summaries)} users ({elapsed:.1f} ms)")
+            if not interval:
+                return
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                return
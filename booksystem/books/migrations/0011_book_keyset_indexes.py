@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-registered_date', '-id'], name='book_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['available', '-registered_date', '-id'], name='book_available_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_borrowers(apps, schema_editor):
+    """
+    Link existing loans to the account whose username matches borrower_name.
+    """
+    BorrowRecord = apps.get_model('books', 'BorrowRecord')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    BorrowRecord.objects.filter(borrower__isnull=True).update(borrower=Subquery(
+        User.objects.filter(username=OuterRef('borrower_name')).values('pk')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_book_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='borrower',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='loans', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_borrowers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['book'], name='open_loans_by_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['borrower', '-borrow_date'], name='open_loans_by_borrower_idx'),
+        ),
+    ]
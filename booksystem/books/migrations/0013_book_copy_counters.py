@@ -0,0 +1,53 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+def copy_availability(apps, schema_editor):
+    """
+    Every existing row is a single copy; a borrowed one has none on the shelf.
+    """
+    Book = apps.get_model('books', 'Book')
+    Book.objects.filter(available=False).update(available_count=0)
+
+
+def restore_availability(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Book.objects.filter(available_count=0).update(available=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_borrowrecord_borrower'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_available_recent_idx',
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='available_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='total_copies',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(copy_availability, restore_availability),
+        migrations.RemoveField(
+            model_name='book',
+            name='available',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_count__gt', 0)), fields=['-registered_date', '-id'], name='book_on_shelf_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.CheckConstraint(condition=models.Q(('available_count__lte', models.F('total_copies'))), name='book_available_within_total'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_book_copy_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['-borrow_date', '-id'], name='loan_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:19
+
+import books.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('books', '0014_loan_ledger_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='overdue_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('overdue_count', models.PositiveIntegerField(default=0)),
+                ('oldest_due_date', models.DateTimeField()),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'overdue summaries',
+            },
+        ),
+        migrations.AlterField(
+            model_name='borrowrecord',
+            name='due_date',
+            field=models.DateTimeField(default=books.models.default_due_date),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['due_date'], name='open_loans_by_due_idx'),
+        ),
+    ]
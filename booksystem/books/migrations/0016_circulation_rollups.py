@@ -0,0 +1,63 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:21
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_overdue_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorCirculation',
+            fields=[
+                ('author', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('borrow_count', models.PositiveIntegerField(default=0)),
+                ('return_count', models.PositiveIntegerField(default=0)),
+                ('loan_time', models.DurationField(default=datetime.timedelta)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookCirculation',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='circulation', serialize=False, to='books.book')),
+                ('borrow_count', models.PositiveIntegerField(default=0)),
+                ('return_count', models.PositiveIntegerField(default=0)),
+                ('loan_time', models.DurationField(default=datetime.timedelta)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CirculationWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('processed_until', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCirculation',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+                ('borrow_count', models.PositiveIntegerField(default=0)),
+                ('return_count', models.PositiveIntegerField(default=0)),
+                ('loan_time', models.DurationField(default=datetime.timedelta)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('return_date__isnull', False)), fields=['return_date'], name='returned_loans_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authorcirculation',
+            index=models.Index(fields=['-borrow_count'], name='author_circulation_top_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookcirculation',
+            index=models.Index(fields=['-borrow_count'], name='book_circulation_top_idx'),
+        ),
+    ]
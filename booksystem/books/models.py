@@ -1,63 +1,298 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
 from django.utils import timezone
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.contrib.auth.models import User
+
+from .cache import bump_catalog_version
+from django.conf import settings
 from datetime import timedelta
 
+LOAN_PERIOD = timedelta(days=5)
+
+# Entries recorded inside ChangeLog.objects.batch(), keyed so each object is logged once
+_pending_changes = ContextVar('pending_changes', default=None)
+
+
+def default_due_date():
+    # A callable, so every loan gets its own due date rather than one fixed at import
+    return timezone.now() + LOAN_PERIOD
 
 
 
+class BookQuerySet(models.QuerySet):
+    def available(self):
+        """
+        Books with at least one copy on the shelf.
+        """
+        return self.filter(available_count__gt=0)
+
+
 class Book(models.Model):
     """added"""
     title = models.CharField(max_length=200)
     author = models.CharField(max_length=100)
     description = models.TextField()
     registered_date = models.DateTimeField(default=timezone.now)
-    available = models.BooleanField(default=True)
+    # One row per title; copies are counted instead of registered separately.
+    # available_count only ever moves through F() updates in books.services.
+    total_copies = models.PositiveIntegerField(default=1)
+    available_count = models.PositiveIntegerField(default=1)
     image = models.ImageField(upload_to='images/', blank=True, null=True)
+    # Widths of the resized covers books.images wrote for image; None until they exist
+    image_variants = models.JSONField(null=True, blank=True, editable=False)
+    # Bumped on every change, also by the queryset updates in books.services; drives API ETags
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination order for the catalog listings
+            models.Index(fields=['-registered_date', '-id'], name='book_recent_idx'),
+            models.Index(fields=['-registered_date', '-id'], condition=Q(available_count__gt=0),
+                         name='book_on_shelf_recent_idx'),
+            models.Index(fields=['updated_at'], name='book_updated_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=Q(available_count__lte=F('total_copies')),
+                                   name='book_available_within_total'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def available(self):
+        return self.available_count > 0
+
     @classmethod
     def get_all_books_with_status(cls):
         """
         Retrieve all books with their availability and status.
         """
-        books = cls.objects.all().values('id', 'title', 'author', 'available')
-        for book in books:
-            book['status'] = 'Available' if book['available'] else 'Borrowed'
-        return books
+        return cls.objects.values('id', 'title', 'author', 'total_copies', 'available_count', 'registered_date').annotate(
+            status=Case(When(available_count__gt=0, then=Value('Available')), default=Value('Borrowed'))
+        )
 
 
 
 class BorrowRecord(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
-    borrower_name = models.CharField(max_length=200)
+    borrower = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                 null=True, blank=True, related_name='loans')
+    borrower_name = models.CharField(max_length=200)  # Kept so history survives deleted accounts
     borrow_date = models.DateTimeField(default=timezone.now)
-    due_date = models.DateTimeField(default=timezone.now() + timedelta(days=5))  # New field
+    due_date = models.DateTimeField(default=default_due_date)
     return_date = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination order for the admin loan ledger
+            models.Index(fields=['-borrow_date', '-id'], name='loan_recent_idx'),
+            # Partial indexes only cover open loans, so they stay small however long the history gets
+            models.Index(fields=['book'], condition=Q(return_date__isnull=True),
+                         name='open_loans_by_book_idx'),
+            models.Index(fields=['borrower', '-borrow_date'], condition=Q(return_date__isnull=True),
+                         name='open_loans_by_borrower_idx'),
+            # The overdue sweep is one range scan over this
+            models.Index(fields=['due_date'], condition=Q(return_date__isnull=True),
+                         name='open_loans_by_due_idx'),
+            # Incremental circulation rollups scan returns by date
+            models.Index(fields=['return_date'], condition=Q(return_date__isnull=False),
+                         name='returned_loans_idx'),
+        ]
 
     def __str__(self):
         return f"{self.borrower_name} borrowed {self.book.title}"
 
     def mark_as_returned(self):
-        self.return_date = timezone.now()  # Set return date
-        self.save()                        # Save BorrowRecord first
-        self.book.available = True         # Mark book as available
-        self.book.save()                   # Save book changes
-        
-@receiver(post_save, sender=BorrowRecord)
-def update_book_availability_on_borrow(sender, instance, created, **kwargs):
-    if created:
-        instance.book.available = False
-        instance.book.save()
+        from .services import return_loan
+        return return_loan(self)
+
+
+class HoldQuerySet(models.QuerySet):
+    def with_position(self):
+        """
+        Annotate each hold's ``position`` in its book's queue, 1 being next in line.
+        """
+        ahead = Hold.objects.filter(book=OuterRef('book'), id__lte=OuterRef('id')).order_by()
+        return self.annotate(position=Subquery(ahead.values('book').annotate(count=Count('id')).values('count')))
+
+
+class Hold(models.Model):
+    """
+    A user's place in the queue for a book with no copy on the shelf.
+
+    The queue is first come, first served by ``id``, so the next holder is the
+    first entry of ``hold_queue_idx`` for the book. books.services lends a
+    returned copy straight to them and deletes the hold.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='holds')
+    placed_at = models.DateTimeField(default=timezone.now)
+
+    objects = HoldQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['book', 'id'], name='hold_queue_idx')]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], name='hold_once_per_user',
+                                    violation_error_message="You are already waiting for this book."),
+        ]
+
+    def __str__(self):
+        return f"{self.user} is waiting for {self.book}"
+
+
+class OverdueSummary(models.Model):
+    """
+    Per-user count of overdue loans, materialized by books.overdue.refresh().
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                primary_key=True, related_name='overdue_summary')
+    overdue_count = models.PositiveIntegerField(default=0)
+    oldest_due_date = models.DateTimeField()
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'overdue summaries'
+
+    def __str__(self):
+        return f"{self.user} has {self.overdue_count} overdue loan(s)"
+
+
+class BookCirculation(models.Model):
+    """
+    Running loan totals per book, maintained by books.circulation.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='circulation')
+    borrow_count = models.PositiveIntegerField(default=0)
+    return_count = models.PositiveIntegerField(default=0)
+    loan_time = models.DurationField(default=timedelta)  # Summed over returned loans
+
+    class Meta:
+        indexes = [models.Index(fields=['-borrow_count'], name='book_circulation_top_idx')]
+
+
+class AuthorCirculation(models.Model):
+    author = models.CharField(max_length=100, primary_key=True)
+    borrow_count = models.PositiveIntegerField(default=0)
+    return_count = models.PositiveIntegerField(default=0)
+    loan_time = models.DurationField(default=timedelta)
+
+    class Meta:
+        indexes = [models.Index(fields=['-borrow_count'], name='author_circulation_top_idx')]
+
+
+class DailyCirculation(models.Model):
+    """
+    Borrows and returns per day; a return counts on the day the book came back.
+    """
+    day = models.DateField(primary_key=True)
+    borrow_count = models.PositiveIntegerField(default=0)
+    return_count = models.PositiveIntegerField(default=0)
+    loan_time = models.DurationField(default=timedelta)
+
+
+class CirculationWatermark(models.Model):
+    """
+    Single row: loan events before ``processed_until`` are already in the rollups.
+    """
+    processed_until = models.DateTimeField(null=True, blank=True)
+
+
+class ChangeLogManager(models.Manager):
+    def record(self, books=(), loans=()):
+        """
+        Log that the books and loans with these ids changed, in the current transaction.
+        """
+        keys = [(ChangeLog.BOOK, pk) for pk in books] + [(ChangeLog.LOAN, pk) for pk in loans]
+        pending = _pending_changes.get()
+        if pending is not None:
+            pending.update(dict.fromkeys(keys))
+        elif keys:
+            self.bulk_create(ChangeLog(kind=kind, object_id=pk) for kind, pk in dict.fromkeys(keys))
+
+    @contextmanager
+    def batch(self):
+        """
+        Write everything recorded inside the block with one INSERT at its end.
+        """
+        if _pending_changes.get() is not None:
+            yield
+            return
+        pending = {}
+        token = _pending_changes.set(pending)
+        try:
+            yield
+        finally:
+            _pending_changes.reset(token)
+        if pending:
+            self.bulk_create(ChangeLog(kind=kind, object_id=pk) for kind, pk in pending)
+
+
+class ChangeLog(models.Model):
+    """
+    Append-only feed of catalog changes; the id is the sync token (see books.changelog).
+    """
+    BOOK, LOAN = 'book', 'loan'
+    KINDS = [(BOOK, 'Book'), (LOAN, 'Loan')]
+
+    kind = models.CharField(max_length=4, choices=KINDS)
+    object_id = models.BigIntegerField()
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    objects = ChangeLogManager()
+
+    class Meta:
+        indexes = [
+            # Compaction finds superseded entries of the same object through this
+            models.Index(fields=['kind', 'object_id', 'id'], name='changelog_object_idx'),
+            models.Index(fields=['changed_at'], name='changelog_age_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} changed (token {self.pk})"
+
+
+class ChangeLogWatermark(models.Model):
+    """
+    Single row: entries up to ``pruned_through`` may be gone, so older tokens cannot be served.
+    """
+    pruned_through = models.BigIntegerField(default=0)
+
 
 @receiver(post_delete, sender=BorrowRecord)
-def update_book_availability_on_delete(sender, instance, **kwargs):
-    if  instance.return_date:  # Book is still borrowed
-        instance.book.available = True
-        instance.book.save()
+def update_book_availability_on_delete(sender, instance, origin=None, **kwargs):
+    if instance.return_date or isinstance(origin, Book) or getattr(origin, 'model', None) is Book:
+        return  # Only deleting an open loan puts a copy back, unless the book goes too
+    if Book.objects.filter(pk=instance.book_id, available_count__lt=F('total_copies')).update(
+            available_count=F('available_count') + 1, updated_at=timezone.now()):
+        from .services import serve_holds
+        serve_holds([instance.book_id])
 
 
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=BorrowRecord)
+@receiver(post_delete, sender=BorrowRecord)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def log_book_change(sender, instance, **kwargs):
+    ChangeLog.objects.record(books=[instance.pk])
+
+
+@receiver(post_save, sender=BorrowRecord)
+@receiver(post_delete, sender=BorrowRecord)
+def log_loan_change(sender, instance, **kwargs):
+    # Opening, closing or deleting a loan moves a copy of its book
+    ChangeLog.objects.record(books=[instance.book_id], loans=[instance.pk])
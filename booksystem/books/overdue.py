@@ -0,0 +1,59 @@
+# books/overdue.py
+"""
+Overdue loans.
+
+A loan is overdue once its due date passes while it is still open. The
+sweep finds them with one range scan over the partial
+``open_loans_by_due_idx`` index and stores a per-user count in
+OverdueSummary, so user pages read one row instead of counting loans on
+every request. Returns and reopens refresh the borrower's row right away;
+loans that fall due in between are picked up by the next sweep (see the
+``sweep_overdue`` command).
+"""
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import BorrowRecord, OverdueSummary
+
+SUMMARY_FIELDS = ['overdue_count', 'oldest_due_date', 'refreshed_at']
+
+
+def overdue_loans(now=None):
+    return BorrowRecord.objects.filter(return_date__isnull=True, due_date__lt=now or timezone.now())
+
+
+def refresh(user_ids=None, now=None):
+    """
+    Recount overdue loans into OverdueSummary for every user, or only ``user_ids``.
+
+    Returns the summaries written; users without overdue loans lose theirs.
+    """
+    loans = overdue_loans(now).filter(borrower__isnull=False)
+    summaries = OverdueSummary.objects.all()
+    if user_ids is not None:
+        loans = loans.filter(borrower__in=user_ids)
+        summaries = summaries.filter(user__in=user_ids)
+    stamp = timezone.now()
+    rows = [
+        OverdueSummary(user_id=row['borrower'], overdue_count=row['count'],
+                       oldest_due_date=row['oldest'], refreshed_at=stamp)
+        for row in loans.order_by().values('borrower').annotate(count=Count('id'), oldest=Min('due_date'))
+    ]
+    with transaction.atomic():
+        if rows:
+            OverdueSummary.objects.bulk_create(rows, update_conflicts=True, unique_fields=['user'],
+                                               update_fields=SUMMARY_FIELDS)
+        # Every summary still current was just stamped; the rest are stale
+        summaries.filter(refreshed_at__lt=stamp).delete()
+    return rows
+
+
+def refresh_for(loans, now=None):
+    """
+    Refresh the summaries of whoever holds a past-due loan among ``(borrower_id, due_date)`` pairs.
+    """
+    now = now or timezone.now()
+    user_ids = {borrower_id for borrower_id, due_date in loans if borrower_id and due_date < now}
+    if user_ids:
+        refresh(user_ids, now)
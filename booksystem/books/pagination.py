@@ -0,0 +1,145 @@
+# books/pagination.py
+"""
+Keyset (cursor) pagination for catalog listings.
+
+Instead of ``OFFSET n`` every page continues from the sort key of the last
+row of the previous page, so fetching page 1000 costs the same index range
+scan as page 1 and rows inserted meanwhile never shift or repeat a page.
+"""
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+DEFAULT_ORDERING = ('-registered_date', '-id')
+DEFAULT_PER_PAGE = 24
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder drops microseconds, which would break equality on the sort key
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return bool(self.cursor)
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``ordering``, which must end in a unique field.
+    """
+
+    def __init__(self, queryset, ordering=DEFAULT_ORDERING, per_page=DEFAULT_PER_PAGE):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def page(self, cursor=None):
+        """
+        Return the page that starts after ``cursor``; raise InvalidCursor on garbage.
+        """
+        return self._page(list(self._slice(cursor)), cursor)
+
+    async def apage(self, cursor=None):
+        """
+        Async ``page()``, fetching the rows with the async ORM.
+        """
+        return self._page([row async for row in self._slice(cursor)], cursor)
+
+    def get_page(self, cursor=None):
+        """
+        Like ``page()`` but fall back to the first page for an invalid cursor.
+        """
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    async def aget_page(self, cursor=None):
+        try:
+            return await self.apage(cursor)
+        except InvalidCursor:
+            return await self.apage()
+
+    def _slice(self, cursor):
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode(cursor)))
+        return queryset[:self.per_page + 1]
+
+    def _page(self, rows, cursor):
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode(rows[-1])
+        return KeysetPage(rows, next_cursor, cursor)
+
+    def encode(self, row):
+        values = [row[name] if isinstance(row, dict) else getattr(row, name) for name, _ in self.fields]
+        raw = json.dumps(values, cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+        except (ValueError, TypeError) as exc:
+            raise InvalidCursor(cursor) from exc
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        return [self._to_python(name, value) for (name, _), value in zip(self.fields, values)]
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations such as the search rank are plain JSON numbers
+            return value
+        try:
+            return field.to_python(value)
+        except ValidationError as exc:
+            raise InvalidCursor(value) from exc
+
+    def _after(self, values):
+        """
+        Build ``(f1, f2, ...) > (v1, v2, ...)`` in the direction of each field.
+
+        The leading ``f1 >= v1`` term is redundant but lets the database turn
+        the first sort column into an index range scan.
+        """
+        (first, first_desc), first_value = self.fields[0], values[0]
+        condition = Q()
+        for position, ((name, descending), value) in enumerate(zip(self.fields, values)):
+            step = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+            for (prev_name, _), prev_value in zip(self.fields[:position], values[:position]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return Q(**{f"{first}__{'lte' if first_desc else 'gte'}": first_value}) & condition
@@ -0,0 +1,125 @@
+# books/search.py
+"""
+Full-text catalog search.
+
+SQLite uses an FTS5 index (``books_book_fts``) kept in sync with
+``books_book`` by triggers, PostgreSQL uses a GIN index over a tsvector
+expression. Any other backend falls back to the old icontains scan.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'books_book_fts'
+PG_DOCUMENT = "to_tsvector('simple'::regconfig, title || ' ' || author || ' ' || description)"
+
+# Best match first; the trailing unique id makes it usable as a keyset ordering
+SEARCH_ORDERING = ('rank', '-registered_date', '-id')
+
+# Column weights for bm25(): a hit in the title counts more than one in the description
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+SQLITE_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, description,
+        content='books_book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, author, description ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+]
+
+POSTGRES_STATEMENTS = [
+    f"CREATE INDEX IF NOT EXISTS books_book_search_gin ON books_book USING GIN ({PG_DOCUMENT})",
+]
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def install_search_index(using_connection=None):
+    """
+    Create the search index for the current backend if it is missing.
+
+    Safe to call repeatedly. SQLite drops triggers when Django rebuilds a
+    table during a migration, so this also runs after every ``migrate`` and
+    rebuilds the FTS index whenever the triggers had to be recreated.
+    """
+    conn = using_connection or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_a_'],
+            )
+            complete = cursor.fetchone()[0] == 3
+            for statement in SQLITE_STATEMENTS:
+                cursor.execute(statement)
+            if not complete:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif conn.vendor == 'postgresql':
+            for statement in POSTGRES_STATEMENTS:
+                cursor.execute(statement)
+
+
+def search_terms(query):
+    """
+    Split a raw search string into lower-cased word tokens.
+    """
+    return [term.lower() for term in _WORD_RE.findall(query or '')]
+
+
+def search_books(queryset, query):
+    """
+    Filter ``queryset`` down to books matching ``query`` and annotate a ``rank``.
+
+    Every term must match (AND) and the last term is treated as a prefix, so
+    "harry pot" finds "Harry Potter" while the user is still typing. Lower
+    ``rank`` is better; results are ordered best match first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"' for term in terms[:-1])
+        match = f'{match} "{terms[-1]}"*'.strip()
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        # Join the FTS table directly so MATCH and bm25() run once for the whole query
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = books_book.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        ).annotate(rank=RawSQL(f'bm25({FTS_TABLE}, {weights})', (), output_field=FloatField()))
+    elif vendor == 'postgresql':
+        tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        queryset = queryset.filter(RawSQL(
+            f"{PG_DOCUMENT} @@ to_tsquery('simple'::regconfig, %s)",
+            (tsquery,),
+            output_field=BooleanField(),
+        )).annotate(rank=RawSQL(
+            f"-ts_rank({PG_DOCUMENT}, to_tsquery('simple'::regconfig, %s))",
+            (tsquery,),
+            output_field=FloatField(),
+        ))
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(author__icontains=term) | Q(description__icontains=term)
+        queryset = queryset.filter(condition).annotate(rank=RawSQL('0', (), output_field=FloatField()))
+
+    return queryset.order_by(*SEARCH_ORDERING)
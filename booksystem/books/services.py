@@ -0,0 +1,277 @@
+# books/services.py
+"""
+Borrow/return transactions.
+
+Every change of a book's availability goes through here. Each operation is
+one transaction that claims a copy with a conditional
+``UPDATE ... SET available_count = available_count - 1 WHERE available_count > 0``
+instead of read-check-write, so concurrent requests can never hand out more
+copies than exist, and a borrow costs three writes: the claim, dropping
+the borrower's hold on the book if any, and the loan (plus its change log
+entry).
+
+The bulk variants used by the admin ledger work on whole sets of loans with
+a handful of UPDATEs, one per distinct number of copies moved per book,
+however many loans are selected.
+
+A returned copy goes to the book's oldest hold, if any, in the same
+transaction: it is shelved as usual and then lent straight on, so nobody
+can borrow it in between. Copies put back any other way (new copies of a
+book, a deleted open loan) are passed to serve_holds() the same way, and
+a borrower who is not queued only gets a copy left over after every hold.
+
+Queryset updates bypass the model signals and ``auto_now``, so each
+successful operation bumps the catalog cache version, sets ``updated_at``,
+announces the new availability (books.events) and records what it changed
+in the change log (books.changelog) itself, with one INSERT per operation.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Window
+from django.db.models.functions import Coalesce, Least, RowNumber
+from django.utils import timezone
+
+from . import events, overdue
+from .cache import bump_catalog_version
+from .models import Book, BorrowRecord, ChangeLog, Hold, LOAN_PERIOD, default_due_date  # noqa: F401
+
+# What place_hold() did with a request
+HOLD_PLACED = 'placed'
+HOLD_LENT = 'lent'  # A copy was on the shelf, so it was lent at once
+HOLD_EXISTS = 'exists'
+HOLD_ON_LOAN = 'on loan'  # The user already has a copy out
+
+
+def _take_copy(book_id):
+    return Book.objects.filter(pk=book_id, available_count__gt=0).update(
+        available_count=F('available_count') - 1, updated_at=timezone.now())
+
+
+def _shelve_copy(book_id):
+    return Book.objects.filter(pk=book_id, available_count__lt=F('total_copies')).update(
+        available_count=F('available_count') + 1, updated_at=timezone.now())
+
+
+def _move_copies(per_book, sign):
+    """
+    Shelve (sign=1) or take (sign=-1) ``per_book[book_id]`` copies of each book.
+    """
+    by_count = defaultdict(list)
+    for book_id, count in per_book.items():
+        by_count[count].append(book_id)
+    for count, book_ids in by_count.items():
+        books = Book.objects.filter(pk__in=book_ids)
+        if sign > 0:
+            books.update(available_count=Least(F('available_count') + count, F('total_copies')),
+                         updated_at=timezone.now())
+        else:
+            books.filter(available_count__gte=count).update(available_count=F('available_count') - count,
+                                                            updated_at=timezone.now())
+
+
+def _serve_holds(book_ids, now):
+    """
+    Lend the shelved copies of ``book_ids`` to their oldest holds; return the new loans.
+
+    Call it after shelving, in the same transaction: the UPDATE that shelved
+    a copy holds the book's row lock, so concurrent returns of one book
+    serve its queue one after another. Each queue is read from the front
+    of ``hold_queue_idx``, as far as the book has copies.
+    """
+    holds = list(Hold.objects.filter(book__in=book_ids).select_related('user').annotate(
+        place=Window(RowNumber(), partition_by=F('book'), order_by=F('id').asc()),
+    ).filter(place__lte=F('book__available_count')))
+    if not holds:
+        return []
+    Hold.objects.filter(pk__in=[hold.pk for hold in holds]).delete()
+    loans = BorrowRecord.objects.bulk_create(
+        BorrowRecord(book_id=hold.book_id, borrower=hold.user, borrower_name=hold.user.username,
+                     borrow_date=now, due_date=now + LOAN_PERIOD)
+        for hold in holds
+    )
+    _move_copies(Counter(hold.book_id for hold in holds), -1)
+    return loans
+
+
+def serve_holds(book_ids):
+    """
+    Lend copies put back on the shelf outside a return to the oldest holds of ``book_ids``.
+
+    Call it in the transaction that shelved them; returns the new loans.
+    """
+    with transaction.atomic():
+        loans = _serve_holds(book_ids, timezone.now())
+        if loans:
+            bump_catalog_version()
+            events.availability_changed(book_ids)
+            ChangeLog.objects.record(books=book_ids, loans=[loan.pk for loan in loans])
+    return loans
+
+
+def place_hold(book_id, user):
+    """
+    Queue ``user`` for the next copy of a book; return one of the HOLD_* outcomes.
+
+    A copy shelved before the hold existed is handed out at once, so the
+    hold may already have become a loan (HOLD_LENT). Nobody queues for a
+    book they have on loan, or twice for one book.
+    """
+    with transaction.atomic():
+        if BorrowRecord.objects.filter(book_id=book_id, borrower=user, return_date__isnull=True).exists():
+            return HOLD_ON_LOAN
+        _, created = Hold.objects.get_or_create(book_id=book_id, user=user)
+        if not created:
+            return HOLD_EXISTS
+        # Touching the row takes its lock, as shelving would
+        if not Book.objects.filter(pk=book_id, available_count__gt=0).update(updated_at=timezone.now()):
+            return HOLD_PLACED
+        loans = _serve_holds([book_id], timezone.now())
+        if not loans:
+            return HOLD_PLACED
+        bump_catalog_version()
+        events.availability_changed([book_id])
+        ChangeLog.objects.record(books=[book_id], loans=[loan.pk for loan in loans])
+    return HOLD_LENT if any(loan.borrower_id == user.pk for loan in loans) else HOLD_PLACED
+
+
+def cancel_hold(hold_id, user):
+    """
+    Leave the queue; return False if ``user`` holds no such hold.
+    """
+    deleted, _ = Hold.objects.filter(pk=hold_id, user=user).delete()
+    return bool(deleted)
+
+
+def borrow_book(book_id, user, due_date=None):
+    """
+    Lend a copy to ``user``; return the new BorrowRecord, or None if none is left.
+
+    Copies the other users' holds are waiting for are not left; a hold of
+    ``user`` on the book is used up by the loan.
+    """
+    others = Hold.objects.filter(book=OuterRef('pk')).exclude(user=user).order_by().values('book').annotate(
+        count=Count('id')).values('count')
+    with transaction.atomic():
+        claimed = Book.objects.filter(pk=book_id, available_count__gt=Coalesce(Subquery(others), 0)).update(
+            available_count=F('available_count') - 1, updated_at=timezone.now())
+        if not claimed:
+            return None
+        Hold.objects.filter(book_id=book_id, user=user).delete()
+        bump_catalog_version()
+        return BorrowRecord.objects.create(
+            book_id=book_id,
+            borrower=user,
+            borrower_name=user.username,
+            due_date=due_date or default_due_date(),
+        )
+
+
+def return_loan(record):
+    """
+    Close an open loan and shelve its copy; return False if it was already closed.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        closed = BorrowRecord.objects.filter(pk=record.pk, return_date__isnull=True).update(
+            return_date=now, updated_at=now)
+        if not closed:
+            return False
+        _shelve_copy(record.book_id)
+        loans = _serve_holds([record.book_id], now)
+        overdue.refresh_for([(record.borrower_id, record.due_date)], now)
+        bump_catalog_version()
+        events.availability_changed([record.book_id])
+        ChangeLog.objects.record(books=[record.book_id], loans=[record.pk, *(loan.pk for loan in loans)])
+    record.return_date = now
+    return True
+
+
+def reopen_loan(record):
+    """
+    Mark a returned loan as borrowed again; return False if no copy is left.
+    """
+    with transaction.atomic():
+        reopened = BorrowRecord.objects.filter(pk=record.pk, return_date__isnull=False).update(
+            return_date=None, updated_at=timezone.now())
+        claimed = reopened and _take_copy(record.book_id)
+        if not claimed:
+            transaction.set_rollback(True)
+            return False
+        overdue.refresh_for([(record.borrower_id, record.due_date)])
+        bump_catalog_version()
+        events.availability_changed([record.book_id])
+        ChangeLog.objects.record(books=[record.book_id], loans=[record.pk])
+    record.return_date = None
+    return True
+
+
+def _close_loans(record_ids):
+    open_loans = BorrowRecord.objects.filter(pk__in=record_ids, return_date__isnull=True)
+    loans = list(open_loans.select_for_update().values_list('pk', 'book_id', 'borrower_id', 'due_date'))
+    if not loans:
+        return 0
+    now = timezone.now()
+    closed = open_loans.update(return_date=now, updated_at=now)
+    per_book = Counter(book_id for _, book_id, _, _ in loans)
+    _move_copies(per_book, 1)
+    served = _serve_holds(per_book, now)
+    events.availability_changed(per_book)
+    ChangeLog.objects.record(books=per_book, loans=[pk for pk, _, _, _ in loans] + [loan.pk for loan in served])
+    overdue.refresh_for([(borrower_id, due_date) for _, _, borrower_id, due_date in loans], now)
+    return closed
+
+
+def return_loans(record_ids):
+    """
+    Close every open loan in ``record_ids``; return how many were closed.
+    """
+    with transaction.atomic():
+        closed = _close_loans(record_ids)
+        if closed:
+            bump_catalog_version()
+    return closed
+
+
+def reopen_loans(record_ids):
+    """
+    Mark returned loans as borrowed again while copies last; return how many were reopened.
+
+    Loans are granted oldest first; the rest stay returned.
+    """
+    with transaction.atomic():
+        returned = list(BorrowRecord.objects.filter(pk__in=record_ids, return_date__isnull=False)
+                        .order_by('borrow_date', 'id').values_list('pk', 'book_id', 'borrower_id', 'due_date'))
+        if not returned:
+            return 0
+        left = dict(Book.objects.select_for_update().filter(pk__in={loan[1] for loan in returned})
+                    .values_list('pk', 'available_count'))
+        reopened, per_book = [], Counter()
+        for pk, book_id, borrower_id, due_date in returned:
+            if per_book[book_id] < left.get(book_id, 0):
+                per_book[book_id] += 1
+                reopened.append((pk, borrower_id, due_date))
+        if not reopened:
+            return 0
+        BorrowRecord.objects.filter(pk__in=[pk for pk, _, _ in reopened]).update(
+            return_date=None, updated_at=timezone.now())
+        _move_copies(per_book, -1)
+        events.availability_changed(per_book)
+        ChangeLog.objects.record(books=per_book, loans=[pk for pk, _, _ in reopened])
+        overdue.refresh_for([(borrower_id, due_date) for _, borrower_id, due_date in reopened])
+        bump_catalog_version()
+    return len(reopened)
+
+
+def delete_loans(record_ids):
+    """
+    Delete the loans in ``record_ids``, shelving the copies of open ones; return how many were deleted.
+    """
+    # The post_delete receivers log each loan; the batch writes them with one INSERT
+    with transaction.atomic(), ChangeLog.objects.batch():
+        # Closing them first lets the post_delete receiver skip its per-row UPDATE
+        _close_loans(record_ids)
+        deleted, _ = BorrowRecord.objects.filter(pk__in=record_ids).delete()
+        if deleted:
+            bump_catalog_version()
+    return deleted
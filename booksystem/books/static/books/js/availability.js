@@ -0,0 +1,15 @@
+// books/static/books/js/availability.js
+// Keep the copy counts on the page current without reloading it
+(function () {
+  if (!window.EventSource) return;
+  var source = new EventSource(document.currentScript.dataset.eventsUrl);
+  source.addEventListener('availability', function (event) {
+    var book = JSON.parse(event.data);
+    document.querySelectorAll('[data-availability="' + book.id + '"]').forEach(function (node) {
+      node.textContent = book.available_count + ' of ' + book.total_copies + ' copies available';
+    });
+    document.querySelectorAll('[data-on-shelf="' + book.id + '"]').forEach(function (node) {
+      node.hidden = book.available_count === 0;
+    });
+  });
+})();
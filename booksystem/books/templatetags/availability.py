@@ -0,0 +1,13 @@
+# books/templatetags/availability.py
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+
+@register.inclusion_tag('books/availability_events.html')
+def availability_events():
+    """
+    Load the live availability script where the stream is served (see AVAILABILITY_EVENTS_ENABLED).
+    """
+    return {'enabled': settings.AVAILABILITY_EVENTS_ENABLED}
@@ -0,0 +1,26 @@
+# books/templatetags/book_images.py
+from django import template
+
+from books import images
+
+register = template.Library()
+
+
+@register.inclusion_tag('books/book_cover.html')
+def book_cover(image, alt='', sizes='(max-width: 600px) 50vw, 240px'):
+    """
+    Render a cover as <picture> with WebP/JPEG srcsets, or the original if
+    its variants have not been generated yet.
+
+    The widths come from the book's image_variants, so no storage lookup is made.
+    """
+    context = {'image': image, 'alt': alt, 'sizes': sizes, 'responsive': False}
+    widths = getattr(image.instance, 'image_variants', None) if image else None
+    if widths:
+        context.update(
+            responsive=True,
+            webp_srcset=images.srcset(image.name, widths, 'webp', image.storage),
+            jpeg_srcset=images.srcset(image.name, widths, 'jpg', image.storage),
+            fallback=image.storage.url(images.variant_name(image.name, widths[0], 'jpg')),
+        )
+    return context
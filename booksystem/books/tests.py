@@ -1,3 +1,1141 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import StreamingHttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from accounts import urls as accounts_urls
+from api import urls as api_urls
+from booksystem import compression, profiling
+from booksystem.querybudget import QueryBudgetExceeded, QueryBudgetMiddleware, get_query_budget, max_queries
+
+from . import (benchmarks, cache as catalog_cache, changelog, circulation, events, exports, images, overdue, services,
+               urls as books_urls)
+from .forms import BookForm
+from .models import (AuthorCirculation, Book, BookCirculation, BorrowRecord, ChangeLog, DailyCirculation, Hold,
+                     OverdueSummary)
+from .pagination import KeysetPaginator
+from .search import SEARCH_ORDERING, search_books
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.gatsby = Book.objects.create(
+            title='The Great Gatsby', author='F. Scott Fitzgerald', description='Jazz age novel.')
+        self.potter = Book.objects.create(
+            title='Harry Potter', author='J. K. Rowling', description='A boy wizard.')
+        self.mention = Book.objects.create(
+            title='Essays', author='Various', description='Includes a chapter on Harry Potter fandom.')
+
+    def search(self, query):
+        return list(search_books(Book.objects.all(), query))
+
+    def test_prefix_match_on_last_term(self):
+        self.assertEqual(self.search('gats'), [self.gatsby])
+        self.assertEqual(self.search('scott fitz'), [self.gatsby])
+
+    def test_title_hits_rank_above_description_hits(self):
+        self.assertEqual(self.search('harry potter'), [self.potter, self.mention])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.potter.title = 'Philosopher Stone'
+        self.potter.save()
+        self.assertEqual(self.search('philosopher'), [self.potter])
+        self.potter.delete()
+        self.assertEqual(self.search('philosopher'), [])
+
+    def test_blank_query_matches_nothing(self):
+        self.assertEqual(self.search('  ?! '), [])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        # Several books share a registered_date so the id tie-breaker matters
+        self.books = [
+            Book.objects.create(title=f'Lantern {i}', author='Author', description='Story.',
+                                registered_date=now - timedelta(minutes=i // 3))
+            for i in range(10)
+        ]
+
+    def walk(self, paginator):
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen.extend(page.object_list)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_book_once_in_order(self):
+        seen = self.walk(KeysetPaginator(Book.objects.all(), per_page=3))
+        expected = sorted(self.books, key=lambda book: (book.registered_date, book.id), reverse=True)
+        self.assertEqual(seen, expected)
+
+    def test_inserts_do_not_shift_later_pages(self):
+        paginator = KeysetPaginator(Book.objects.all(), per_page=4)
+        first = paginator.page()
+        Book.objects.create(title='Newest', author='Author', description='Story.')
+        second = paginator.page(first.next_cursor)
+        self.assertFalse(set(first.object_list) & set(second.object_list))
+        self.assertEqual(second.object_list[0], sorted(
+            self.books, key=lambda book: (book.registered_date, book.id), reverse=True)[4])
+
+    def test_search_results_paginate_by_rank(self):
+        queryset = search_books(Book.objects.all(), 'lantern')
+        seen = self.walk(KeysetPaginator(queryset, SEARCH_ORDERING, per_page=4))
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), 10)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Book.objects.all(), per_page=3)
+        self.assertEqual(paginator.get_page('not-a-cursor').object_list, paginator.page().object_list)
+
+    @override_settings(CATALOG_PAGE_SIZE=4)
+    def test_catalog_views_render_next_link(self):
+        self.client.force_login(get_user_model().objects.create_user('librarian', is_superuser=True))
+        for name in ('book_list', 'book_list_user', 'available_books', 'all_books'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(len(response.context['books']), 4)
+            self.assertContains(response, 'Next page')
+            self.assertNotContains(response, 'First page')
+            response = self.client.get(reverse(name), {'cursor': response.context['page'].next_cursor})
+            self.assertContains(response, 'First page')
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every view in books.views, accounts.views and api.views declares a query budget that
+    must hold no matter how many rows the page renders.
+    """
+
+    def create_rows(self, count):
+        for number in range(count):
+            book = Book.objects.create(title=f'Book {number}', author='Author', description='Story.')
+            BorrowRecord.objects.create(book=book, borrower=self.admin, borrower_name=self.admin.username)
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(
+            'librarian', 'librarian@example.com', 'secret-pass', is_superuser=True, is_staff=True)
+        self.client.force_login(self.admin)
+
+    def budgeted_views(self):
+        for module in (books_urls, accounts_urls, api_urls):
+            for pattern in module.urlpatterns:
+                if pattern.callback.__module__ in ('books.views', 'accounts.views', 'api.views'):
+                    yield pattern
+
+    def url_for(self, pattern):
+        kwargs = {name: Book.objects.first().pk for name in pattern.pattern.converters}
+        if 'record_id' in kwargs:
+            kwargs['record_id'] = BorrowRecord.objects.first().pk
+        return reverse(pattern.name, kwargs=kwargs)
+
+    def test_every_view_declares_a_budget(self):
+        missing = [pattern.name for pattern in self.budgeted_views() if get_query_budget(pattern.callback) is None]
+        self.assertEqual(missing, [])
+
+    async def test_middleware_keeps_async_views_on_the_event_loop(self):
+        async def view(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(QueryBudgetMiddleware(view)))
+        await self.async_client.aforce_login(self.admin)
+        with self.settings(QUERY_BUDGET_STRICT=True,
+                           MIDDLEWARE=['booksystem.querybudget.QueryBudgetMiddleware', *settings.MIDDLEWARE]):
+            self.assertEqual((await self.async_client.get(reverse('book_list'))).status_code, 200)
+            with mock.patch('booksystem.querybudget.get_query_budget', return_value=0):
+                with self.assertRaises(QueryBudgetExceeded):
+                    await self.async_client.get(reverse('book_list'))
+
+    def test_budgets_hold_for_one_and_many_rows(self):
+        for rows in (1, 20):
+            self.create_rows(rows if rows == 1 else rows - BorrowRecord.objects.count())
+            for pattern in self.budgeted_views():
+                budget = get_query_budget(pattern.callback)
+                url = self.url_for(pattern)
+                with self.subTest(view=pattern.name, rows=rows):
+                    with max_queries(budget, pattern.name):
+                        self.client.get(url)
+
+
+class BorrowServiceTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('reader', 'reader@example.com', 'secret-pass')
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.')
+
+    def test_borrow_claims_the_book_with_three_writes(self):
+        with self.assertNumQueries(6):  # savepoint, UPDATE book, DELETE hold, INSERT record, INSERT change log, release
+            record = services.borrow_book(self.book.pk, self.user)
+        self.assertEqual(record.borrower, self.user)
+        self.assertEqual(record.borrower_name, 'reader')
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.available)
+        self.assertIsNone(services.borrow_book(self.book.pk, self.user))
+
+    def test_return_and_reopen(self):
+        record = services.borrow_book(self.book.pk, self.user)
+        self.assertTrue(services.return_loan(record))
+        self.assertFalse(services.return_loan(record))
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.available)
+
+        self.assertTrue(services.reopen_loan(record))
+        self.assertFalse(services.reopen_loan(record))
+        record.refresh_from_db()
+        self.assertIsNone(record.return_date)
+
+    def test_reopen_fails_when_someone_else_has_the_book(self):
+        record = services.borrow_book(self.book.pk, self.user)
+        services.return_loan(record)
+        services.borrow_book(self.book.pk, self.user)
+        self.assertFalse(services.reopen_loan(record))
+        record.refresh_from_db()
+        self.assertIsNotNone(record.return_date)
+
+    def test_copies_are_counted(self):
+        self.book.total_copies = self.book.available_count = 2
+        self.book.save()
+        first = services.borrow_book(self.book.pk, self.user)
+        self.assertIsNotNone(services.borrow_book(self.book.pk, self.user))
+        self.assertIsNone(services.borrow_book(self.book.pk, self.user))
+        self.assertFalse(Book.objects.available().exists())
+        services.return_loan(first)
+        self.assertEqual(Book.objects.available().get().available_count, 1)
+
+    def test_editing_total_copies_keeps_loans_counted(self):
+        form = BookForm(instance=self.book)
+        services.borrow_book(self.book.pk, self.user)  # Lands between loading and saving the form
+        form = BookForm({'title': 'Dune', 'author': 'Frank Herbert', 'description': 'Desert planet.',
+                         'total_copies': 4}, instance=form.instance, initial=form.initial)
+        self.assertTrue(form.is_valid(), form.errors)
+        book = form.save()
+        self.assertEqual((book.total_copies, book.available_count), (4, 3))
+
+    def test_register_form_posts_copies(self):
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('register_book'), {
+            'title': 'Emma', 'author': 'Jane Austen', 'description': 'Matchmaking.', 'total_copies': 3})
+        self.assertRedirects(response, reverse('book_list'))
+        book = Book.objects.get(title='Emma')
+        self.assertEqual((book.total_copies, book.available_count), (3, 3))
+        self.assertContains(self.client.get(reverse('register_book')), 'name="total_copies"')
+
+    def test_removing_copies_lent_meanwhile_is_a_form_error(self):
+        self.book.total_copies = self.book.available_count = 2
+        self.book.save()
+        form = BookForm({'title': 'Dune Messiah', 'author': 'Frank Herbert', 'description': 'Desert planet.',
+                         'total_copies': 1}, instance=self.book, initial={'total_copies': 2})
+        self.assertTrue(form.is_valid(), form.errors)
+        services.borrow_book(self.book.pk, self.user)
+        services.borrow_book(self.book.pk, self.user)  # Both land after clean_total_copies()
+        self.assertIsNone(form.save())
+        self.assertIn('total_copies', form.errors)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.total_copies, self.book.available_count), ('Dune', 2, 0))
+
+    def test_cannot_drop_copies_below_loans(self):
+        services.borrow_book(self.book.pk, self.user)
+        self.book.refresh_from_db()
+        form = BookForm({'title': 'Dune', 'author': 'Frank Herbert', 'description': 'Desert planet.',
+                         'total_copies': 0}, instance=self.book)
+        self.assertFalse(form.is_valid())
+
+    def test_members_only_return_their_own_copy(self):
+        Book.objects.filter(pk=self.book.pk).update(total_copies=2, available_count=2)
+        other = get_user_model().objects.create_user('other', 'other@example.com', 'secret-pass')
+        mine = services.borrow_book(self.book.pk, self.user)
+        theirs = services.borrow_book(self.book.pk, other)
+        self.client.force_login(other)
+        self.assertRedirects(self.client.post(reverse('return_book', args=[self.book.pk])),
+                             reverse('borrowed_books_user'))
+        self.assertEqual(self.client.post(reverse('return_book', args=[self.book.pk])).status_code, 404)
+        mine.refresh_from_db()
+        theirs.refresh_from_db()
+        self.assertIsNone(mine.return_date)
+        self.assertIsNotNone(theirs.return_date)
+
+    def test_deleting_an_open_loan_frees_the_book(self):
+        services.borrow_book(self.book.pk, self.user).delete()
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.available)
+        services.delete_loans([services.borrow_book(self.book.pk, self.user).pk])
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.available)
+
+
+class BorrowerBackfillTests(TransactionTestCase):
+    before = [('books', '0011_book_keyset_indexes')]
+    after = [('books', '0012_borrowrecord_borrower')]
+
+    def migrate(self, targets):
+        """
+        Migrate to ``targets``; return the models as of every migration now applied.
+        """
+        MigrationExecutor(connection).migrate(targets)
+        loader = MigrationExecutor(connection).loader
+        return loader.project_state(list(loader.applied_migrations)).apps
+
+    def test_loans_are_linked_to_the_account_named_on_them(self):
+        self.addCleanup(lambda: self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes()))
+        apps = self.migrate(self.before)
+        reader = apps.get_model('accounts', 'CustomUser').objects.create(username='reader', password='!')
+        book = apps.get_model('books', 'Book').objects.create(title='Dune', author='Frank Herbert',
+                                                              description='Desert planet.')
+        BorrowRecord = apps.get_model('books', 'BorrowRecord')
+        for name in ('reader', 'reader', 'deleted-account'):
+            BorrowRecord.objects.create(book=book, borrower_name=name)
+
+        apps = self.migrate(self.after)
+        loans = apps.get_model('books', 'BorrowRecord').objects.order_by('pk')
+        self.assertEqual(list(loans.values_list('borrower_name', 'borrower')),
+                         [('reader', reader.pk), ('reader', reader.pk), ('deleted-account', None)])
+
+
+class HoldTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner, self.first, self.second = (
+            User.objects.create_user(name, f'{name}@example.com', 'secret-pass') for name in ('owner', 'first', 'second'))
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.')
+        self.loan = services.borrow_book(self.book.pk, self.owner)
+
+    def open_loans(self, user):
+        return BorrowRecord.objects.filter(book=self.book, borrower=user, return_date__isnull=True)
+
+    def test_return_lends_the_copy_to_the_oldest_hold(self):
+        self.assertEqual(services.place_hold(self.book.pk, self.first), services.HOLD_PLACED)
+        self.assertEqual(services.place_hold(self.book.pk, self.second), services.HOLD_PLACED)
+        self.assertEqual(services.place_hold(self.book.pk, self.first), services.HOLD_EXISTS)
+
+        self.assertTrue(self.loan.mark_as_returned())
+        self.assertTrue(self.open_loans(self.first).exists())
+        self.assertEqual(list(Hold.objects.values_list('user__username', flat=True)), ['second'])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_count, 0)
+
+        services.return_loan(self.open_loans(self.first).get())
+        self.assertTrue(self.open_loans(self.second).exists())
+        services.return_loan(self.open_loans(self.second).get())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_count, 1)
+
+    def test_bulk_returns_serve_each_queue_as_far_as_copies_go(self):
+        other = Book.objects.create(title='Emma', author='Jane Austen', description='Novel.', total_copies=2,
+                                    available_count=2)
+        loans = [self.loan.pk] + [services.borrow_book(other.pk, user).pk for user in (self.owner, self.first)]
+        services.place_hold(self.book.pk, self.first)
+        services.place_hold(self.book.pk, self.second)
+        services.place_hold(other.pk, self.second)
+
+        self.assertEqual(services.return_loans(loans), 3)
+        self.assertTrue(self.open_loans(self.first).exists())
+        self.assertTrue(BorrowRecord.objects.filter(book=other, borrower=self.second, return_date__isnull=True).exists())
+        self.assertEqual(list(Hold.objects.values_list('user__username', 'book__title')), [('second', 'Dune')])
+        other.refresh_from_db()
+        self.assertEqual(other.available_count, 1)
+
+    def test_hold_on_a_shelved_copy_is_served_at_once(self):
+        Book.objects.filter(pk=self.book.pk).update(total_copies=2, available_count=1)
+        self.client.force_login(self.first)
+        response = self.client.post(reverse('place_hold', args=[self.book.pk]), follow=True)
+        self.assertRedirects(response, reverse('my_holds'))
+        self.assertContains(response, 'it has been lent to you')
+        self.assertTrue(self.open_loans(self.first).exists())
+        self.assertFalse(Hold.objects.exists())
+
+    def test_new_copies_go_to_the_queue(self):
+        services.place_hold(self.book.pk, self.first)
+        form = BookForm({'title': 'Dune', 'author': 'Frank Herbert', 'description': 'Desert planet.',
+                         'total_copies': 2}, instance=self.book)
+        self.assertTrue(form.is_valid(), form.errors)
+        book = form.save()
+        self.assertEqual((book.total_copies, book.available_count), (2, 0))
+        self.assertTrue(self.open_loans(self.first).exists())
+        self.assertFalse(Hold.objects.exists())
+
+    def test_deleting_an_open_loan_serves_the_queue(self):
+        services.place_hold(self.book.pk, self.first)
+        self.loan.delete()
+        self.assertTrue(self.open_loans(self.first).exists())
+        self.assertFalse(Hold.objects.exists())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_count, 0)
+
+        # Nothing is lent out of a book that is deleted with its loans
+        services.place_hold(self.book.pk, self.second)
+        self.book.delete()
+        self.assertFalse(BorrowRecord.objects.exists())
+
+    def test_borrowing_does_not_jump_the_queue(self):
+        services.place_hold(self.book.pk, self.first)
+        services.place_hold(self.book.pk, self.second)
+        # A copy shelved without going through the queue
+        Book.objects.filter(pk=self.book.pk).update(total_copies=2, available_count=1)
+        self.assertIsNone(services.borrow_book(self.book.pk, get_user_model().objects.create_user('walk-up')))
+        self.assertIsNone(services.borrow_book(self.book.pk, self.second))
+
+        Book.objects.filter(pk=self.book.pk).update(total_copies=3, available_count=2)
+        self.assertIsNotNone(services.borrow_book(self.book.pk, self.second))
+        self.assertEqual(list(Hold.objects.values_list('user__username', flat=True)), ['first'])
+
+    def test_no_hold_on_a_book_already_borrowed(self):
+        self.assertEqual(services.place_hold(self.book.pk, self.owner), services.HOLD_ON_LOAN)
+        self.assertFalse(Hold.objects.exists())
+        self.client.force_login(self.owner)
+        response = self.client.post(reverse('place_hold', args=[self.book.pk]), follow=True)
+        self.assertContains(response, 'You already have Dune on loan.')
+
+    def test_views(self):
+        self.client.force_login(self.first)
+        self.assertContains(self.client.get(reverse('borrow_book', args=[self.book.pk])), 'Place hold')
+        self.client.post(reverse('place_hold', args=[self.book.pk]))
+        self.client.force_login(self.second)
+        self.client.post(reverse('place_hold', args=[self.book.pk]))
+        self.assertContains(self.client.get(reverse('my_holds')), 'Number 2 in line')
+
+        hold = Hold.objects.get(user=self.second)
+        self.client.force_login(self.first)
+        self.client.post(reverse('cancel_hold', args=[hold.pk]))
+        self.assertTrue(Hold.objects.filter(pk=hold.pk).exists())
+        self.assertContains(self.client.get(reverse('my_holds')), 'You are next in line')
+        self.client.post(reverse('cancel_hold', args=[Hold.objects.get(user=self.first).pk]))
+        self.assertContains(self.client.get(reverse('my_holds')), 'You are not waiting')
+
+
+class LoanLedgerTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(
+            'librarian', 'librarian@example.com', 'secret-pass', is_superuser=True, is_staff=True)
+        self.client.force_login(self.admin)
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.',
+                                        total_copies=3, available_count=3)
+        self.emma = Book.objects.create(title='Emma', author='Jane Austen', description='Matchmaking.')
+        self.loans = [services.borrow_book(self.dune.pk, self.admin) for _ in range(3)]
+        self.loans.append(services.borrow_book(self.emma.pk, self.admin))
+
+    def counts(self):
+        return list(Book.objects.order_by('title').values_list('available_count', flat=True))
+
+    def post(self, action, loans):
+        return self.client.post(reverse('borrowed_books_admin'),
+                                {'action': action, 'record_ids': [loan.pk for loan in loans]})
+
+    def test_bulk_return_is_set_based(self):
+        # savepoint, SELECT, UPDATE loans, one UPDATE per copy count (3 and 1), SELECT holds,
+        # INSERT change log, release
+        with self.assertNumQueries(8):
+            closed = services.return_loans([loan.pk for loan in self.loans])
+        self.assertEqual(closed, 4)
+        self.assertEqual(self.counts(), [3, 1])
+        self.assertEqual(services.return_loans([loan.pk for loan in self.loans]), 0)
+
+    def test_bulk_reopen_stops_when_copies_run_out(self):
+        services.return_loans([loan.pk for loan in self.loans])
+        services.borrow_book(self.dune.pk, self.admin)
+        self.assertEqual(services.reopen_loans([loan.pk for loan in self.loans]), 3)
+        self.assertEqual(self.counts(), [0, 0])
+        self.assertEqual(BorrowRecord.objects.filter(return_date__isnull=False).count(), 1)
+
+    def test_bulk_actions_through_the_ledger(self):
+        self.post('returned', self.loans[:2])
+        self.assertEqual(self.counts(), [2, 0])
+        self.post('borrowed', self.loans[:1])
+        self.assertEqual(self.counts(), [1, 0])
+        response = self.post('delete', self.loans[1:])
+        self.assertRedirects(response, reverse('borrowed_books_admin'))
+        self.assertEqual(self.counts(), [2, 1])
+        self.assertEqual(list(BorrowRecord.objects.all()), self.loans[:1])
+
+    def test_single_record_form_still_works(self):
+        self.client.post(reverse('borrowed_books_admin'), {'record_id': self.loans[3].pk, 'status': 'returned'})
+        self.assertEqual(self.counts(), [0, 1])
+
+    def test_filters_and_pagination(self):
+        services.return_loan(self.loans[0])
+        BorrowRecord.objects.filter(pk=self.loans[1].pk).update(due_date=timezone.now() - timedelta(days=1))
+        url = reverse('borrowed_books_admin')
+        cases = {'returned': [self.loans[0]], 'overdue': [self.loans[1]], 'open': self.loans[1:]}
+        for status, expected in cases.items():
+            with self.subTest(status=status):
+                response = self.client.get(url, {'status': status})
+                self.assertCountEqual(response.context['borrowed_books'], expected)
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.client.get(url, {'since': tomorrow}).context['borrowed_books']), 0)
+        self.assertEqual(len(self.client.get(url, {'until': tomorrow, 'borrower': 'LIB'}).context['borrowed_books']), 4)
+        response = self.client.get(url, {'since': 'soon'})
+        self.assertEqual(len(response.context['borrowed_books']), 4)
+        self.assertTrue(response.context['filters'].errors)
+
+        with self.settings(CATALOG_PAGE_SIZE=2):
+            first = self.client.get(url, {'status': 'open'})
+            page = first.context['page']
+            self.assertContains(first, f'?status=open&amp;cursor={page.next_cursor}')
+            rest = self.client.get(url, {'status': 'open', 'cursor': page.next_cursor})
+        self.assertEqual(len(page.object_list) + len(rest.context['borrowed_books']), 3)
+
+
+class ChangeLogTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('reader', 'reader@example.com', 'secret-pass')
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.',
+                                        total_copies=3, available_count=3)
+        self.start = changelog.latest_token()
+
+    def logged(self, since=None):
+        return list(ChangeLog.objects.filter(id__gt=since if since is not None else self.start)
+                    .order_by('id').values_list('kind', 'object_id'))
+
+    def test_service_updates_are_logged(self):
+        loan = services.borrow_book(self.dune.pk, self.user)
+        self.assertEqual(self.logged(), [('book', self.dune.pk), ('loan', loan.pk)])
+        token = changelog.latest_token()
+        services.return_loan(loan)
+        self.assertEqual(self.logged(token), [('book', self.dune.pk), ('loan', loan.pk)])
+
+        form = BookForm({'title': 'Dune', 'author': 'Frank Herbert', 'description': 'Desert planet.',
+                         'total_copies': 4}, instance=self.dune)
+        self.assertTrue(form.is_valid())
+        token = changelog.latest_token()
+        form.save()
+        self.assertEqual(self.logged(token), [('book', self.dune.pk)])
+
+    def test_bulk_delete_logs_with_one_insert(self):
+        loans = [services.borrow_book(self.dune.pk, self.user) for _ in range(3)]
+        token = changelog.latest_token()
+        with CaptureQueriesContext(connection) as queries:
+            services.delete_loans([loan.pk for loan in loans])
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "books_changelog"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(sorted(self.logged(token)), [('book', self.dune.pk)] + [('loan', loan.pk) for loan in loans])
+
+    def test_changes_since_keeps_the_latest_entry_per_object(self):
+        emma = Book.objects.create(title='Emma', author='Jane Austen', description='Matchmaking.')
+        self.dune.save()
+        changes, token, more = changelog.changes_since(self.start, limit=10)
+        self.assertEqual([(kind, object_id) for _, kind, object_id in changes],
+                         [('book', emma.pk), ('book', self.dune.pk)])
+        self.assertEqual((token, more), (changelog.latest_token(), False))
+
+    def test_compaction(self):
+        emma = Book.objects.create(title='Emma', author='Jane Austen', description='Matchmaking.')
+        self.dune.save()
+        ChangeLog.objects.filter(object_id=emma.pk).update(changed_at=timezone.now() - timedelta(days=90))
+        out = io.StringIO()
+        call_command('compact_changelog', stdout=out)
+        self.assertIn('Removed 1 superseded and 1 expired entries', out.getvalue())
+        self.assertEqual(self.logged(0), [('book', self.dune.pk)])
+        self.assertIsNone(changelog.changes_since(self.start, limit=10))
+        changes, _, _ = changelog.changes_since(changelog.horizon(), limit=10)
+        self.assertEqual([object_id for _, _, object_id in changes], [self.dune.pk])
+
+
+class OverdueTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.ann = User.objects.create_user('ann', 'ann@example.com', 'secret-pass')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'secret-pass')
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.',
+                                        total_copies=5, available_count=5)
+        past = timezone.now() - timedelta(days=2)
+        self.late = [services.borrow_book(self.book.pk, self.ann, past - timedelta(days=day)) for day in range(2)]
+        services.borrow_book(self.book.pk, self.bob)
+
+    def test_due_date_default_is_computed_per_loan(self):
+        record = BorrowRecord(book=self.book, borrower_name='ann')
+        self.assertAlmostEqual(record.due_date, timezone.now() + services.LOAN_PERIOD, delta=timedelta(seconds=5))
+
+    def test_sweep_materializes_counts_per_user(self):
+        out = io.StringIO()
+        call_command('sweep_overdue', stdout=out)
+        self.assertIn('2 overdue loans across 1 users', out.getvalue())
+        summary = OverdueSummary.objects.get()
+        self.assertEqual((summary.user, summary.overdue_count), (self.ann, 2))
+        self.assertEqual(summary.oldest_due_date, self.late[1].due_date)
+
+        self.client.force_login(self.ann)
+        self.assertContains(self.client.get(reverse('borrowed_books_user')), 'You have 2 overdue books')
+
+    def test_returns_refresh_the_borrowers_summary(self):
+        overdue.refresh()
+        services.return_loan(self.late[0])
+        self.assertEqual(OverdueSummary.objects.get().overdue_count, 1)
+        services.return_loans([self.late[1].pk])
+        self.assertFalse(OverdueSummary.objects.exists())
+        services.reopen_loans([self.late[1].pk])
+        self.assertEqual(OverdueSummary.objects.get().overdue_count, 1)
+
+
+class CirculationTests(TestCase):
+    def setUp(self):
+        self.reader = get_user_model().objects.create_user('reader', 'reader@example.com', 'secret-pass')
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.',
+                                        total_copies=3, available_count=3)
+        self.emma = Book.objects.create(title='Emma', author='Jane Austen', description='Matchmaking.')
+
+    def lend(self, book, days_ago, kept=None):
+        borrowed = timezone.now() - timedelta(days=days_ago)
+        record = services.borrow_book(book.pk, self.reader)
+        BorrowRecord.objects.filter(pk=record.pk).update(borrow_date=borrowed)
+        if kept is not None:
+            services.return_loan(record)
+            BorrowRecord.objects.filter(pk=record.pk).update(return_date=borrowed + timedelta(days=kept))
+        return record
+
+    def test_refresh_is_incremental(self):
+        self.lend(self.dune, 10, kept=4)
+        self.lend(self.dune, 3)
+        self.assertEqual(circulation.refresh(), (2, 1))
+        self.assertEqual(circulation.refresh(), (0, 0))
+
+        self.lend(self.emma, 0, kept=0)  # Too recent: left for a later run
+        self.assertEqual(circulation.refresh(), (0, 0))
+        self.assertEqual(circulation.refresh(timezone.now() + timedelta(minutes=5)), (1, 1))
+
+        dune = BookCirculation.objects.get(book=self.dune)
+        self.assertEqual((dune.borrow_count, dune.return_count, dune.loan_time), (2, 1, timedelta(days=4)))
+        self.assertEqual(AuthorCirculation.objects.get(author='Jane Austen').borrow_count, 1)
+        self.assertEqual(sum(DailyCirculation.objects.values_list('borrow_count', flat=True)), 3)
+
+    def test_rebuild_matches_incremental_refresh(self):
+        self.lend(self.dune, 10, kept=4)
+        self.lend(self.dune, 5, kept=2)
+        circulation.refresh()
+        self.lend(self.dune, 0, kept=0)
+        self.lend(self.emma, 0)
+        later = timezone.now() + timedelta(minutes=5)
+        circulation.refresh(later)
+        incremental = list(DailyCirculation.objects.order_by('day').values())
+        self.assertEqual(circulation.rebuild(later), (4, 3))
+        self.assertEqual(list(DailyCirculation.objects.order_by('day').values()), incremental)
+
+    def test_dashboard_reads_only_the_rollups(self):
+        self.lend(self.dune, 10, kept=4)
+        self.lend(self.emma, 6, kept=2)
+        circulation.refresh()
+        admin = get_user_model().objects.create_user('librarian', 'l@example.com', 'secret-pass', is_superuser=True)
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('circulation_dashboard'))
+        self.assertFalse([query for query in queries if 'books_borrowrecord' in query['sql']])
+        self.assertEqual(response.context['average_loan_days'], 3)
+        self.assertEqual([row.book for row in response.context['top_books']][:2], [self.dune, self.emma])
+        self.assertContains(response, 'Frank Herbert')
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.reader = get_user_model().objects.create_user('reader', 'reader@example.com', 'secret-pass')
+        self.book = Book.objects.create(title='Emma', author='Jane Austen', description='Novel.', total_copies=2,
+                                        available_count=2)
+        self.client.force_login(self.reader)
+
+    async def test_async_views(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.get(reverse('book_list'), {'q': 'emma'})
+        self.assertContains(response, 'data-availability="%d"' % self.book.pk)
+        response = await self.async_client.get(reverse('available_books'))
+        self.assertContains(response, 'Emma')
+        response = await self.async_client.get(reverse('borrowed_books_user'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_async_views_share_the_sync_cache(self):
+        caches['catalog'].clear()
+        self.client.get(reverse('book_list_user'))
+        self.client.get(reverse('book_list'))
+        self.assertEqual(catalog_cache.stats(['shelf'])['shelf']['hit'], 1)
+
+    def test_stream_is_off_unless_enabled(self):
+        response = self.client.get(reverse('book_list_user'))
+        self.assertNotContains(response, 'availability.js')
+        self.assertEqual(self.client.get(reverse('availability_events')).status_code, 204)
+        with override_settings(AVAILABILITY_EVENTS_ENABLED=True):
+            response = self.client.get(reverse('book_list_user'))
+        self.assertContains(response, 'data-events-url="%s"' % reverse('availability_events'))
+
+    @override_settings(AVAILABILITY_EVENTS_ENABLED=True)
+    def test_stream_pushes_availability_after_commit(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        response = self.client.get(reverse('availability_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue(loop.run_until_complete(anext(stream)).startswith(b'retry:'))
+
+        received = loop.create_task(anext(stream))
+        while not events.broker:
+            loop.run_until_complete(asyncio.sleep(0))
+        with self.captureOnCommitCallbacks(execute=True):
+            record = services.borrow_book(self.book.pk, self.reader)
+        message = loop.run_until_complete(received).decode()
+        self.assertIn('event: availability\n', message)
+        data = json.loads(message.split('data: ')[1])
+        self.assertEqual(data, {'id': self.book.pk, 'available_count': 1, 'total_copies': 2})
+
+        received = loop.create_task(anext(stream))
+        loop.run_until_complete(asyncio.sleep(0))
+        with self.captureOnCommitCallbacks(execute=True):
+            services.return_loan(record)
+        self.assertIn('"available_count":2', loop.run_until_complete(received).decode())
+
+        # A disconnecting client cancels the pending read, which unsubscribes
+        received = loop.create_task(anext(stream))
+        loop.run_until_complete(asyncio.sleep(0))
+        received.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            loop.run_until_complete(received)
+        self.assertFalse(events.broker)
+
+    def test_nothing_is_published_without_listeners(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            services.borrow_book(self.book.pk, self.reader)
+        self.assertEqual({callback.__name__ for callback in callbacks}, {'_set_new_version'})
+
+
+class ConcurrentBorrowTests(TransactionTestCase):
+    workers = 200
+
+    def test_parallel_borrows_never_exceed_the_copies(self):
+        User = get_user_model()
+        User.objects.bulk_create(User(username=f'reader{n}', password='!') for n in range(self.workers))
+        users = list(User.objects.all())
+        book = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.',
+                                   total_copies=3, available_count=3)
+        barrier = threading.Barrier(self.workers)
+        results = []
+
+        def attempt(user):
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        results.append(services.borrow_book(book.pk, user) is not None)
+                        return
+                    except OperationalError:
+                        # The in-memory test database ignores the busy timeout; try again
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.workers)
+        self.assertEqual(results.count(True), 3)
+        self.assertEqual(BorrowRecord.objects.filter(book=book).count(), 3)
+        book.refresh_from_db()
+        self.assertEqual(book.available_count, 0)
+
+
+    def test_bench_contention_leaves_nothing_behind(self):
+        Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.')
+        before = list(ChangeLog.objects.values_list('kind', 'object_id'))
+        out = io.StringIO()
+        call_command('bench_contention', threads=2, duration=0.2, books=1, copies=1, stdout=out)
+        self.assertIn('borrow+return/s', out.getvalue())
+        self.assertEqual(Book.objects.count(), 1)
+        self.assertFalse(BorrowRecord.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertEqual(list(ChangeLog.objects.values_list('kind', 'object_id')), before)
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite tuning")
+class SQLiteTuningTests(TestCase):
+    def pragma(self, cursor, name):
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(self.pragma(cursor, 'synchronous'), 1)  # NORMAL
+            self.assertEqual(self.pragma(cursor, 'temp_store'), 2)  # MEMORY
+            self.assertEqual(self.pragma(cursor, 'busy_timeout'), connection.settings_dict['OPTIONS']['timeout'] * 1000)
+
+    def test_file_database_uses_wal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = connections['default'].__class__({**connection.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')})
+            try:
+                with wrapper.cursor() as cursor:
+                    self.assertEqual(self.pragma(cursor, 'journal_mode'), 'wal')
+            finally:
+                wrapper.close()
+
+
+class ProductionSettingsTests(TestCase):
+    def load(self, **environ):
+        # base reads the environment too, so import fresh copies of both
+        with mock.patch.dict(os.environ, environ), mock.patch.dict(sys.modules):
+            for name in ('booksystem.settings.base', 'booksystem.settings.prod'):
+                sys.modules.pop(name, None)
+            return importlib.import_module('booksystem.settings.prod')
+
+    def test_secrets_are_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load(DJANGO_SECRET_KEY='', DJANGO_ALLOWED_HOSTS='')
+
+    def test_profile(self):
+        prod = self.load(DJANGO_SECRET_KEY='secret', DJANGO_ALLOWED_HOSTS='library.example.com,www.library.example.com')
+        self.assertFalse(prod.DEBUG)
+        self.assertEqual(prod.ALLOWED_HOSTS, ['library.example.com', 'www.library.example.com'])
+        self.assertEqual(prod.TEMPLATES[0]['OPTIONS']['loaders'][0][0], 'django.template.loaders.cached.Loader')
+        self.assertEqual(prod.SESSION_ENGINE, 'django.contrib.sessions.backends.signed_cookies')
+        self.assertEqual(prod.STORAGES['staticfiles']['BACKEND'],
+                         'booksystem.compression.CompressedManifestStaticFilesStorage')
+        self.assertNotIn('booksystem.querybudget.QueryBudgetMiddleware', prod.MIDDLEWARE)
+        self.assertEqual(prod.CACHES['catalog']['BACKEND'], 'django.core.cache.backends.redis.RedisCache')
+        self.assertEqual((prod.RATELIMIT_STORE, prod.RATELIMIT_CACHE), ('cache', 'catalog'))
+
+        prod = self.load(DJANGO_SECRET_KEY='secret', DJANGO_ALLOWED_HOSTS='library.example.com', SESSION_STORE='cache')
+        self.assertEqual(prod.SESSION_ENGINE, 'django.contrib.sessions.backends.cache')
+        self.assertIn(prod.SESSION_CACHE_ALIAS, prod.CACHES)
+
+    def test_caches_are_shared_between_workers(self):
+        secrets = {'DJANGO_SECRET_KEY': 'secret', 'DJANGO_ALLOWED_HOSTS': 'library.example.com'}
+        prod = self.load(**secrets, CATALOG_CACHE_BACKEND='file')
+        self.assertEqual(prod.CACHES['catalog']['BACKEND'], 'django.core.cache.backends.filebased.FileBasedCache')
+        for environ in ({'CATALOG_CACHE_BACKEND': 'locmem'}, {'RATELIMIT_STORE': 'local'}):
+            with self.subTest(**environ), self.assertRaises(ImproperlyConfigured):
+                self.load(**secrets, **environ)
+
+
+class PageWeightTests(TestCase):
+    # Bytes of the member catalog with three books; it was about 7000 with the CSS inline
+    CATALOG_PAGE_BYTES = 3500
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('reader', 'reader@example.com', 'secret-pass')
+        for number in range(3):
+            Book.objects.create(title=f'Book {number}', author='Author', description='Story.')
+
+    def test_pages_share_one_stylesheet(self):
+        self.client.force_login(self.user)
+        for name in ('book_list_user', 'borrowed_books_user', 'my_holds', 'view_profile'):
+            response = self.client.get(reverse(name))
+            self.assertNotContains(response, '<style')
+            self.assertContains(response, '/static/books/css/library.css')
+        self.assertLess(len(self.client.get(reverse('book_list_user')).content), self.CATALOG_PAGE_BYTES)
+        self.client.logout()
+        self.assertContains(self.client.get(reverse('login')), '/static/accounts/css/auth.css')
+
+    def test_html_is_gzipped(self):
+        self.client.force_login(self.user)
+        plain = self.client.get(reverse('book_list_user')).content
+        response = self.client.get(reverse('book_list_user'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertLess(len(response.content), len(plain) / 2)
+        # The CSRF token in the page differs per request, the rest does not
+        self.assertEqual(len(gzip.decompress(response.content)), len(plain))
+
+    def test_event_streams_are_left_alone(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = StreamingHttpResponse(iter([b'data: 1\n\n'] * 100), content_type='text/event-stream')
+        response = compression.GZipMiddleware(lambda request: response)(request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_collectstatic_writes_compressed_copies(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        storages = {**settings.STORAGES, 'staticfiles': {
+            'BACKEND': 'booksystem.compression.CompressedManifestStaticFilesStorage'}}
+        with self.settings(STATIC_ROOT=root.name, STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            stylesheet = staticfiles_storage.stored_name('books/css/library.css')
+            self.assertNotEqual(stylesheet, 'books/css/library.css')
+            with staticfiles_storage.open(stylesheet) as original, \
+                    staticfiles_storage.open(f'{stylesheet}.gz') as compressed:
+                self.assertEqual(gzip.decompress(compressed.read()), original.read())
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, 'profile.jsonl')
+        for number in range(3):
+            Book.objects.create(title=f'Book {number}', author='Author', description='Story.')
+        self.admin = get_user_model().objects.create_user('librarian', 'librarian@example.com', 'secret-pass',
+                                                          is_superuser=True)
+        self.client.force_login(self.admin)
+
+    def records(self):
+        with open(self.log) as handle:
+            return [json.loads(line) for line in handle]
+
+    def test_records_sql_per_request(self):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_LOG=self.log, PROFILING_SAMPLE_RATE=1):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('all_users'))
+            count = len(queries)
+            self.client.get(reverse('book_list'))
+        first, second = self.records()
+        self.assertEqual((first['view'], first['status'], first['sql_count']), ('all_users', 200, count))
+        self.assertFalse(first['slow'])
+        self.assertEqual(second['view'], 'book_list')
+
+        out = io.StringIO()
+        call_command('profile_report', log=self.log, sort='requests', stdout=out)
+        self.assertIn('2 requests in 1 file(s)', out.getvalue())
+        self.assertIn('GET all_users', out.getvalue())
+
+        with open(self.log, 'a') as handle:
+            handle.write('{"method":"GET","view":"book_l\n[1, 2]\n')
+        out = io.StringIO()
+        call_command('profile_report', log=self.log, stdout=out)
+        self.assertIn('2 requests in 1 file(s), 2 unreadable line(s) skipped', out.getvalue())
+
+    def test_samples_but_always_keeps_slow_requests(self):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_LOG=self.log, PROFILING_SAMPLE_RATE=0,
+                           PROFILING_SLOW_REQUEST_MS=0, PROFILING_SLOW_QUERY_MS=0):
+            with self.assertLogs('booksystem.profiling', 'WARNING'):
+                self.client.get(reverse('book_list'))
+        record, = self.records()
+        self.assertTrue(record['slow'])
+        self.assertEqual(len(record['slow_queries']), record['sql_count'])
+
+    async def test_async_views_stay_on_the_event_loop(self):
+        async def view(request):
+            return None
+
+        with self.settings(PROFILING_ENABLED=True, PROFILING_LOG=self.log, PROFILING_SAMPLE_RATE=1):
+            self.assertTrue(iscoroutinefunction(profiling.ProfilingMiddleware(view)))
+            await self.async_client.aforce_login(self.admin)
+            response = await self.async_client.get(reverse('book_list'))
+        self.assertEqual(response.status_code, 200)
+        record, = self.records()
+        self.assertEqual(record['view'], 'book_list')
+        self.assertGreater(record['sql_count'], 0)
+
+    def test_duplicate_fingerprints(self):
+        recorder = profiling.QueryRecorder(slow_ms=1000)
+        with connection.execute_wrapper(recorder):
+            for book in Book.objects.all():
+                Book.objects.filter(pk=book.pk).exists()
+            list(Book.objects.filter(pk__in=[1, 2]))
+            list(Book.objects.filter(pk__in=[1, 2, 3]))
+        counts = sorted(duplicate['count'] for duplicate in recorder.duplicates())
+        self.assertEqual(counts, [2, 3])
+
+    def test_disabled_by_default(self):
+        self.client.get(reverse('book_list'))
+        self.assertFalse(os.path.exists(self.log))
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.user = get_user_model().objects.create_user('reader', 'reader@example.com', 'secret-pass')
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.')
+
+    def test_second_request_is_served_from_cache(self):
+        self.client.get(reverse('available_books'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('available_books'))
+        self.assertContains(response, 'Dune')
+        self.assertEqual(catalog_cache.stats(['shelf'])['shelf'], {'hit': 1, 'miss': 1})
+
+    def test_saves_and_borrows_invalidate(self):
+        self.client.get(reverse('book_list'))
+        Book.objects.create(title='Emma', author='Jane Austen', description='Matchmaking.')
+        self.assertContains(self.client.get(reverse('book_list')), 'Emma')
+
+        services.borrow_book(self.book.pk, self.user)
+        self.assertNotContains(self.client.get(reverse('book_list')), 'Dune')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name, IMAGE_VARIANT_WIDTHS=(100, 200))
+        override.enable()
+        self.addCleanup(override.disable)
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 1200), 'navy').save(buffer, 'JPEG')
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet.',
+                                        image=SimpleUploadedFile('dune.jpg', buffer.getvalue()))
+
+    def test_variants_are_resized_next_to_the_original(self):
+        self.assertEqual(images.generate_variants(self.book.image.name), [100, 200])
+        self.assertEqual(sorted(default_storage.listdir('images')[1]),
+                         ['dune.jpg', 'dune_w100.jpg', 'dune_w100.webp', 'dune_w200.jpg', 'dune_w200.webp'])
+        with default_storage.open('images/dune_w200.webp') as variant:
+            self.assertEqual(Image.open(variant).size, (200, 300))
+
+    def test_narrow_originals_are_not_scaled_up(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (150, 200), 'navy').save(buffer, 'JPEG')
+        name = default_storage.save('images/narrow.jpg', ContentFile(buffer.getvalue()))
+        self.assertEqual(images.generate_variants(name), [100, 150])
+        with default_storage.open('images/narrow_w150.webp') as variant:
+            self.assertEqual(Image.open(variant).size, (150, 200))
+
+    def test_cover_uses_the_recorded_variants(self):
+        template = Template('{% load book_images %}{% book_cover book.image book.title %}')
+        html = template.render(Context({'book': self.book}))
+        self.assertNotIn('srcset', html)
+        images.record_variants(self.book.image.name, images.generate_variants(self.book.image.name))
+        book = Book.objects.get(pk=self.book.pk)
+        with mock.patch.object(default_storage, 'exists', side_effect=AssertionError("storage was queried")):
+            html = template.render(Context({'book': book}))
+        self.assertIn('/media/images/dune_w100.webp 100w, /media/images/dune_w200.webp 200w', html)
+
+        # A new image drops the widths of the old one until its own are written
+        with default_storage.open(book.image.name) as original:
+            upload = SimpleUploadedFile('new.jpg', original.read())
+        form = BookForm({'title': 'Dune', 'author': 'Frank Herbert', 'description': 'Desert planet.',
+                         'total_copies': 1}, {'image': upload}, instance=book)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIsNone(form.save().image_variants)
+
+
+class ImportBooksTests(TestCase):
+    def test_counter_check_validates_normally(self):
+        book = Book(title='Emma', author='Anonymous', description='Matchmaking.', total_copies=1, available_count=2)
+        with self.assertRaisesMessage(ValidationError, 'book_available_within_total'):
+            book.full_clean()
+        # Forms leave available_count out; services.py moves it with F() updates
+        book.full_clean(exclude={'available_count'})
+
+    def write(self, name, content):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_csv_rows_are_validated_and_batched(self):
+        path = self.write('books.csv', 'title,author,description,total_copies\n'
+                                       'Emma,Jane Austen,Matchmaking.,2\n'
+                                       ',Nobody,Missing title.,1\n'
+                                       'Dune,Frank Herbert,Desert planet.,\n')
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_books', path, batch_size=1, stdout=out, stderr=err)
+        self.assertIn('Imported 2 books (1 invalid rows skipped)', out.getvalue())
+        self.assertIn('Row 2: title', err.getvalue())
+        self.assertEqual(sorted(Book.objects.values_list('title', 'total_copies', 'available_count')),
+                         [('Dune', 1, 1), ('Emma', 2, 2)])
+        self.assertEqual(search_books(Book.objects.all(), 'austen').get().title, 'Emma')
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_jsonl_import_resumes_from_checkpoint(self):
+        lines = [json.dumps({'title': f'Book {n}', 'author': 'Author', 'description': 'Story.'}) for n in range(5)]
+        path = self.write('books.jsonl', '\n'.join(lines) + '\n')
+        with open(f'{path}.checkpoint', 'w') as handle:
+            handle.write('3')
+        call_command('import_books', path, stdout=io.StringIO())
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), ['Book 3', 'Book 4'])
+
+    def test_malformed_lines_and_zero_copies_are_row_errors(self):
+        path = self.write('books.jsonl', '\n'.join([
+            json.dumps({'title': 'Emma', 'author': 'Jane Austen', 'description': 'Matchmaking.'}),
+            '{"title": "Dune", "author"',
+            '["Dune", "Frank Herbert"]',
+            json.dumps({'title': 'Dune', 'author': 'Frank Herbert', 'description': 'Desert.', 'total_copies': 0}),
+        ]) + '\n')
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_books', path, stdout=out, stderr=err)
+        self.assertIn('Imported 1 books (3 invalid rows skipped)', out.getvalue())
+        self.assertIn('Row 2: line 2: not valid JSON', err.getvalue())
+        self.assertIn('Row 3: line 3: expected an object, not list', err.getvalue())
+        self.assertIn('Row 4: total_copies: A book needs at least one copy.', err.getvalue())
+        self.assertEqual(list(Book.objects.values_list('title', 'total_copies')), [('Emma', 1)])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(
+            'librarian', 'librarian@example.com', 'secret-pass', is_superuser=True, is_staff=True)
+        self.client.force_login(self.admin)
+        self.old = Book.objects.create(title='Emma', author='Jane Austen', description='Matchmaking.',
+                                       registered_date=timezone.make_aware(timezone.datetime(2024, 1, 10)))
+        self.new = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert, planet.',
+                                       registered_date=timezone.make_aware(timezone.datetime(2024, 3, 5)))
+        services.borrow_book(self.new.pk, self.admin)
+
+    def test_books_csv_streams_with_date_range(self):
+        response = self.client.get(reverse('export_books'), {'since': '2024-03-01', 'until': '2024-03-05'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'title', 'author'])
+        self.assertEqual([row[1:4] for row in rows[1:]], [['Dune', 'Frank Herbert', 'Desert, planet.']])
+
+    def test_loans_ndjson(self):
+        response = self.client.get(reverse('export_loans'), {'format': 'ndjson'})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['book__title'], 'Dune')
+        self.assertEqual(records[0]['borrower_name'], 'librarian')
+        self.assertIsNone(records[0]['return_date'])
+
+    async def test_streams_chunk_by_chunk_under_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        with mock.patch.object(exports, 'CHUNK_SIZE', 1):
+            response = await self.async_client.get(reverse('export_books'))
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response]
+        self.assertEqual(chunks[0].decode().splitlines()[0].split(',')[:2], ['id', 'title'])
+        self.assertEqual([chunk.decode().split(',')[1] for chunk in chunks[1:]], ['Emma', 'Dune'])
+
+    def test_bad_parameters_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('export_books'), {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_books'), {'since': 'yesterday'}).status_code, 400)
+
+    def test_command_writes_the_same_export(self):
+        out = io.StringIO()
+        call_command('export_data', 'books', '--until', '2024-02-01', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1].split(',')[1], 'Emma')
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+class SeedLibraryTests(TestCase):
+    def seed(self, prefix):
+        call_command('seed_library', users=20, books=50, loans=400, open_ratio=0.5, batch_size=150,
+                     prefix=prefix, stdout=io.StringIO())
+        records = BorrowRecord.objects.filter(borrower__username__startswith=f'{prefix}-')
+        return sorted((record.book.title, record.borrower.username.split('-')[1], record.return_date is None)
+                      for record in records.select_related('book', 'borrower'))
+
+    def test_counts_match_open_loans(self):
+        loans = self.seed('reader')
+        self.assertEqual((get_user_model().objects.count(), Book.objects.count(), len(loans)), (20, 50, 400))
+        self.assertTrue(any(is_open for _, _, is_open in loans))
+        for book in Book.objects.all():
+            out = book.borrowrecord_set.filter(return_date__isnull=True).count()
+            self.assertEqual(book.available_count, book.total_copies - out)
+        self.assertTrue(self.client.login(username='reader.0@example.com', password=benchmarks.SEED_PASSWORD))
+
+    def test_same_seed_same_library(self):
+        self.assertEqual(self.seed('first'), self.seed('second'))
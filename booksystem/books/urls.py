@@ -1,7 +1,5 @@
 from django.urls import path
 from . import views
-from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth.views import LogoutView
 
 urlpatterns = [
@@ -11,8 +9,12 @@ urlpatterns = [
     path('edit/<int:pk>/', views.update_book, name='update_book'),  # Edit book
     path('delete/<int:pk>/', views.delete_book, name='delete_book'),  # Delete book
     path('available/', views.available_books, name='available_books'),  # List available books
+    path('available/events/', views.availability_events, name='availability_events'),  # Live availability (SSE)
     path('borrow/<int:book_id>/', views.borrow_book, name='borrow_book'),  # Borrow a book
     path('return/<int:book_id>/', views.return_book, name='return_book'),  # Return a book
+    path('hold/<int:book_id>/', views.place_hold, name='place_hold'),  # Queue for a book
+    path('holds/', views.my_holds, name='my_holds'),  # User's holds
+    path('holds/<int:hold_id>/cancel/', views.cancel_hold, name='cancel_hold'),  # Leave a queue
     path('borrowed_books/', views.borrowed_books, name='borrowed_books'),  # All borrowed books
     path('borrowed_books_user/', views.borrowed_books_user, name='borrowed_books_user'),  # User-specific borrowed books
     path('borrowed_books/admin/', views.borrowed_books_admin, name='borrowed_books_admin'),  # Admin view of borrowed books
@@ -23,8 +25,7 @@ urlpatterns = [
     path('books/all/', views.all_books, name='all_books'),
     path('books/edit/<int:pk>/', views.edit_book, name='edit_book'),
     path('borrowed_books/delete/<int:record_id>/', views.delete_borrow_record, name='delete_borrow_record'),
-
-
-
-
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('circulation/', views.circulation_dashboard, name='circulation_dashboard'),
+    path('export/books/', views.export_data, {'kind': 'books'}, name='export_books'),
+    path('export/loans/', views.export_data, {'kind': 'loans'}, name='export_loans'),
+]
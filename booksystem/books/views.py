@@ -1,22 +1,37 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Book, BorrowRecord
-from .forms import BookForm, CustomUserEditForm
-from django.utils import timezone
-from django.db.models import Q  # For complex queries
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.db import transaction
+from . import circulation, events, exports, services
+from .cache import acached, cached, template_context as cache_context
+from .models import Book, BorrowRecord, ChangeLog, Hold, OverdueSummary
+from .forms import BookForm, CustomUserEditForm, LoanFilterForm
+from .pagination import DEFAULT_ORDERING, KeysetPaginator
+from .search import SEARCH_ORDERING, search_books
+from accounts import permissions
+from accounts.decorators import requires
+from booksystem.querybudget import query_budget
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth import get_user_model
 from django.contrib import messages
-from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
 
 
 
+@query_budget(2)
+@requires('loans.manage')
 def delete_borrow_record(request, record_id):
     if request.method == 'POST':
-        record = get_object_or_404(BorrowRecord, id=record_id)
-        record.delete()
+        get_object_or_404(BorrowRecord, id=record_id)
+        services.delete_loans([record_id])
     return redirect('borrowed_books_admin')
 
+@query_budget(3)
+@requires('catalog.manage')
 def edit_book(request, pk):
     """
     View to edit a book's details.
@@ -24,24 +39,24 @@ def edit_book(request, pk):
     book = get_object_or_404(Book, pk=pk)
     if request.method == 'POST':
         form = BookForm(request.POST, request.FILES, instance=book)
-        if form.is_valid():
-            form.save()
+        # save() turns the form invalid if a borrow took the copies being removed
+        if form.is_valid() and form.save():
             return redirect('all_books')  # Redirect to the list of all books
     else:
         form = BookForm(instance=book)
     return render(request, 'books/book_form.html', {'form': form, 'book': book})
 
+@query_budget(3)
+@requires('catalog.manage')
 def all_books(request):
     """
     View to display all books in the system with their availability and status.
     """
-    books = Book.get_all_books_with_status()
-    return render(request, 'books/all_books.html', {'books': books})
-# Check if user is an admin
-def is_admin(user):
-    return user.is_superuser
-
-@user_passes_test(is_admin)
+    page = cached('all_books', (request.GET.get('cursor'),),
+                  lambda: paginate_books(request, Book.get_all_books_with_status()))
+    return render(request, 'books/all_books.html', {'books': page.object_list, 'page': page, **cache_context()})
+@query_budget(5)  # A role change loads and saves the user before the list
+@requires('users.manage')
 def all_users(request):
     User = get_user_model()  # Retrieve the custom user model
     users = User.objects.all().order_by('username')  # Fetch all users
@@ -53,13 +68,9 @@ def all_users(request):
         if user_id and user_type:
             try:
                 user = User.objects.get(id=user_id)
-                if user_type == 'admin':
-                    user.is_superuser = True
-                    user.is_staff = True
-                else:
-                    user.is_superuser = False
-                    user.is_staff = False
-                user.save()
+                # The user's cached permissions are stamped with these flags, so this applies at once
+                permissions.set_role(user, permissions.ADMIN if user_type == 'admin' else permissions.MEMBER)
+                user.save(update_fields=['is_superuser', 'is_staff', 'is_admin'])
             except User.DoesNotExist:
                 pass  # Handle user not found
 
@@ -71,40 +82,104 @@ def home(request):
     return HttpResponse("Welcome to the Book System!")
 
 
+def paginate_books(request, books, ordering=None):
+    """
+    Return the keyset page of ``books`` selected by the ``cursor`` query parameter.
+    """
+    paginator = KeysetPaginator(books, ordering or DEFAULT_ORDERING, per_page=settings.CATALOG_PAGE_SIZE)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def shelf_page(request, query=None):
+    """
+    Cached keyset page of the books on the shelf, optionally narrowed by a search.
+    """
+    def build():
+        books = Book.objects.available()
+        if query:
+            return paginate_books(request, search_books(books, query), SEARCH_ORDERING)
+        return paginate_books(request, books)
+    return cached('shelf', (query, request.GET.get('cursor')), build)
+
+
+async def ashelf_page(request, query=None):
+    """
+    Async ``shelf_page()``; shares its cache entries.
+    """
+    async def build():
+        books = Book.objects.available()
+        ordering = DEFAULT_ORDERING
+        if query:
+            books, ordering = search_books(books, query), SEARCH_ORDERING
+        paginator = KeysetPaginator(books, ordering, per_page=settings.CATALOG_PAGE_SIZE)
+        return await paginator.aget_page(request.GET.get('cursor'))
+    return await acached('shelf', (query, request.GET.get('cursor')), build)
+
+
+# Templates may touch the session or the cache, so render off the event loop
+arender = sync_to_async(render)
+
+
 # List all books
-def book_list(request):
+@query_budget(3)
+@requires('catalog.view')
+async def book_list(request):
     query = request.GET.get('q')  # Get the search term from the query parameters
-    if query:
-        books = Book.objects.filter(
-            Q(title__icontains=query) | Q(author__icontains=query),
-            available=True
-        ).order_by('-registered_date')
-    else:
-        books = Book.objects.filter(available=True).order_by('-registered_date')
-
-    return render(request, 'books/book_list.html', {'books': books, 'query': query})
+    page = await ashelf_page(request, query)
+    context = await sync_to_async(cache_context)()
+    return await arender(request, 'books/book_list.html', {'books': page.object_list, 'page': page, 'query': query, **context})
 
 
 # List books for user with personalization
+@query_budget(3)
+@requires('catalog.view')
 def book_list_user(request):
     query = request.GET.get('q')
-    if query:
-        books = Book.objects.filter(
-            Q(title__icontains=query) | Q(author__icontains=query),
-            available=True
-        ).order_by('-registered_date')
-    else:
-        books = Book.objects.filter(available=True).order_by('-registered_date')
-
-    return render(request, 'books/book_list_user.html', {'books': books, 'query': query, 'user': request.user})
+    page = shelf_page(request, query)
+    return render(request, 'books/book_list_user.html', {'books': page.object_list, 'page': page, 'query': query, 'user': request.user, **cache_context()})
 
 # List available books
-def available_books(request):
-    books = Book.objects.filter(available=True).order_by('-registered_date')
-    return render(request, 'books/available_books.html', {'books': books})
+@query_budget(3)
+@requires('catalog.view')
+async def available_books(request):
+    page = await ashelf_page(request)
+    context = await sync_to_async(cache_context)()
+    return await arender(request, 'books/available_books.html', {'books': page.object_list, 'page': page, **context})
+
+
+@query_budget(2)
+@requires('catalog.view')
+async def availability_events(request):
+    """
+    Server-Sent Events stream of copy counts as loans change (see books.events).
+
+    Answers 204, which tells EventSource not to reconnect, unless
+    AVAILABILITY_EVENTS_ENABLED: under WSGI the open stream would tie up a
+    worker for as long as the page stays open.
+    """
+    if not settings.AVAILABILITY_EVENTS_ENABLED:
+        return HttpResponse(status=204)
+
+    async def stream():
+        yield f'retry: {settings.AVAILABILITY_EVENTS_RETRY * 1000}\n\n'
+        async with events.broker.subscribe() as queue:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.AVAILABILITY_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                yield events.format_event(*event)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 # Register a new book
-@login_required
+@query_budget(3)
+@requires('catalog.manage')
 def register_book(request):
     if request.method == 'POST':
         form = BookForm(request.POST, request.FILES)
@@ -117,13 +192,14 @@ def register_book(request):
 
 
 # Update book details
-@login_required
+@query_budget(4)
+@requires('catalog.manage')
 def update_book(request, pk):
     book = get_object_or_404(Book, pk=pk)
     if request.method == 'POST':
         form = BookForm(request.POST, request.FILES, instance=book)
-        if form.is_valid():
-            form.save()
+        # save() turns the form invalid if a borrow took the copies being removed
+        if form.is_valid() and form.save():
             return redirect('book_list')
     else:
         form = BookForm(instance=book)
@@ -131,107 +207,208 @@ def update_book(request, pk):
 
 
 # Delete a book
-@login_required
+@query_budget(4)
+@requires('catalog.manage')
 def delete_book(request, pk):
     book = get_object_or_404(Book, pk=pk)
     if request.method == 'POST':
-        book.delete()
+        # Its loans go too; log them all with one INSERT
+        with transaction.atomic(), ChangeLog.objects.batch():
+            book.delete()
         return redirect('book_list')
     return render(request, 'books/book_confirm_delete.html', {'book': book})
 
 
 # Borrow a book
-@login_required
+@query_budget(4)
+@requires('loans.borrow')
 def borrow_book(request, book_id):
     book = get_object_or_404(Book, id=book_id)
-    due_date = timezone.now() + timedelta(days=5)  # Calculate the due date
-    
+    due_date = services.default_due_date()  # Calculate the due date
+
     if request.method == 'POST':
-        if book.available:
-            BorrowRecord.objects.create(
-                book=book, 
-                borrower_name=request.user.username,
-                due_date=due_date
-            )
-            book.available = False
-            book.save()
+        if services.borrow_book(book.id, request.user, due_date):
             return redirect('book_list_user')
-    
+        messages.error(request, "Sorry, this book has just been borrowed by someone else. You can place a hold instead.")
+        book.available_count = 0
+
     return render(request, 'books/borrow_book.html', {'book': book, 'user': request.user, 'due_date': due_date})
 
 
+# Join the queue for a book with no copy left
+@query_budget(4)
+@requires('loans.borrow')
+def place_hold(request, book_id):
+    book = get_object_or_404(Book, id=book_id)
+    if request.method != 'POST':
+        return redirect('borrow_book', book_id=book.id)
+    outcome = services.place_hold(book.id, request.user)
+    if outcome == services.HOLD_LENT:
+        messages.success(request, f"A copy of {book.title} was back on the shelf, so it has been lent to you. "
+                                  "You will find it on your shelf.")
+    elif outcome == services.HOLD_ON_LOAN:
+        messages.info(request, f"You already have {book.title} on loan.")
+    elif outcome == services.HOLD_EXISTS:
+        messages.info(request, f"You are already in line for {book.title}.")
+    else:
+        messages.success(request, f"You are in line for {book.title}. It will be lent to you as soon as a copy is returned.")
+    return redirect('my_holds')
+
+
+@query_budget(3)
+@requires('loans.borrow')
+def cancel_hold(request, hold_id):
+    if request.method == 'POST' and services.cancel_hold(hold_id, request.user):
+        messages.success(request, "Your hold was cancelled.")
+    return redirect('my_holds')
+
+
+@query_budget(3)
+@requires('loans.borrow')
+def my_holds(request):
+    """
+    The user's holds with their place in line; copies are lent on return, so there is nothing to refresh for.
+    """
+    holds = Hold.objects.filter(user=request.user).select_related('book').with_position().order_by('id')
+    return render(request, 'books/my_holds.html', {'holds': holds, 'user': request.user})
+
+
 
 # Return a book
-@login_required
+@query_budget(5)
+@requires('loans.borrow')
 def return_book(request, book_id):
     book = get_object_or_404(Book, id=book_id)
-    borrow_record = BorrowRecord.objects.filter(book=book, return_date__isnull=True).first()
-    
+    # Other copies of the book may be out with other members; only ever close one's own loan
+    borrow_record = BorrowRecord.objects.filter(book=book, borrower=request.user, return_date__isnull=True).first()
+    if borrow_record is None:
+        raise Http404("You have no open loan of this book.")
+
     if request.method == 'POST':
-        if borrow_record:
-            borrow_record.return_date = timezone.now()
-            borrow_record.save()
-            book.available = True
-            book.save()
+        if services.return_loan(borrow_record):
             return redirect('borrowed_books_user')
 
     return render(request, 'books/return_book.html', {'book': book, 'borrow_record': borrow_record, 'user': request.user})
 
 
 # List borrowed books (admin and users)
+@query_budget(3)
+@requires('loans.manage')
 def borrowed_books(request):
-    borrowed_books = BorrowRecord.objects.filter(return_date__isnull=True)
+    borrowed_books = BorrowRecord.objects.select_related('book').filter(return_date__isnull=True)
     return render(request, 'books/borrowed_books.html', {'borrowed_books': borrowed_books})
 
 
-@user_passes_test(is_admin)
-def borrowed_books_admin(request):
-    borrowed_books = BorrowRecord.objects.select_related('book').all()
+LEDGER_ORDERING = ('-borrow_date', '-id')
 
-    if request.method == 'POST':
-        record_id = request.POST.get('record_id')
-        status = request.POST.get('status')
+LEDGER_ACTIONS = {
+    'returned': (services.return_loans, "{count} loan(s) marked as returned."),
+    'borrowed': (services.reopen_loans, "{count} loan(s) marked as borrowed."),
+    'delete': (services.delete_loans, "{count} loan(s) deleted."),
+}
 
-        if record_id and status:
-            record = get_object_or_404(BorrowRecord, id=record_id)
 
-            if status == 'returned':
-                # Call the mark_as_returned method
-                record.mark_as_returned()
-            elif status == 'borrowed':
-                # Reset the return date and mark the book as unavailable
-                record.return_date = None
-                record.book.available = False
-                record.book.save()
-                record.save()
-
-        # Redirect to avoid form resubmission
-        return redirect('borrowed_books_admin')
-
-    return render(request, 'books/borrowed_books_admin.html', {'borrowed_books': borrowed_books})
+@query_budget(10)  # A bulk POST costs a fixed handful of statements, whatever the selection
+@requires('loans.manage')
+def borrowed_books_admin(request):
+    """
+    Loan ledger: filtered, keyset-paginated, with bulk status actions.
+    """
+    if request.method == 'POST':
+        # The single-record form (record_id/status) is still accepted
+        action = request.POST.get('action') or request.POST.get('status')
+        record_ids = request.POST.getlist('record_ids') or request.POST.getlist('record_id')
+        record_ids = [int(pk) for pk in record_ids if pk.isdigit()]
+        if action in LEDGER_ACTIONS and record_ids:
+            apply, message = LEDGER_ACTIONS[action]
+            count = apply(record_ids)
+            messages.success(request, message.format(count=count))
+            if count < len(record_ids):
+                messages.warning(request, f"{len(record_ids) - count} selected loan(s) were left unchanged.")
+
+        # Redirect to avoid form resubmission, keeping the filters
+        return redirect(request.get_full_path())
+
+    filters = LoanFilterForm(request.GET)
+    loans = filters.filter(BorrowRecord.objects.select_related('book'))
+    page = paginate_books(request, loans, LEDGER_ORDERING)
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    return render(request, 'books/borrowed_books_admin.html', {
+        'borrowed_books': page.object_list,
+        'page': page,
+        'page_query': params.urlencode(),
+        'filters': filters,
+        'now': timezone.now(),
+    })
+
+
+@query_budget(7)
+@requires('reports.view')
+def circulation_dashboard(request):
+    """
+    Circulation statistics, read from the rollups kept by refresh_circulation.
+    """
+    return render(request, 'books/circulation_dashboard.html', circulation.dashboard())
 
 
-@login_required
-def borrowed_books_user(request):
-    borrowed_books = BorrowRecord.objects.filter(
-        borrower_name=request.user.username, return_date__isnull=True
+@query_budget(3)
+@requires('reports.view')
+def export_data(request, kind):
+    """
+    Stream the catalog or loan history as CSV or NDJSON, optionally limited to a date range.
+    """
+    output_format = request.GET.get('format', 'csv')
+    if output_format not in exports.CONTENT_TYPES:
+        return HttpResponseBadRequest("format must be csv or ndjson")
+    try:
+        since = exports.parse_bound(request.GET.get('since'))
+        until = exports.parse_bound(request.GET.get('until'), end=True)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    # Each server only streams iterators of its own kind; the other gets collected first
+    stream = exports.astream if isinstance(request, ASGIRequest) else exports.stream
+    response = StreamingHttpResponse(
+        stream(kind, output_format, since, until),
+        content_type=exports.CONTENT_TYPES[output_format],
     )
-    return render(request, 'books/borrowed_books_user.html', {'borrowed_books': borrowed_books, 'user': request.user})
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{output_format}"'
+    return response
+
+
+@query_budget(4)
+@requires('loans.borrow')
+async def borrowed_books_user(request):
+    user = await request.auser()
+    borrowed_books = [loan async for loan in BorrowRecord.objects.select_related('book').filter(
+        borrower=user, return_date__isnull=True
+    ).order_by('-borrow_date')]
+    # Materialized by the overdue sweep rather than counted here
+    overdue_summary = await OverdueSummary.objects.filter(user=user).afirst()
+    return await arender(request, 'books/borrowed_books_user.html', {
+        'borrowed_books': borrowed_books,
+        'overdue_summary': overdue_summary,
+        'now': timezone.now(),
+        'user': user,
+    })
 
 
 # View Profile (Role-based)
-@login_required
+@query_budget(2)
+@requires('profile.edit')
 def view_profile(request):
-    if request.user.is_staff:
+    if permissions.has_permission(request, 'users.manage'):
         return render(request, 'books/profile_view.html', {'user': request.user})
     else:
         return render(request, 'books/profile_view_user.html', {'user': request.user})
 
 
 # Edit Profile (Role-based)
-@login_required
+@query_budget(3)
+@requires('profile.edit')
 def edit_profile(request):
-    if request.user.is_staff:
+    if permissions.has_permission(request, 'users.manage'):
         return handle_profile_edit(request, 'books/profile_edit.html', 'view_profile')
     else:
         return handle_profile_edit(request, 'books/profile_edit_user.html', 'view_profile')
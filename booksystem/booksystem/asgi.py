@@ -11,6 +11,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'booksystem.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'booksystem.settings.prod')
+# Open streams only cost a coroutine here, so offer live availability updates
+os.environ.setdefault('AVAILABILITY_EVENTS', '1')
 
 application = get_asgi_application()
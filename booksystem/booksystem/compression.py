@@ -0,0 +1,60 @@
+# booksystem/compression.py
+"""
+Compression of pages and static files.
+
+``CompressedManifestStaticFilesStorage`` writes a ``.gz`` copy (and a
+``.br`` copy when the ``brotli`` package is installed) next to every
+hashed file ``collectstatic`` produces, so the front web server can send
+them as they are (nginx ``gzip_static``/``brotli_static``) instead of
+compressing the same stylesheet on every request.
+
+``GZipMiddleware`` compresses HTML and other responses built by Django,
+except event streams: gzip holds data back until its buffer fills, which
+would delay availability updates indefinitely.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.middleware import gzip as gzip_middleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.map')
+# Smaller files gain nothing from a compressed copy
+MIN_SIZE = 200
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                self.compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE):
+            return
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < MIN_SIZE:
+            return
+        encoders = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            encoders.append(('.br', lambda data: brotli.compress(data, quality=11)))
+        for suffix, encode in encoders:
+            compressed = encode(content)
+            if len(compressed) < len(content):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+
+class GZipMiddleware(gzip_middleware.GZipMiddleware):
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        return super().process_response(request, response)
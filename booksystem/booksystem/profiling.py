@@ -0,0 +1,170 @@
+# booksystem/profiling.py
+"""
+Opt-in request profiling for production.
+
+``ProfilingMiddleware`` times every request and, through
+``connection.execute_wrapper``, counts its SQL statements and their time,
+so it works with ``DEBUG`` off and keeps nothing once the request is done.
+Statements are grouped by their SQL text (parameters are separate), which
+makes the same query run again and again, e.g. once per row, show up as a
+duplicate. A sample of requests, plus every request slower than
+PROFILING_SLOW_REQUEST_MS, is appended as one JSON object per line to the
+rotating log at PROFILING_LOG; ``manage.py profile_report`` summarizes it.
+The rotating handler is not safe for several processes writing one file, so
+each worker process needs its own PROFILING_LOG; the report skips lines it
+cannot read.
+
+Enable it with PROFILING_ENABLED (env PROFILING=1); otherwise the
+middleware removes itself at startup and costs nothing.
+"""
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# "IN (%s, %s, %s)" varies with the number of values; count those as one statement
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+SQL_PREVIEW = 500
+
+
+def fingerprint(sql):
+    return IN_LIST.sub('(...)', sql)
+
+
+class QueryRecorder:
+    """
+    ``execute_wrapper`` callable that tallies the statements it sees.
+    """
+
+    def __init__(self, slow_ms):
+        self.slow_ms = slow_ms
+        self.count = 0
+        self.seconds = 0.0
+        self.by_sql = Counter()
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            self.by_sql[sql] += 1
+            if elapsed * 1000 >= self.slow_ms:
+                self.slow.append({'sql': sql[:SQL_PREVIEW], 'ms': round(elapsed * 1000, 2)})
+
+    def duplicates(self):
+        counts = defaultdict(int)
+        for sql, count in self.by_sql.items():
+            counts[fingerprint(sql)] += count
+        return [{'sql': sql[:SQL_PREVIEW], 'count': count}
+                for sql, count in sorted(counts.items(), key=lambda item: -item[1]) if count > 1]
+
+
+def open_log(path):
+    """
+    Return a logger writing plain lines to the rotating file at ``path``.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profile_log = logging.getLogger(f'{__name__}.log.{path}')
+    if not profile_log.handlers:
+        handler = RotatingFileHandler(path, maxBytes=settings.PROFILING_LOG_MAX_BYTES,
+                                      backupCount=settings.PROFILING_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        profile_log.addHandler(handler)
+        profile_log.setLevel(logging.INFO)
+        profile_log.propagate = False
+    return profile_log
+
+
+@contextmanager
+def recording(recorder):
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield
+
+
+class ProfilingMiddleware:
+    """
+    Record wall time and SQL statistics of sampled and slow requests.
+
+    Runs in whichever mode the rest of the chain does, so under ASGI the
+    async views are not pushed onto a thread on its account.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.log = open_log(settings.PROFILING_LOG)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder(settings.PROFILING_SLOW_QUERY_MS)
+        started = time.perf_counter()
+        with recording(recorder):
+            response = self.get_response(request)
+        self.finish(request, response, started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(settings.PROFILING_SLOW_QUERY_MS)
+        started = time.perf_counter()
+        # The request's queries run on the thread sync_to_async() picks, with its connections
+        stack = ExitStack()
+        await sync_to_async(stack.enter_context)(recording(recorder))
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.finish(request, response, started, recorder)
+        return response
+
+    def finish(self, request, response, started, recorder):
+        wall_ms = (time.perf_counter() - started) * 1000
+        slow = wall_ms >= settings.PROFILING_SLOW_REQUEST_MS
+        if slow or random.random() < settings.PROFILING_SAMPLE_RATE:
+            self.write(request, response, wall_ms, recorder, slow)
+
+    def write(self, request, response, wall_ms, recorder, slow):
+        match = request.resolver_match
+        record = {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': (match.view_name or match._func_path) if match else None,
+            'status': response.status_code,
+            'wall_ms': round(wall_ms, 2),
+            'sql_count': recorder.count,
+            'sql_ms': round(recorder.seconds * 1000, 2),
+            'duplicates': recorder.duplicates(),
+            'slow_queries': recorder.slow,
+            'slow': slow,
+        }
+        if slow:
+            logger.warning("Slow request: %s %s took %.0f ms with %d queries",
+                           request.method, request.path, wall_ms, recorder.count)
+        self.log.info(json.dumps(record, separators=(',', ':')))
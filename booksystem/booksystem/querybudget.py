@@ -0,0 +1,104 @@
+# booksystem/querybudget.py
+"""
+Per-view SQL query budgets.
+
+Views declare how many queries a request may cost with ``@query_budget(n)``.
+The number must not depend on how many rows the page shows, so an N+1 loop
+sneaking into a template blows the budget as soon as there is more than a
+handful of rows. ``max_queries`` enforces it in tests, and
+``QueryBudgetMiddleware`` reports violations while ``DEBUG`` is on.
+"""
+import logging
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    """
+    Declare the maximum number of SQL queries a request to this view may run.
+
+    The count covers the whole request, including the session and user
+    lookups done by middleware.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    return getattr(view_func, 'query_budget', None)
+
+
+def _report(budget, queries, label):
+    lines = '\n'.join(f"  {query['sql']}" for query in queries)
+    return f"{label} ran {len(queries)} queries, budget is {budget}:\n{lines}"
+
+
+@contextmanager
+def max_queries(budget, label='Block', using=connection):
+    """
+    Fail with QueryBudgetExceeded if the block runs more than ``budget`` queries.
+    """
+    with CaptureQueriesContext(using) as captured:
+        yield captured
+    if len(captured) > budget:
+        raise QueryBudgetExceeded(_report(budget, captured.captured_queries, label))
+
+
+class QueryBudgetMiddleware:
+    """
+    Check every request against the budget declared on its view.
+
+    Only meant for development: it is added to MIDDLEWARE when DEBUG is on.
+    Violations are logged, or raised when QUERY_BUDGET_STRICT is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.get_response(request)
+        self.check(request, captured.captured_queries)
+        return response
+
+    async def __acall__(self, request):
+        captured = CaptureQueriesContext(connection)
+        # The queries run, and are logged, on the connection of the thread
+        # sync_to_async() picks; only touch it from there
+        await sync_to_async(captured.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(captured.__exit__)(None, None, None)
+        self.check(request, await sync_to_async(lambda: captured.captured_queries)())
+        return response
+
+    def check(self, request, queries):
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None and len(queries) > budget:
+            message = _report(budget, queries, request.path)
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = get_query_budget(view_func)
@@ -0,0 +1,4 @@
+"""
+Settings profiles: ``base`` holds what they share, ``dev``, ``test`` and
+``prod`` import it and adjust it for their environment.
+"""
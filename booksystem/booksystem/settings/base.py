@@ -0,0 +1,289 @@
+"""
+Settings shared by every profile of the booksystem project.
+
+Pick a profile with DJANGO_SETTINGS_MODULE: ``booksystem.settings.dev``
+(the default of manage.py), ``.test`` (the default of ``manage.py test``)
+or ``.prod`` (the default of the WSGI/ASGI entry points). Values that
+differ between deployments are read from the environment.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.1/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.1/ref/settings/
+"""
+
+import os
+from pathlib import Path
+
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', '')
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+# Media files (uploads)
+MEDIA_URL = '/media/'  # URL for accessing media files
+MEDIA_ROOT = BASE_DIR / 'media'  # Path where media files will be stored
+
+# Widths of the resized cover variants generated next to each upload
+IMAGE_VARIANT_WIDTHS = (240, 480)
+IMAGE_PIPELINE_WORKERS = 2
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'books',
+    'accounts',  # Add this line
+    'api',
+]
+AUTH_USER_MODEL = 'accounts.CustomUser'
+
+
+AUTHENTICATION_BACKENDS = [
+    # Accepts an email or a username in one query, so it also serves the admin login
+    'accounts.backends.EmailBackend',
+]
+
+# Password hashing cost. Each login spends roughly this many PBKDF2 rounds,
+# so it sets the ceiling on logins per second per core; lower it only with
+# that trade-off in mind (see ``manage.py bench_login``). Hashes made with a
+# different count are upgraded on the next login.
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 870000))
+
+# Attempts allowed on the login and registration forms, as "<count>/<s|m|h|d>"
+# token buckets per client IP and per account (see accounts.ratelimit).
+RATELIMITS = {
+    'login': {'ip': '30/m', 'account': '5/m'},
+    'register': {'ip': '10/h'},
+    'admin_register': {'ip': '5/h'},
+}
+# "local" keeps buckets per process; "cache" shares them through RATELIMIT_CACHE
+RATELIMIT_STORE = os.environ.get('RATELIMIT_STORE', 'local')
+RATELIMIT_CACHE = 'default'
+# Behind a reverse proxy, e.g. HTTP_X_FORWARDED_FOR; the client address otherwise.
+# The client is taken from that header's entry added by the outermost of the
+# RATELIMIT_TRUSTED_PROXIES proxies, counted from the right; earlier entries
+# are whatever the client sent.
+RATELIMIT_IP_HEADER = os.environ.get('RATELIMIT_IP_HEADER', 'REMOTE_ADDR')
+RATELIMIT_TRUSTED_PROXIES = int(os.environ.get('RATELIMIT_TRUSTED_PROXIES', 1))
+
+# Code asked for by the admin registration form; admin registration is closed when empty
+ADMIN_REGISTRATION_CODE = os.environ.get('ADMIN_REGISTRATION_CODE', '')
+
+PASSWORD_HASHERS = [
+    'accounts.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+
+MIDDLEWARE = [
+    # Outermost so its timings include the rest; inert unless PROFILING_ENABLED
+    'booksystem.profiling.ProfilingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    # Compresses what the middleware below produces; leaves event streams alone
+    'booksystem.compression.GZipMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+# Request profiling (see booksystem.profiling and ``manage.py profile_report``).
+# Records a PROFILING_SAMPLE_RATE share of requests plus every request slower
+# than PROFILING_SLOW_REQUEST_MS; statements slower than PROFILING_SLOW_QUERY_MS
+# are listed in full. Rotation is per process, so give each worker its own
+# PROFILING_LOG when several share a host.
+PROFILING_ENABLED = os.environ.get('PROFILING', '') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.05))
+PROFILING_SLOW_REQUEST_MS = int(os.environ.get('PROFILING_SLOW_REQUEST_MS', 500))
+PROFILING_SLOW_QUERY_MS = int(os.environ.get('PROFILING_SLOW_QUERY_MS', 100))
+PROFILING_LOG = os.environ.get('PROFILING_LOG', BASE_DIR / 'logs' / 'profile.jsonl')
+PROFILING_LOG_MAX_BYTES = 10 * 1024 * 1024
+PROFILING_LOG_BACKUPS = 5
+
+ROOT_URLCONF = 'booksystem.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'booksystem.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+
+#
+# DATABASE_ENGINE picks the backend. "postgresql" is meant for multi-worker
+# deployments: connections are kept for DATABASE_CONN_MAX_AGE seconds, or
+# with DATABASE_POOL=1 borrowed from a psycopg pool of at most
+# DATABASE_POOL_MAX_SIZE (the two are mutually exclusive). "sqlite" suits a
+# single node: WAL lets readers run alongside the one writer, and write
+# transactions take the lock up front (IMMEDIATE) and wait up to
+# DATABASE_TIMEOUT seconds for it instead of failing with "database is locked".
+
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASE_POOL = os.environ.get('DATABASE_POOL', '') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'booksystem'),
+            'USER': os.environ.get('DATABASE_USER', ''),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', ''),
+            'PORT': os.environ.get('DATABASE_PORT', ''),
+            'CONN_MAX_AGE': 0 if DATABASE_POOL else int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+                    'timeout': int(os.environ.get('DATABASE_TIMEOUT', 10)),
+                },
+            } if DATABASE_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': int(os.environ.get('DATABASE_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+                # Run on every new connection; journal_mode=WAL also sticks to the file
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=134217728;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
+    }
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.1/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.1/howto/static-files/
+
+STATIC_URL = 'static/'
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+# Number of books per page in the catalog listings
+CATALOG_PAGE_SIZE = 24
+
+# Live availability stream (books.events). The stream stays open as long as
+# the page, which would pin a worker under WSGI or runserver, so it is only
+# offered when enabled; booksystem.asgi turns it on. Then: seconds between
+# keep-alive comments, and before a dropped browser reconnects
+AVAILABILITY_EVENTS_ENABLED = os.environ.get('AVAILABILITY_EVENTS', '') == '1'
+AVAILABILITY_EVENTS_HEARTBEAT = 15
+AVAILABILITY_EVENTS_RETRY = 5
+
+# Change feed (books.changelog): entries per response at most, and days an
+# entry is kept; replicas offline for longer download the catalog again
+CHANGELOG_BATCH_SIZE = 500
+CHANGELOG_RETENTION_DAYS = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# The "catalog" alias holds rendered catalog fragments and query results.
+# Local memory is per process; use "file" or "redis" when several workers
+# or nodes must share invalidations.
+
+CATALOG_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CATALOG_CACHE_LOCATION', str(BASE_DIR / 'cache' / 'catalog')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CATALOG_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': CATALOG_CACHE_BACKENDS[os.environ.get('CATALOG_CACHE_BACKEND', 'locmem')],
+}
+
+# Seconds a catalog entry may live; invalidation does not depend on it
+CATALOG_CACHE_TIMEOUT = 300
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
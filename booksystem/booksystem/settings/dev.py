@@ -0,0 +1,15 @@
+"""
+Local development: debug pages, media served by Django and query budget reports.
+"""
+from .base import *  # noqa: F401,F403
+from .base import MIDDLEWARE
+
+# SECURITY WARNING: only ever used on a developer's machine
+SECRET_KEY = 'django-insecure-7q%vq(@)u=3x+j9n#9u)(16%pp#2@x$a#jx9m6rbb^35wrs-mt'
+
+DEBUG = True
+
+ALLOWED_HOSTS = ['localhost', '127.0.0.1', '[::1]']
+
+# Report views that run more SQL than their @query_budget allows
+MIDDLEWARE = ['booksystem.querybudget.QueryBudgetMiddleware', *MIDDLEWARE]
@@ -0,0 +1,91 @@
+"""
+Production: no debug, compiled templates, caches shared by every worker,
+sessions without database queries and static/media files left to the front
+web server.
+
+Requires DJANGO_SECRET_KEY and DJANGO_ALLOWED_HOSTS, and Redis at
+CATALOG_CACHE_LOCATION unless CATALOG_CACHE_BACKEND is "file". Run ``collectstatic``
+on deploy; the copies in STATIC_ROOT carry a content hash in their names,
+so the web server can let browsers keep them forever, and come with
+precompressed .gz (and, with the ``brotli`` package, .br) variants. Uploads
+in MEDIA_ROOT are read straight from disk. With nginx, for example::
+
+    location /static/ {
+        alias /srv/booksystem/staticfiles/;
+        gzip_static on;
+        brotli_static on;  # with ngx_brotli
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+    location /media/ {
+        alias /srv/booksystem/media/;
+        expires 7d;
+    }
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import ALLOWED_HOSTS, CACHES, CATALOG_CACHE_BACKENDS, SECRET_KEY, TEMPLATES
+
+if not SECRET_KEY or not ALLOWED_HOSTS:
+    raise ImproperlyConfigured("Set DJANGO_SECRET_KEY and DJANGO_ALLOWED_HOSTS for the production profile.")
+
+# Parse every template once per process instead of on each render
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+# Every worker must see the same catalog version, or a borrow only
+# invalidates the pages of the worker that served it, and the same rate-limit
+# buckets, or each worker allows the full rate. So the catalog cache is Redis
+# (CATALOG_CACHE_LOCATION) unless CATALOG_CACHE_BACKEND says "file", which
+# single-node deployments can share, and per-process stores are refused.
+CACHES = {**CACHES, 'catalog': CATALOG_CACHE_BACKENDS[os.environ.get('CATALOG_CACHE_BACKEND', 'redis')]}
+if CACHES['catalog']['BACKEND'] == CATALOG_CACHE_BACKENDS['locmem']['BACKEND']:
+    raise ImproperlyConfigured("The production profile needs a shared catalog cache; set CATALOG_CACHE_BACKEND "
+                               "to redis or file.")
+
+RATELIMIT_STORE = os.environ.get('RATELIMIT_STORE', 'cache')
+RATELIMIT_CACHE = 'catalog'
+if RATELIMIT_STORE != 'cache':
+    raise ImproperlyConfigured("The production profile keeps rate limits in the shared cache; unset RATELIMIT_STORE.")
+
+# Sessions cost no database query: "cache" keeps them in the Redis instance
+# at SESSION_CACHE_LOCATION, shared by every worker; "signed_cookies" keeps
+# them in the (signed, not encrypted) cookie itself and needs no server.
+SESSION_STORE = os.environ.get('SESSION_STORE', 'signed_cookies')
+if SESSION_STORE == 'cache':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+    SESSION_CACHE_ALIAS = 'sessions'
+    CACHES = {
+        **CACHES,
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', 'redis://127.0.0.1:6379/2'),
+        },
+    }
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'booksystem.compression.CompressedManifestStaticFilesStorage',
+    },
+}
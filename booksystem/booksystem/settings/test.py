@@ -0,0 +1,21 @@
+"""
+The test suite: fast password hashing and nothing shared between processes.
+"""
+from .base import *  # noqa: F401,F403
+
+SECRET_KEY = 'django-insecure-test-only'
+
+ALLOWED_HOSTS = ['testserver']
+
+# Full-strength hashing would dominate the run time of every test that logs in
+PASSWORD_HASH_ITERATIONS = 1000
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+}
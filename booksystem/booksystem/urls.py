@@ -10,7 +10,9 @@ def home_redirect(request):
 
 urlpatterns = [
     path('accounts/', include('accounts.urls')),
+    path('api/', include('api.urls')),
     path('admin/', admin.site.urls),
     path('books/', include('books.urls')),  # Include books app URLs
     path('', home_redirect),  # Redirect the root URL to /books/
+# Only under DEBUG; in production the web server serves MEDIA_ROOT itself
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file